@@ -0,0 +1,38 @@
+"""Add domain_latest_valuations (newest valuation per domain)
+
+Revision ID: a9c4e1d7b235
+Revises: f3b8d2a6c410
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'a9c4e1d7b235'
+down_revision = 'f3b8d2a6c410'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('domain_latest_valuations',
+    sa.Column('domain_name', sa.String(length=255), nullable=False),
+    sa.Column('valuation_id', sa.Integer(), nullable=False),
+    sa.Column('model_version', sa.String(length=32), nullable=False),
+    sa.Column('value', sa.Numeric(precision=18, scale=8), nullable=False),
+    sa.Column('factors', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['domain_name'], ['domains.name'], ),
+    sa.PrimaryKeyConstraint('domain_name')
+    )
+    op.execute(
+        "INSERT INTO domain_latest_valuations (domain_name, valuation_id, model_version, value, factors, created_at) "
+        "SELECT v.domain_name, v.id, v.model_version, v.value, v.factors, v.created_at FROM valuations v "
+        "WHERE v.id IN (SELECT MAX(id) FROM valuations GROUP BY domain_name)"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('domain_latest_valuations')
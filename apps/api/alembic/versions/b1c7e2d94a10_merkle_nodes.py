@@ -0,0 +1,36 @@
+"""Add merkle_nodes level-indexed tree table
+
+Revision ID: b1c7e2d94a10
+Revises: 7283b3547840
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'b1c7e2d94a10'
+down_revision = '7283b3547840'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('merkle_nodes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('level', sa.Integer(), nullable=False),
+    sa.Column('idx', sa.Integer(), nullable=False),
+    sa.Column('node_hash', sa.String(length=66), nullable=False),
+    sa.Column('event_id', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('level', 'idx', name='uq_merkle_node_level_idx')
+    )
+    op.create_index(op.f('ix_merkle_nodes_id'), 'merkle_nodes', ['id'], unique=False)
+    op.create_index(op.f('ix_merkle_nodes_event_id'), 'merkle_nodes', ['event_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_merkle_nodes_event_id'), table_name='merkle_nodes')
+    op.drop_index(op.f('ix_merkle_nodes_id'), table_name='merkle_nodes')
+    op.drop_table('merkle_nodes')
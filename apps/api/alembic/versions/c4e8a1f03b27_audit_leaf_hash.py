@@ -0,0 +1,25 @@
+"""Add audit_events.leaf_hash (stored Merkle leaf hash)
+
+Revision ID: c4e8a1f03b27
+Revises: b1c7e2d94a10
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c4e8a1f03b27'
+down_revision = 'b1c7e2d94a10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # existing rows stay NULL; the snapshot builder hashes and fills them the first time it reads them
+    op.add_column('audit_events', sa.Column('leaf_hash', sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('audit_events', 'leaf_hash')
@@ -0,0 +1,35 @@
+"""Add audit_chain_checkpoints (verified integrity chain checkpoints)
+
+Revision ID: d2f6b9e14c58
+Revises: c4e8a1f03b27
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'd2f6b9e14c58'
+down_revision = 'c4e8a1f03b27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('audit_chain_checkpoints',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('event_id', sa.Integer(), nullable=False),
+    sa.Column('integrity_hash', sa.String(length=130), nullable=False),
+    sa.Column('event_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_audit_chain_checkpoints_id'), 'audit_chain_checkpoints', ['id'], unique=False)
+    op.create_index(op.f('ix_audit_chain_checkpoints_event_id'), 'audit_chain_checkpoints', ['event_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_audit_chain_checkpoints_event_id'), table_name='audit_chain_checkpoints')
+    op.drop_index(op.f('ix_audit_chain_checkpoints_id'), table_name='audit_chain_checkpoints')
+    op.drop_table('audit_chain_checkpoints')
@@ -0,0 +1,32 @@
+"""Add tld_stats (materialized domain count per TLD)
+
+Revision ID: f3b8d2a6c410
+Revises: e7a3c5f19d62
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'f3b8d2a6c410'
+down_revision = 'e7a3c5f19d62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('tld_stats',
+    sa.Column('tld', sa.String(length=32), nullable=False),
+    sa.Column('domain_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('tld')
+    )
+    op.execute(
+        "INSERT INTO tld_stats (tld, domain_count) "
+        "SELECT tld, COUNT(*) FROM domains WHERE tld IS NOT NULL AND tld <> '' GROUP BY tld"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('tld_stats')
@@ -2,9 +2,10 @@ import threading
 import time
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
+from app.config import settings
 from app.database import SessionLocal
-from app.services.merkle_service import merkle_service
-from app.models.database import AuditEvent
+from app.services.snapshot_scheduler import snapshot_scheduler
+from app.services.audit_service import record_audit_event
 from app.services.blockchain_service import blockchain_service
 
 # Simple background scheduler (in-process). For production: move to dedicated worker.
@@ -13,8 +14,6 @@ class Scheduler:
         self.interval = interval_seconds
         self._stop = threading.Event()
         self._thread: threading.Thread | None = None
-        self.last_snapshot_at: datetime | None = None
-        self.snapshot_period_seconds = 300  # every 5 minutes
         self.last_chain_ingest_at: datetime | None = None
         self.chain_ingest_period_seconds = 30  # poll blockchain every 30s
         self.last_block_checked: int | None = None
@@ -29,17 +28,20 @@ class Scheduler:
         self._stop.set()
         if self._thread:
             self._thread.join(timeout=2)
+        try:
+            with SessionLocal() as db:
+                snapshot_scheduler.release(db)  # hand the snapshot lease over without waiting out its ttl
+        except Exception:
+            pass
 
     def _run(self):
         while not self._stop.is_set():
             try:
                 now = datetime.utcnow()
-                # Periodic Merkle snapshot
-                if (self.last_snapshot_at is None) or (now - self.last_snapshot_at >= timedelta(seconds=self.snapshot_period_seconds)):
+                # Periodic Merkle snapshot (only the lease holder across all processes snapshots)
+                if settings.enable_merkle_service:
                     with SessionLocal() as db:
-                        created = merkle_service.snapshot_incremental(db)
-                        if created:
-                            self.last_snapshot_at = now
+                        snapshot_scheduler.tick(db)
                 # Periodic blockchain poll ingestion (basic): record block height progress
                 if (self.last_chain_ingest_at is None) or (now - self.last_chain_ingest_at >= timedelta(seconds=self.chain_ingest_period_seconds)):
                     if blockchain_service.ensure_initialized():
@@ -50,7 +52,7 @@ class Scheduler:
                                     latest_block = w3.eth.block_number
                                     if self.last_block_checked is None or latest_block > self.last_block_checked:
                                         payload = {'from_block': (self.last_block_checked or latest_block), 'to_block': latest_block}
-                                        db.add(AuditEvent(event_type='CHAIN_BLOCK_SYNC', entity_type='CHAIN', entity_id=None, user_id=None, payload=payload))
+                                        record_audit_event(db, event_type='CHAIN_BLOCK_SYNC', entity_type='CHAIN', payload=payload)
                                         self.last_block_checked = latest_block
                                         db.commit()
                             except Exception:
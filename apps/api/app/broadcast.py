@@ -1,5 +1,8 @@
 from typing import Callable, Optional, List, TYPE_CHECKING
-import json, asyncio, time
+from collections import deque
+import json, asyncio, threading, time
+from app.config import settings
+from app.services.latency_histogram import LogHistogram, LabelledHistogram
 if TYPE_CHECKING:
     from fastapi import WebSocket
 
@@ -8,81 +11,850 @@ connection_filters: dict[int, set[str]] = {}    # id(ws) -> allowed event types
 # Optional competition scoping (id(ws) -> set of competition ids)
 connection_comp_scopes: dict[int, set[str]] = {}
 
-# Monotonic sequence for all broadcast events (best-effort, in-memory)
+# Highest broadcast sequence assigned or observed by this worker (global when the Redis backend is used)
 _event_seq: int = 0
 
+OVERFLOW_POLICIES = ('drop_oldest', 'coalesce', 'disconnect')
+# Close code used when a slow consumer is disconnected (1013 = try again later)
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+# Aggregate fan-out counters (survive individual connections)
+_fanout_stats: dict[str, int] = {
+    'enqueued': 0,
+    'sent': 0,
+    'dropped': 0,
+    'coalesced': 0,
+    'slow_disconnects': 0,
+    'unsequenced': 0,  # events dropped because no global sequence could be assigned
+}
+
+
+# Event creation -> send completed on the socket, per event type (observed by writer tasks)
+_delivery_latency = LabelledHistogram('type')
+# Event creation -> client acknowledgement (PING carrying the event's seq), per event type
+_ack_rtt = LabelledHistogram('type')
+# Time spent matching + enqueueing one event across local sockets
+_fanout_enqueue_latency = LogHistogram()
+
+
+def _coalesce_key(payload: dict) -> Optional[tuple]:
+    """Identity of a frame that a newer frame of the same key fully supersedes."""
+    etype = payload.get('type')
+    if etype == 'valuation_update' and payload.get('domain'):
+        return (etype, payload['domain'])
+    if etype == 'leaderboard_delta' and payload.get('competition_id') is not None:
+        who = payload.get('participant_id') or payload.get('user_id')
+        # multi-participant deltas (``updates`` list) carry distinct rank moves; never collapse them
+        return (etype, str(payload['competition_id']), who) if who is not None else None
+    if etype == 'nav_update':
+        return (etype,)
+    return None
+
+
+def _current_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class WSConnection:
+    """Outbound state for one socket: a bounded frame queue drained by its own writer task.
+
+    Producers only ever enqueue pre-serialized frames; the writer task is the sole caller of
+    ``ws.send_text`` so a stalled client only backs up its own queue.
+    """
+    def __init__(self, ws: "WebSocket", max_queue: int | None = None, overflow_policy: str | None = None):
+        self.ws = ws
+        self.max_queue = max(1, max_queue or settings.ws_send_queue_max)
+        policy = overflow_policy or settings.ws_overflow_policy
+        self.overflow_policy = policy if policy in OVERFLOW_POLICIES else 'drop_oldest'
+        # (coalesce key, frame, event type, creation time) - creation time None for control frames
+        self.queue: deque[tuple[Optional[tuple], str, Optional[str], Optional[float]]] = deque()
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._writer: asyncio.Task | None = None
+        self.closed = False
+        self.close_code: int | None = None
+        # lag counters
+        self.enqueued = 0
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+        self.batches = 0
+        # Micro-batching (client opt-in): collect frames for this many seconds, send one batch frame
+        self.batch_window: float | None = None
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._writer = self.loop.create_task(self._run())
+
+    @property
+    def depth(self) -> int:
+        return len(self.queue)
+
+    def enqueue(self, frame: str, key: Optional[tuple] = None, etype: Optional[str] = None, created: Optional[float] = None) -> bool:
+        if self.closed:
+            return False
+        if len(self.queue) >= self.max_queue and not self._overflow(key):
+            return False
+        self.queue.append((key, frame, etype, created))
+        self.enqueued += 1
+        _fanout_stats['enqueued'] += 1
+        if len(self.queue) > self.max_depth:
+            self.max_depth = len(self.queue)
+        self._wake()
+        return True
+
+    def send_json(self, payload: dict) -> bool:
+        return self.enqueue(json.dumps(payload))
+
+    def set_batching(self, window_ms: float | None):
+        """Enable (window in ms) or disable (None/0) micro-batched delivery for this socket."""
+        if window_ms:
+            self.batch_window = min(max(float(window_ms), 1.0), 1000.0) / 1000.0
+        else:
+            self.batch_window = None
+
+    def _drain_batch(self) -> list[tuple[Optional[tuple], str, Optional[str], Optional[float]]]:
+        """Pop everything queued, keeping only the latest entry per coalesce key."""
+        entries = list(self.queue)
+        self.queue.clear()
+        last_idx: dict[tuple, int] = {}
+        for idx, entry in enumerate(entries):
+            if entry[0] is not None:
+                last_idx[entry[0]] = idx
+        kept = [entry for idx, entry in enumerate(entries) if entry[0] is None or last_idx[entry[0]] == idx]
+        superseded = len(entries) - len(kept)
+        if superseded:
+            self.coalesced += superseded
+            _fanout_stats['coalesced'] += superseded
+        return kept
+
+    def _overflow(self, key: Optional[tuple]) -> bool:
+        """Make room for one frame according to policy; False means the frame is rejected."""
+        if self.overflow_policy == 'disconnect':
+            self.dropped += 1
+            _fanout_stats['dropped'] += 1
+            _fanout_stats['slow_disconnects'] += 1
+            self.close(SLOW_CONSUMER_CLOSE_CODE)
+            return False
+        if self.overflow_policy == 'coalesce' and key is not None:
+            for idx, entry in enumerate(self.queue):
+                if entry[0] == key:
+                    del self.queue[idx]
+                    self.coalesced += 1
+                    _fanout_stats['coalesced'] += 1
+                    return True
+        self.queue.popleft()
+        self.dropped += 1
+        _fanout_stats['dropped'] += 1
+        return True
+
+    def _wake(self):
+        if self._wakeup is None or self.loop is None:
+            return
+        if _current_loop() is self.loop:
+            self._wakeup.set()
+        else:
+            try:
+                self.loop.call_soon_threadsafe(self._wakeup.set)
+            except RuntimeError:  # loop closed
+                self.closed = True
+
+    def close(self, code: int | None = None):
+        if self.closed:
+            return
+        self.closed = True
+        self.close_code = code
+        self._wake()
+
+    async def _run(self):
+        assert self._wakeup is not None
+        try:
+            while not self.closed:
+                if not self.queue:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                if self.batch_window:
+                    await asyncio.sleep(self.batch_window)  # let the burst accumulate
+                    entries = self._drain_batch()
+                    if not entries:
+                        continue
+                    # Frames are already serialized; splice them into the envelope without re-encoding
+                    if len(entries) == 1:
+                        frame = entries[0][1]
+                    else:
+                        frame = '{"type":"batch","count":%d,"events":[%s]}' % (len(entries), ','.join(e[1] for e in entries))
+                    await self.ws.send_text(frame)
+                    done = time.time()
+                    for _, _, etype, created in entries:
+                        if created is not None:
+                            _delivery_latency.observe(etype, done - created)
+                    self.batches += 1
+                    self.sent += len(entries)
+                    _fanout_stats['sent'] += len(entries)
+                    continue
+                _, frame, etype, created = self.queue.popleft()
+                await self.ws.send_text(frame)
+                if created is not None:
+                    _delivery_latency.observe(etype, time.time() - created)
+                self.sent += 1
+                _fanout_stats['sent'] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            pass
+        finally:
+            self.closed = True
+            self.queue.clear()
+            if self.close_code is not None:
+                try:
+                    await self.ws.close(code=self.close_code)
+                except Exception:
+                    pass
+            _drop_connection(self.ws)
+
+    def stats(self) -> dict:
+        return {
+            'depth': self.depth,
+            'max_depth': self.max_depth,
+            'enqueued': self.enqueued,
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+            'batches': self.batches,
+            'lag': self.depth,
+            'policy': self.overflow_policy,
+            'batch_window_ms': int(self.batch_window * 1000) if self.batch_window else 0,
+        }
+
+
+_connections: dict[int, WSConnection] = {}  # id(ws) -> outbound state
+
+
+def register_connection(ws: "WebSocket", max_queue: int | None = None, overflow_policy: str | None = None) -> WSConnection:
+    """Track an accepted socket and start its writer task (must run on the socket's loop)."""
+    conn = WSConnection(ws, max_queue=max_queue, overflow_policy=overflow_policy)
+    conn.start()
+    if not _sync_bridge.loop_usable():
+        _sync_bridge.bind_loop(conn.loop)  # type: ignore[arg-type]
+    _connections[id(ws)] = conn
+    _any_type.add(id(ws))
+    _any_comp.add(id(ws))
+    if ws not in websocket_connections:
+        websocket_connections.append(ws)
+    return conn
+
+
+def get_connection(ws: "WebSocket") -> Optional[WSConnection]:
+    return _connections.get(id(ws))
+
+
+def _drop_connection(ws: "WebSocket"):
+    conn = _connections.get(id(ws))
+    if conn is not None and conn.ws is ws:
+        _connections.pop(id(ws), None)
+    try:
+        websocket_connections.remove(ws)
+    except ValueError:
+        pass
+    cid = id(ws)
+    _index_remove(_subs_by_type, connection_filters.pop(cid, ()), cid)
+    _index_remove(_subs_by_comp, connection_comp_scopes.pop(cid, ()), cid)
+    _any_type.discard(cid)
+    _any_comp.discard(cid)
+
+
+def unregister_connection(ws: "WebSocket"):
+    conn = _connections.get(id(ws))
+    _drop_connection(ws)
+    if conn is not None and conn.ws is ws:
+        conn.closed = True
+        writer = conn._writer
+        if writer is not None and not writer.done() and _current_loop() is conn.loop:
+            writer.cancel()
+        else:
+            conn._wake()
+
+
+def get_connection_stats() -> dict:
+    """Fan-out counters plus current queue depth / lag across live connections."""
+    conns = list(_connections.values())
+    return {
+        **_fanout_stats,
+        'connections': len(conns),
+        'queue_depth': sum(c.depth for c in conns),
+        'max_queue_depth': max((c.depth for c in conns), default=0),
+        'lagging_connections': sum(1 for c in conns if c.depth > 0),
+    }
+
+
+# Inverted subscription index: dispatch cost grows with matching subscribers, not total sockets.
+# A socket is either in _any_type (no event filter) or in _subs_by_type[t] for each filtered t;
+# likewise for competition scope, so the two halves of each index are disjoint.
+_subs_by_type: dict[str, set[int]] = {}
+_subs_by_comp: dict[str, set[int]] = {}
+_any_type: set[int] = set()
+_any_comp: set[int] = set()
+
+
+def _index_remove(index: dict[str, set[int]], keys, cid: int):
+    for k in keys:
+        bucket = index.get(k)
+        if bucket is not None:
+            bucket.discard(cid)
+            if not bucket:
+                index.pop(k, None)
+
+
+def _index_add(index: dict[str, set[int]], keys, cid: int):
+    for k in keys:
+        index.setdefault(k, set()).add(cid)
+
+
 def set_connection_scope(ws: "WebSocket", competitions: list[str] | None):
+    cid = id(ws)
+    _index_remove(_subs_by_comp, connection_comp_scopes.get(cid, ()), cid)
+    _any_comp.discard(cid)
     if competitions:
-        connection_comp_scopes[id(ws)] = set(competitions)
+        scope = {str(c) for c in competitions}
+        connection_comp_scopes[cid] = scope
+        _index_add(_subs_by_comp, scope, cid)
     else:
-        connection_comp_scopes.pop(id(ws), None)
+        connection_comp_scopes.pop(cid, None)
+        if cid in _connections:
+            _any_comp.add(cid)
 
 def set_connection_filter(ws: "WebSocket", events: list[str] | None):
+    cid = id(ws)
+    _index_remove(_subs_by_type, connection_filters.get(cid, ()), cid)
+    _any_type.discard(cid)
     if events:
-        connection_filters[id(ws)] = set(events)
+        filt = set(events)
+        connection_filters[cid] = filt
+        _index_add(_subs_by_type, filt, cid)
     else:
-        connection_filters.pop(id(ws), None)
+        connection_filters.pop(cid, None)
+        if cid in _connections:
+            _any_type.add(cid)
+
+
+def _matching_ids(etype: Optional[str], comp_id: Optional[str]) -> list[int]:
+    """Connection ids subscribed to (etype, comp_id) using the inverted index."""
+    type_parts = (_subs_by_type.get(etype, set()), _any_type) if etype else None
+    comp_parts = (_subs_by_comp.get(comp_id, set()), _any_comp) if comp_id else None
+    if type_parts is None and comp_parts is None:
+        return list(_connections)
+    if comp_parts is None:
+        return [*type_parts[0], *type_parts[1]]  # type: ignore[index]
+    if type_parts is None:
+        return [*comp_parts[0], *comp_parts[1]]
+    # Walk the smaller side and probe the other
+    if len(type_parts[0]) + len(type_parts[1]) > len(comp_parts[0]) + len(comp_parts[1]):
+        type_parts, comp_parts = comp_parts, type_parts
+    probe_a, probe_b = comp_parts
+    return [cid for part in type_parts for cid in part if cid in probe_a or cid in probe_b]
+
+class ReplayLog:
+    """Bounded log of recently broadcast frames, keyed by their consecutive ``seq``.
+
+    Entries keep the already-serialized frame so replay never re-encodes payloads.
+    """
+    def __init__(self, maxlen: int):
+        # (seq, event type, competition id, coalesce key, frame, creation time)
+        self._entries: deque[tuple[int, Optional[str], Optional[str], Optional[tuple], str, float]] = deque(maxlen=max(1, maxlen))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def oldest_seq(self) -> Optional[int]:
+        return self._entries[0][0] if self._entries else None
+
+    @property
+    def latest_seq(self) -> Optional[int]:
+        return self._entries[-1][0] if self._entries else None
+
+    def append(self, seq: int, etype: Optional[str], comp_id: Optional[str], key: Optional[tuple], frame: str, created: float | None = None):
+        entry = (seq, etype, comp_id, key, frame, created if created is not None else time.time())
+        if not self._entries or seq > self._entries[-1][0]:
+            self._entries.append(entry)
+            return
+        # Frames from other workers can arrive slightly out of order; insert near the tail.
+        if seq < self._entries[0][0]:
+            return
+        idx = len(self._entries)
+        while idx > 0 and self._entries[idx - 1][0] > seq:
+            idx -= 1
+        if idx > 0 and self._entries[idx - 1][0] == seq:
+            return  # duplicate
+        if len(self._entries) == self._entries.maxlen:
+            self._entries.popleft()
+            idx -= 1
+            if idx < 0:
+                return
+        self._entries.insert(idx, entry)
+
+    def lookup(self, seq: int) -> Optional[tuple]:
+        """Entry for ``seq`` if still retained (recent entries are checked first)."""
+        for entry in reversed(self._entries):
+            if entry[0] == seq:
+                return entry
+            if entry[0] < seq:
+                break
+        return None
+
+    def since(self, seq: int) -> Optional[list[tuple[int, Optional[str], Optional[str], Optional[tuple], str, float]]]:
+        """Entries with a sequence above ``seq``; None when the log no longer covers the gap."""
+        if seq == _event_seq:
+            return []
+        latest, oldest = self.latest_seq, self.oldest_seq
+        if latest is None or oldest is None or seq > latest:
+            return None  # nothing logged, or client is ahead of us (sequence reset after a restart)
+        if seq < oldest - 1:
+            return None
+        return [e for e in self._entries if e[0] > seq]
+
+    def clear(self):
+        self._entries.clear()
+
+
+_replay_log = ReplayLog(settings.ws_replay_buffer_size)
+_replay_redis = None  # lazily created async client when a Redis stream backs the log
+
+
+def _get_replay_redis():
+    global _replay_redis
+    if not settings.ws_replay_redis_stream:
+        return None
+    if _replay_redis is None:
+        try:
+            import redis.asyncio as aioredis
+            _replay_redis = aioredis.from_url(settings.redis_url, decode_responses=True)
+        except Exception:
+            return None
+    return _replay_redis
+
+
+async def _persist_replay(seq: int, frame: str):
+    client = _get_replay_redis()
+    if client is None:
+        return
+    try:
+        await client.xadd(settings.ws_replay_redis_stream, {'seq': seq, 'frame': frame}, maxlen=settings.ws_replay_buffer_size, approximate=True)
+    except Exception:
+        pass
+
+
+async def restore_replay_log() -> int:
+    """Reload the replay tail from the Redis stream (if configured) so reconnects survive restarts.
+
+    Returns number of frames restored. Also advances the in-memory sequence past the restored tail.
+    """
+    global _event_seq
+    client = _get_replay_redis()
+    if client is None:
+        return 0
+    try:
+        rows = await client.xrevrange(settings.ws_replay_redis_stream, count=settings.ws_replay_buffer_size)
+    except Exception:
+        return 0
+    restored = 0
+    for _, fields in reversed(rows or []):
+        try:
+            frame = fields['frame']
+            payload = json.loads(frame)
+            seq = int(fields.get('seq') or payload.get('seq'))
+        except Exception:
+            continue
+        comp = payload.get('competition_id')
+        ts = payload.get('ts')
+        _replay_log.append(seq, payload.get('type'), str(comp) if comp is not None else None, _coalesce_key(payload), frame, float(ts) if isinstance(ts, (int, float)) else None)
+        _event_seq = max(_event_seq, seq)
+        restored += 1
+    return restored
+
+
+def _conn_accepts(cid: int, etype: Optional[str], comp_id: Optional[str]) -> bool:
+    filt = connection_filters.get(cid)
+    if etype and filt and etype not in filt:
+        return False
+    scope = connection_comp_scopes.get(cid)
+    if scope and comp_id and comp_id not in scope:
+        return False
+    return True
+
+
+def replay_since(conn: WSConnection, since_seq: int) -> int:
+    """Enqueue frames missed since ``since_seq`` (honoring the socket's filters) onto ``conn``.
+
+    Must run without awaiting between registration and the first live frame so no event is
+    skipped or duplicated. When the gap is not covered (or would overflow the send queue) a
+    single ``resync_required`` frame is sent instead and the client should refetch over REST.
+    Returns the number of replayed frames (-1 on resync).
+    """
+    entries = _replay_log.since(since_seq)
+    cid = id(conn.ws)
+    if entries is not None:
+        entries = [e for e in entries if _conn_accepts(cid, e[1], e[2])]
+    if entries is None or len(entries) > conn.max_queue:
+        conn.send_json({
+            'type': 'resync_required',
+            'since_seq': since_seq,
+            'oldest_seq': _replay_log.oldest_seq,
+            'latest_seq': _event_seq,
+        })
+        return -1
+    for _, etype, _, key, frame, _ in entries:
+        conn.enqueue(frame, key, etype)  # replayed frames are not timed as live deliveries
+    return len(entries)
+
+
+def current_seq() -> int:
+    return _event_seq
+
+
+def record_client_ack(seq: int) -> Optional[float]:
+    """Record event creation -> client acknowledgement for ``seq``; returns the RTT (seconds)."""
+    entry = _replay_log.lookup(seq)
+    if entry is None:
+        return None
+    rtt = time.time() - entry[5]
+    _ack_rtt.observe(entry[1], rtt)
+    return rtt
+
+
+def get_latency_histograms() -> dict:
+    return {'delivery': _delivery_latency, 'ack_rtt': _ack_rtt, 'fanout_enqueue': _fanout_enqueue_latency}
+
+def _deliver_local(seq, etype: Optional[str], comp_key: Optional[str], key: Optional[tuple], data: str, created: float):
+    """Record a serialized frame in the replay log and enqueue it on this worker's matching sockets."""
+    global _event_seq
+    if isinstance(seq, int):
+        _replay_log.append(seq, etype, comp_key, key, data, created)
+        if seq > _event_seq:
+            _event_seq = seq
+    start_send = time.time()
+    for cid in _matching_ids(etype, comp_key):
+        conn = _connections.get(cid)
+        if conn is not None:
+            conn.enqueue(data, key, etype, created)
+    _fanout_enqueue_latency.observe(time.time() - start_send)
+
+
+def _deliver_frame(data: str):
+    """Fan out a frame serialized by another worker (decoded once per worker, not per socket)."""
+    try:
+        payload = json.loads(data)
+    except Exception:
+        return
+    comp_id = payload.get('competition_id')
+    ts = payload.get('ts')
+    created = float(ts) if isinstance(ts, (int, float)) else time.time()
+    _deliver_local(payload.get('seq'), payload.get('type'), str(comp_id) if comp_id is not None else None, _coalesce_key(payload), data, created)
+
+
+class InProcessBroadcastBackend:
+    """Default backend: sequence and fan-out are local to this process."""
+    name = 'memory'
+
+    async def next_seq(self) -> int:
+        global _event_seq
+        _event_seq += 1
+        return _event_seq
+
+    async def publish(self, data: str):
+        return None
+
+    async def start(self):
+        return None
+
+    async def stop(self):
+        return None
+
+
+class BroadcastSequenceUnavailable(RuntimeError):
+    """The backend could not assign a sequence; the event must not be published."""
+
+
+class RedisBroadcastBackend:
+    """Cross-worker bus over Redis pub/sub with a globally monotonic sequence (INCR).
+
+    The publishing worker fans out locally right away and publishes the frame once; every other
+    worker receives it on its subscriber task and fans out to its own sockets. Messages are
+    prefixed with the origin worker id so a worker never delivers its own frame twice.
+    """
+    name = 'redis'
+
+    def __init__(self, client=None, channel: str | None = None, seq_key: str | None = None, worker_id: str | None = None):
+        self._client = client
+        self.channel = channel or settings.ws_broadcast_channel
+        self.seq_key = seq_key or f"{self.channel}:seq"
+        import os, uuid
+        self.worker_id = worker_id or f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._pubsub = None
+        self._listener: asyncio.Task | None = None
+        self.published = 0
+        self.received = 0
+        self.errors = 0
+
+    @property
+    def client(self):
+        if self._client is None:
+            import redis.asyncio as aioredis
+            self._client = aioredis.from_url(settings.redis_url, decode_responses=True)
+        return self._client
+
+    async def next_seq(self) -> int:
+        try:
+            return int(await self.client.incr(self.seq_key))
+        except Exception as exc:
+            # a locally guessed seq could collide with one another worker got from INCR, and clients
+            # resume by seq, so the event is dropped rather than published out of the global order
+            self.errors += 1
+            raise BroadcastSequenceUnavailable(str(exc)) from exc
+
+    async def publish(self, data: str):
+        try:
+            await self.client.publish(self.channel, f"{self.worker_id}|{data}")
+            self.published += 1
+        except Exception:
+            self.errors += 1
+
+    async def start(self):
+        if self._listener is not None and not self._listener.done():
+            return
+        self._pubsub = self.client.pubsub()
+        await self._pubsub.subscribe(self.channel)
+        self._listener = asyncio.get_running_loop().create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._listener = None
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.unsubscribe(self.channel)
+            except Exception:
+                pass
+            self._pubsub = None
+
+    def handle_message(self, raw) -> bool:
+        if isinstance(raw, bytes):
+            raw = raw.decode()
+        origin, sep, data = str(raw).partition('|')
+        if not sep or origin == self.worker_id:
+            return False
+        self.received += 1
+        _deliver_frame(data)
+        return True
+
+    async def _listen(self):
+        assert self._pubsub is not None
+        while True:
+            try:
+                msg = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.errors += 1
+                await asyncio.sleep(1.0)
+                continue
+            if msg and msg.get('type') == 'message':
+                self.handle_message(msg.get('data'))
+
+
+def _make_backend():
+    if (settings.ws_broadcast_backend or 'memory').lower() == 'redis':
+        return RedisBroadcastBackend()
+    return InProcessBroadcastBackend()
+
+
+_backend = _make_backend()
+
+
+def set_broadcast_backend(backend) -> None:
+    """Swap the broadcast backend (startup wiring / tests)."""
+    global _backend
+    _backend = backend
+
+
+def get_broadcast_backend():
+    return _backend
+
+
+async def start_broadcast_backend():
+    await _backend.start()
+
+
+async def stop_broadcast_backend():
+    await _backend.stop()
 
-_ws_latency_samples: list[float] = []  # rolling samples (seconds)
-_WS_LATENCY_MAX = 500
 
 async def broadcast_event(payload: dict):
-    """Broadcast a JSON-serializable event to all connections honoring filters & scopes.
+    """Broadcast a JSON-serializable event to subscribed connections honoring filters & scopes.
 
     Automatically augments payload with monotonic sequence and timestamp if not present.
+    The payload is serialized once, handed to each matching local connection's send queue and
+    published once on the backend so other workers can fan it out to their own sockets.
+    Returns False (nothing delivered) when the backend cannot assign a sequence.
     """
-    global _event_seq
-    _event_seq += 1
+    created = time.time()
     if 'seq' not in payload:
-        payload['seq'] = _event_seq
+        try:
+            payload['seq'] = await _backend.next_seq()
+        except BroadcastSequenceUnavailable:
+            _fanout_stats['unsequenced'] += 1
+            return False
     if 'ts' not in payload:
-        payload['ts'] = time.time()
+        payload['ts'] = created
     etype = payload.get("type")
     comp_id = payload.get("competition_id")
-    dead: list["WebSocket"] = []
     data = json.dumps(payload)
-    start_send = time.time()
-    for ws in list(websocket_connections):
-        try:
-            filt = connection_filters.get(id(ws))
-            if etype and filt and etype not in filt:
-                continue
-            # scope filtering
-            scope = connection_comp_scopes.get(id(ws))
-            if scope and comp_id and comp_id not in scope:
-                continue
-            await ws.send_text(data)
-        except Exception:
-            dead.append(ws)
-    for d in dead:
+    seq = payload['seq']
+    _deliver_local(seq, etype, str(comp_id) if comp_id is not None else None, _coalesce_key(payload), data, created)
+    await _backend.publish(data)
+    if settings.ws_replay_redis_stream and isinstance(seq, int):
+        await _persist_replay(seq, data)
+    return True
+
+class SyncBroadcastBridge:
+    """Thread-safe publish path for sync code (threadpool handlers, scheduler/background threads).
+
+    Producers append to a bounded deque (atomic in CPython, no lock) and, if no drain is pending,
+    wake the bound event loop with ``call_soon_threadsafe``; the loop drains in batches and runs
+    ``broadcast_event`` for each payload. A short lock guards only the drain-pending flag, which the
+    drain clears once it finds the deque empty, so an append racing the end of a drain always
+    schedules the next one. Producers never block on publishing or touch loop state directly.
+    Until a loop is bound, payloads are held (deferred) up to capacity.
+    """
+    def __init__(self, capacity: int | None = None, batch_size: int | None = None):
+        self.capacity = max(1, capacity or settings.ws_sync_queue_capacity)
+        self.batch_size = max(1, batch_size or settings.ws_sync_drain_batch)
+        self._pending: deque[dict] = deque()
+        self._drain_scheduled = False
+        self._drain_lock = threading.Lock()
+        self.loop: asyncio.AbstractEventLoop | None = None
+        # counters
+        self.submitted = 0
+        self.published = 0
+        self.dropped = 0
+        self.deferred = 0
+        self.drains = 0
+        self.errors = 0
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        if self._pending:
+            self._request_drain(loop)
+
+    def loop_usable(self) -> bool:
+        loop = self.loop
+        return loop is not None and not loop.is_closed() and loop.is_running()
+
+    def publish(self, payload: dict):
+        self.submitted += 1
+        loop = self.loop
+        if loop is not None and _current_loop() is loop:
+            # Already on the loop thread: no hand-off needed
+            loop.create_task(self._publish_one(payload))
+            return
+        if len(self._pending) >= self.capacity:
+            try:
+                self._pending.popleft()
+            except IndexError:
+                pass
+            self.dropped += 1
+        self._pending.append(payload)
+        if not self.loop_usable():
+            self.deferred += 1
+            return
+        self._request_drain(loop)  # type: ignore[arg-type]
+
+    def _request_drain(self, loop: asyncio.AbstractEventLoop):
+        with self._drain_lock:
+            if self._drain_scheduled:
+                return
+            self._drain_scheduled = True
         try:
-            websocket_connections.remove(d)
-            connection_filters.pop(id(d), None)
-            connection_comp_scopes.pop(id(d), None)
-        except ValueError:
-            pass
-    # Record simple batch latency (time to iterate & schedule sends)
-    elapsed = time.time() - start_send
-    _ws_latency_samples.append(elapsed)
-    if len(_ws_latency_samples) > _WS_LATENCY_MAX:
-        _ws_latency_samples.pop(0)
+            loop.call_soon_threadsafe(self._start_drain)
+        except RuntimeError:  # loop closed between check and call
+            with self._drain_lock:
+                self._drain_scheduled = False
+            self.deferred += 1
 
-def get_sync_broadcast() -> Optional[Callable[[dict], None]]:
-    try:
-        loop = asyncio.get_event_loop()
-    except RuntimeError:
-        return None
-    def sync_send(payload: dict):
+    def _start_drain(self):
+        asyncio.get_running_loop().create_task(self._drain())
+
+    async def _publish_one(self, payload: dict):
         try:
-            # If loop is running (e.g. inside FastAPI lifespan), schedule task.
-            if loop.is_running():
-                loop.create_task(broadcast_event(payload))
-            else:  # execute immediately (test / sync context)
-                loop.run_until_complete(broadcast_event(payload))
+            if await broadcast_event(payload):
+                self.published += 1
+            else:
+                self.errors += 1
         except Exception:
-            pass
-    return sync_send
+            self.errors += 1
+
+    async def _drain(self):
+        self.drains += 1
+        while True:
+            for _ in range(min(self.batch_size, len(self._pending))):
+                try:
+                    payload = self._pending.popleft()
+                except IndexError:
+                    break
+                await self._publish_one(payload)
+            # Clear the flag only once the deque is seen empty under the lock: a producer that
+            # appended before this check is drained here, one appending after it finds the flag
+            # cleared and schedules a new drain
+            with self._drain_lock:
+                if not self._pending:
+                    self._drain_scheduled = False
+                    return
+            await asyncio.sleep(0)  # yield between batches so sockets / requests keep flowing
+
+    def stats(self) -> dict:
+        return {
+            'submitted': self.submitted,
+            'published': self.published,
+            'dropped': self.dropped,
+            'deferred': self.deferred,
+            'pending': len(self._pending),
+            'drains': self.drains,
+            'errors': self.errors,
+        }
+
+
+_sync_bridge = SyncBroadcastBridge()
+
+
+def bind_sync_loop(loop: asyncio.AbstractEventLoop | None = None):
+    """Attach the sync bridge to the serving event loop (called at startup / first socket)."""
+    _sync_bridge.bind_loop(loop or asyncio.get_running_loop())
+
+
+def get_sync_bridge() -> SyncBroadcastBridge:
+    return _sync_bridge
+
+
+def get_sync_broadcast() -> Optional[Callable[[dict], None]]:
+    """Callable that publishes from any thread without blocking (see SyncBroadcastBridge)."""
+    return _sync_bridge.publish
 
 __all__ = [
-    'websocket_connections', 'set_connection_filter', 'broadcast_event', 'get_sync_broadcast', 'set_connection_scope', 'connection_comp_scopes', '_ws_latency_samples'
+    'websocket_connections', 'set_connection_filter', 'broadcast_event', 'get_sync_broadcast', 'set_connection_scope', 'connection_comp_scopes',
+    'WSConnection', 'register_connection', 'unregister_connection', 'get_connection', 'get_connection_stats',
+    'ReplayLog', 'replay_since', 'restore_replay_log', 'current_seq',
+    'InProcessBroadcastBackend', 'RedisBroadcastBackend', 'BroadcastSequenceUnavailable', 'set_broadcast_backend', 'get_broadcast_backend',
+    'start_broadcast_backend', 'stop_broadcast_backend',
+    'SyncBroadcastBridge', 'bind_sync_loop', 'get_sync_bridge',
+    'record_client_ack', 'get_latency_histograms',
 ]
@@ -0,0 +1,62 @@
+"""Verify the whole audit integrity hash chain across worker processes.
+
+Each checkpoint-to-checkpoint segment (plus the tail after the newest checkpoint) starts from a known
+chain hash, so segments are verified independently and in parallel. Run from apps/api:
+
+  python -m app.cli.verify_audit_chain [--workers 4] [--batch-size 5000] [--extend]
+
+``--extend`` first runs the background verifier once so fresh events get checkpointed (and split into
+segments) before the parallel pass. Exits non-zero if any segment fails.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+# Add the project root to the Python path to allow for absolute imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from app.database import SessionLocal, engine
+from app.services.audit_verify_service import audit_chain_verifier, verify_segment
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def _init_worker():
+    # forked children must not reuse the parent's pooled connections
+    engine.dispose(close=False)
+
+
+def _verify(segment, batch_size: int) -> dict:
+    with SessionLocal() as db:
+        return verify_segment(db, *segment, batch_size=batch_size)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    ap.add_argument('--batch-size', type=int, default=5000)
+    ap.add_argument('--extend', action='store_true', help='checkpoint new events before verifying')
+    args = ap.parse_args(argv)
+    with SessionLocal() as db:
+        if args.extend:
+            logger.info("Extending checkpoints: %s events verified", audit_chain_verifier.run_once(db, batch_size=args.batch_size))
+        segments = audit_chain_verifier.segments(db)
+    logger.info("Verifying %s segments with %s workers", len(segments), args.workers)
+    failed = 0
+    events = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.workers), initializer=_init_worker) as pool:
+        for result in pool.map(_verify, segments, [args.batch_size] * len(segments)):
+            events += result['events']
+            if not result['ok']:
+                failed += 1
+                print(json.dumps(result), file=sys.stderr)
+    logger.info("Verified %s events: %s/%s segments ok", events, len(segments) - failed, len(segments))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -92,7 +92,11 @@ class Settings(BaseSettings):
     valuation_trade_lookback_minutes: int = 720
     valuation_decay_lambda: float = 0.00005
     valuation_min_samples_trade: int = 2
+    valuation_cache_ttl_seconds: int = 30  # reuse a valuation while its inputs are unchanged; 0 = off
+    valuation_trade_state_ttl_seconds: int = 60  # reseed in-memory trade signals (trades from other processes); 0 = never
     valuation_freshness_lambda: float = 0.00005
+    valuation_stream_chunk_size: int = 500  # domains per transaction in /valuation/batch/stream
+    valuation_stream_max_chunk_size: int = 5000
     valuation_dispute_vote_threshold: int = 3
     orderbook_snapshot_interval_seconds: int = 21600  # 6 hours - runs 4 times per day
     reconciliation_interval_seconds: int = 21600  # 6 hours - runs 4 times per day
@@ -112,6 +116,36 @@ class Settings(BaseSettings):
     reward_min_multiplier: float = 0.5
     reward_max_multiplier: float = 3.0
 
+    # Realtime / WebSocket fan-out
+    ws_send_queue_max: int = 256  # per-connection outbound frame queue bound
+    ws_overflow_policy: str = "drop_oldest"  # drop_oldest | coalesce | disconnect
+    ws_replay_buffer_size: int = 2048  # recent frames kept for since_seq reconnect replay
+    ws_replay_redis_stream: Optional[str] = None  # e.g. "ws:replay"; mirrors the replay log so it survives restarts
+    ws_batch_window_ms: int = 25  # default micro-batch window for clients that opt in with batch=1
+    ws_sync_queue_capacity: int = 10000  # events buffered from sync/threaded publishers before dropping oldest
+    ws_sync_drain_batch: int = 256  # events published per loop turn when draining the sync bridge
+    ws_broadcast_backend: str = "memory"  # memory (single process) | redis (pub/sub bus shared by all workers)
+    ws_broadcast_channel: str = "ws:events"  # redis channel; global sequence lives at "<channel>:seq"
+    # Leaderboards (kept in memory / Redis ZSET, deltas published on a tick)
+    leaderboard_backend: str = "memory"  # memory (per process) | redis (ZSET per competition, shared by workers)
+    leaderboard_redis_prefix: str = "lb"
+    leaderboard_tick_ms: int = 250  # rank-change deltas are coalesced and published once per tick
+    leaderboard_delta_max_updates: int = 500  # larger rank shifts are split across several leaderboard_delta frames
+    leaderboard_reload_seconds: int = 60  # in-process store re-reads its competitions (values from other workers); 0 = never
+    # Audit integrity chain verification (background verifier writes checkpoints)
+    audit_checkpoint_interval: int = 10000  # verified events between chain checkpoints
+    audit_verify_interval_seconds: int = 300
+    # Merkle snapshots (leader-elected: one process in the fleet holds the snapshot lease)
+    merkle_snapshot_interval_seconds: int = 300
+    scheduler_lease_ttl_seconds: int = 30  # a dead leader is replaced within one ttl
+    # Merkle root anchoring (background worker; only the newest pending root is anchored)
+    anchor_interval_seconds: int = 60  # minimum spacing between anchoring transactions
+    anchor_backoff_base_seconds: float = 2.0  # doubled per consecutive failure
+    anchor_backoff_max_seconds: float = 300.0
+    anchor_confirmations: int = 0  # >0 waits for that many confirmations before the next root
+    anchor_confirm_timeout_seconds: int = 600  # unconfirmed txs are re-submitted with the same nonce
+    anchor_sender_address: Optional[str] = None  # seeds the local nonce counter from the pending count
+
     # Anti-abuse / Phase 6
     rate_limit_trades_per_minute: int = 30
     rate_limit_trades_burst: int = 10
@@ -124,7 +158,8 @@ class Settings(BaseSettings):
     enable_nav_calculations: bool = Field(default=False, alias='ENABLE_NAV_CALCULATIONS')
     enable_reconciliation: bool = Field(default=False, alias='ENABLE_RECONCILIATION')
     enable_backfill_service: bool = Field(default=False, alias='ENABLE_BACKFILL_SERVICE')
-    enable_merkle_service: bool = Field(default=False, alias='ENABLE_MERKLE_SERVICE')
+    enable_merkle_service: bool = Field(default=True, alias='ENABLE_MERKLE_SERVICE')  # gates the leader-elected snapshot/indexing tick
+    enable_audit_verifier: bool = Field(default=False, alias='ENABLE_AUDIT_VERIFIER')
 
     # Admins - Simplified to avoid pydantic parsing issues
     admin_wallets: list[str] = Field(default_factory=list)
@@ -1,5 +1,6 @@
 import re
 from fastapi import FastAPI, WebSocket
+from fastapi.responses import PlainTextResponse
 from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 from .routers import health, auth, competitions, users, portfolio, poll, domains, valuation, market, etf, seasons, settlement, incentives, policy, orderfeed, defi, marketplace, debug
@@ -32,9 +33,6 @@ except Exception: nav_service = type('x',(),{'run_once':lambda *a,**k:None})()
 try:
     from app.services.snapshot_service import snapshot_service  # type: ignore
 except Exception: snapshot_service = type('x',(),{'snapshot_once':lambda *a,**k:None})()  # type: ignore
-try:
-    from app.services.merkle_service import merkle_service  # type: ignore
-except Exception: merkle_service = type('x',(),{'snapshot_incremental':lambda *a,**k:None})()  # type: ignore
 try:
     from app.services.chain_ingest_service import chain_ingest_service  # type: ignore
 except Exception: chain_ingest_service = type('x',(),{'run_once':lambda *a,**k:None})()  # type: ignore
@@ -78,6 +76,36 @@ async def lifespan(app_: FastAPI):
                 logger.warning("[security] Production app_env with inline (possibly ephemeral) JWT private key detected. Replace with managed secret before deployment.")
     except Exception:
         logger.exception("[security] Ephemeral key detection failed")
+    # Restore websocket replay tail (Redis stream backed) so reconnecting clients can resume across deploys
+    from . import broadcast as _bc_startup
+    try:
+        restored = await _bc_startup.restore_replay_log()
+        if restored:
+            logger.info("[ws] restored %s replay frames (seq=%s)", restored, _bc_startup.current_seq())
+    except Exception:
+        logger.exception("[ws] replay restore failed")
+    # Sync endpoints and background threads publish through a bridge bound to this loop
+    _bc_startup.bind_sync_loop(asyncio.get_running_loop())
+    try:
+        await _bc_startup.start_broadcast_backend()
+        logger.info("[ws] broadcast backend=%s", _bc_startup.get_broadcast_backend().name)
+    except Exception:
+        logger.exception("[ws] broadcast backend start failed; events stay local to this worker")
+    try:
+        from app.services.leaderboard_service import leaderboard_service
+        leaderboard_service.start()
+    except Exception:
+        logger.exception("[leaderboard] tick loop start failed; deltas publish inline")
+    try:
+        from app.services.blockchain_service import blockchain_service as _bcs
+        # the worker anchors only while this process holds the snapshot lease, which the scheduler
+        # tick (gated by ENABLE_MERKLE_SERVICE) maintains
+        if settings.app_env != "test" and settings.enable_merkle_service and _bcs.ensure_initialized():
+            from app.services.anchor_service import anchor_worker
+            anchor_worker.start()
+            logger.info("[anchor] merkle root anchoring worker started interval=%ss (snapshot lease holder only)", settings.anchor_interval_seconds)
+    except Exception:
+        logger.exception("[anchor] worker start failed; snapshot roots stay queued")
     # Optionally start background poller
     async def poll_loop():
         interval = 21600  # 6 hours - runs 4 times per day
@@ -213,28 +241,23 @@ async def lifespan(app_: FastAPI):
                 logger.exception("[snapshot] run failed")
             await asyncio.sleep(interval)
 
-    async def merkle_loop():
-        interval = 21600  # 6 hours - runs 4 times per day
-        logger.info("[merkle] loop started interval=%ss (4x daily)", interval)
-        await asyncio.sleep(10)  # Initial delay to let app fully start
+    async def audit_verify_loop():
+        interval = settings.audit_verify_interval_seconds
         from app.database import SessionLocal as _SL
+        from app.services.audit_verify_service import audit_chain_verifier
+        logger.info("[audit] chain verifier loop started interval=%ss", interval)
+        await asyncio.sleep(10)  # Initial delay to let app fully start
+
+        def _run():
+            with _SL() as db:
+                return audit_chain_verifier.run_once(db)
         while True:
-            db = _SL()
             try:
-                snap = merkle_service.snapshot_incremental(db)
-                if snap:
-                    logger.info("[merkle] new snapshot root=%s events=%s", snap.merkle_root, snap.event_count)
+                verified = await asyncio.to_thread(_run)
+                if verified:
+                    logger.info("[audit] verified %s chain events (through id=%s)", verified, audit_chain_verifier.verified_through)
             except Exception:
-                logger.exception("[merkle] snapshot loop error")
-                try:
-                    db.rollback()
-                except Exception:
-                    pass
-            finally:
-                try:
-                    db.close()
-                except Exception:
-                    pass
+                logger.exception("[audit] chain verifier error")
             await asyncio.sleep(interval)
 
     async def chain_ingest_loop():
@@ -332,10 +355,15 @@ async def lifespan(app_: FastAPI):
         logger.info("[startup] Backfill service disabled")
         
     if settings.enable_merkle_service:
-        logger.info("[startup] Merkle service enabled")
+        logger.info("[startup] Merkle snapshots every %ss from the lease holder (background scheduler)", settings.merkle_snapshot_interval_seconds)
     else:
         logger.info("[startup] Merkle service disabled")
         
+    if settings.enable_audit_verifier:
+        logger.info("[startup] Audit chain verifier enabled")
+    else:
+        logger.info("[startup] Audit chain verifier disabled")
+
     if settings.enable_raw_chain_ingest:
         logger.info("[startup] Chain ingest enabled")
     else:
@@ -347,7 +375,7 @@ async def lifespan(app_: FastAPI):
     else:
         logger.info("[startup] DomaRank Oracle disabled")
     
-    # Start lightweight thread-based scheduler (periodic merkle snapshot + chain ingest stub)
+    # Start lightweight thread-based scheduler (leader-elected merkle snapshot + chain ingest stub)
     try:
         from .background import scheduler
         # Start scheduler in background thread to avoid blocking startup
@@ -362,6 +390,19 @@ async def lifespan(app_: FastAPI):
     async def start_background_tasks_delayed():
         await asyncio.sleep(5)  # Wait 5 seconds for app to be fully ready
         logger.info("[startup] Starting background tasks...")
+
+        if settings.app_env != "test":
+            # warm the rolling trade signals for domains that traded inside the valuation lookback
+            try:
+                from app.database import SessionLocal as _SL
+                from app.services.trade_state import trade_state
+
+                def _warm():
+                    with _SL() as db:
+                        return trade_state.rebuild(db)
+                logger.info("[valuation] trade state loaded for %s domains", await asyncio.to_thread(_warm))
+            except Exception:
+                logger.exception("[valuation] trade state warm-up failed; domains load on first valuation")
         
         if settings.enable_background_polling and settings.doma_poll_base_url and settings.doma_poll_api_key and settings.app_env != "test":
             loop_tasks.append(asyncio.create_task(poll_loop()))
@@ -379,9 +420,9 @@ async def lifespan(app_: FastAPI):
         if settings.enable_backfill_service and settings.app_env != "test":
             loop_tasks.append(asyncio.create_task(backfill_loop()))
             
-        if settings.enable_merkle_service:
-            loop_tasks.append(asyncio.create_task(merkle_loop()))
-            
+        if settings.enable_audit_verifier:
+            loop_tasks.append(asyncio.create_task(audit_verify_loop()))
+
         if settings.enable_raw_chain_ingest:
             loop_tasks.append(asyncio.create_task(chain_ingest_loop()))
             
@@ -417,6 +458,21 @@ async def lifespan(app_: FastAPI):
             pass  # Expected when cancelling tasks
         except Exception:
             logger.exception("Error during task shutdown")
+    try:
+        from app.services.leaderboard_service import leaderboard_service
+        await leaderboard_service.stop()
+    except Exception:
+        logger.exception("Failed to stop leaderboard tick loop")
+    try:
+        from app.services.anchor_service import anchor_worker
+        anchor_worker.stop()
+    except Exception:
+        logger.exception("Failed to stop anchor worker")
+    try:
+        from . import broadcast as _bc_shutdown
+        await _bc_shutdown.stop_broadcast_backend()
+    except Exception:
+        logger.exception("Failed to stop broadcast backend")
     # Stop scheduler
     try:
         from .background import scheduler
@@ -432,6 +488,11 @@ websocket_connections = getattr(_bc, 'websocket_connections', [])
 set_connection_filter = getattr(_bc, 'set_connection_filter', lambda *a, **k: None)
 broadcast_event = getattr(_bc, 'broadcast_event', lambda *a, **k: None)
 set_connection_scope = getattr(_bc, 'set_connection_scope', lambda *a, **k: None)
+register_connection = _bc.register_connection
+unregister_connection = _bc.unregister_connection
+replay_since = _bc.replay_since
+current_seq = _bc.current_seq
+record_client_ack = _bc.record_client_ack
 
 # CORS (support localhost + dynamic cloudspaces preview host pattern)
 # A 400 on OPTIONS previously indicated the Origin did not match the static allow_origins list,
@@ -493,9 +554,10 @@ app.include_router(debug.router, prefix="/api/v1")
 
 
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket, events: str | None = None, competitions: str | None = None):
+async def websocket_endpoint(websocket: WebSocket, events: str | None = None, competitions: str | None = None, since_seq: int | None = None, batch: int | None = None):
     await websocket.accept()
-    websocket_connections.append(websocket)
+    # All outbound frames go through the connection's send queue; only its writer task awaits the socket.
+    conn = register_connection(websocket)
     if events:
         requested = [e.strip() for e in events.split(',') if e.strip()]
         if requested:
@@ -504,8 +566,15 @@ async def websocket_endpoint(websocket: WebSocket, events: str | None = None, co
         comps = [c.strip() for c in competitions.split(',') if c.strip()]
         if comps:
             set_connection_scope(websocket, comps)
-    # send initial hello w/ sequence bootstrap (no persistence, so just 0)
-    await websocket.send_json({'type': 'hello', 'seq': 0})
+    if batch:
+        # batch=1 -> default window; batch=<n> (n>1) -> n ms window
+        conn.set_batching(batch if batch > 1 else settings.ws_batch_window_ms)
+    # hello carries the current sequence; a reconnecting client passes since_seq to receive only
+    # the frames it missed (or a resync_required signal). No await until this is enqueued, so no
+    # live frame can slip in between the replay and the stream.
+    conn.send_json({'type': 'hello', 'seq': current_seq()})
+    if since_seq is not None:
+        replay_since(conn, since_seq)
     try:
         while True:
             raw = await websocket.receive_text()
@@ -513,15 +582,23 @@ async def websocket_endpoint(websocket: WebSocket, events: str | None = None, co
             if raw.startswith('SUB '):
                 evs = [e.strip() for e in raw[4:].split(',') if e.strip()]
                 set_connection_filter(websocket, evs)
-                await websocket.send_json({'type': 'subscribed', 'events': evs})
+                conn.send_json({'type': 'subscribed', 'events': evs})
                 continue
             if raw.startswith('UNSUB'):
                 set_connection_filter(websocket, None)
-                await websocket.send_json({'type': 'unsubscribed'})
+                conn.send_json({'type': 'unsubscribed'})
                 continue
-            # Heartbeat: client can send PING; respond with PONG
+            # Heartbeat: client can send PING; respond with PONG ("PING <seq>" also acknowledges an event)
             if raw == 'PING':
-                await websocket.send_json({'type': 'pong'})
+                conn.send_json({'type': 'pong'})
+                continue
+            if raw.startswith('PING '):
+                try:
+                    ack_seq = int(raw[5:].strip())
+                    record_client_ack(ack_seq)
+                    conn.send_json({'type': 'pong', 'seq': ack_seq})
+                except ValueError:
+                    conn.send_json({'type': 'pong'})
                 continue
             # Attempt JSON parse for structured commands
             try:
@@ -537,30 +614,40 @@ async def websocket_endpoint(websocket: WebSocket, events: str | None = None, co
                     comps = cmd.get('competitions') or []
                     set_connection_filter(websocket, evs if evs else None)
                     set_connection_scope(websocket, comps if comps else None)
-                    await websocket.send_json({'type': 'subscribed', 'events': evs, 'competitions': comps})
+                    if 'batch' in cmd or 'batch_window_ms' in cmd:
+                        want = cmd.get('batch_window_ms') or (settings.ws_batch_window_ms if cmd.get('batch') else None)
+                        try:
+                            conn.set_batching(float(want) if want else None)
+                        except (TypeError, ValueError):
+                            conn.set_batching(None)
+                    conn.send_json({'type': 'subscribed', 'events': evs, 'competitions': comps, 'seq': current_seq(), 'batch_window_ms': int(conn.batch_window * 1000) if conn.batch_window else 0})
+                    if cmd.get('since_seq') is not None:
+                        try:
+                            replay_since(conn, int(cmd['since_seq']))
+                        except (TypeError, ValueError):
+                            conn.send_json({'type': 'error', 'code': 'BAD_SINCE_SEQ', 'detail': str(cmd.get('since_seq'))})
                 elif action == 'UNSUB':
                     set_connection_filter(websocket, None)
                     set_connection_scope(websocket, None)
-                    await websocket.send_json({'type': 'unsubscribed'})
+                    conn.send_json({'type': 'unsubscribed'})
                 elif action == 'PING':
-                    await websocket.send_json({'type': 'pong'})
+                    ack_seq = cmd.get('seq')
+                    if isinstance(ack_seq, int):
+                        # Client-acknowledged round trip for the event with this seq
+                        record_client_ack(ack_seq)
+                        conn.send_json({'type': 'pong', 'seq': ack_seq})
+                    else:
+                        conn.send_json({'type': 'pong'})
                 else:
-                    await websocket.send_json({'type': 'echo', 'data': raw})
+                    conn.send_json({'type': 'echo', 'data': raw})
             else:
-                await websocket.send_json({'type': 'echo', 'data': raw})
+                conn.send_json({'type': 'echo', 'data': raw})
+            if conn.closed:
+                break
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
     finally:
-        try:
-            websocket_connections.remove(websocket)
-        except ValueError:
-            pass
-        set_connection_filter(websocket, None)
-        try:
-            from . import broadcast as _bc
-            getattr(_bc, 'connection_comp_scopes', {}).pop(id(websocket), None)
-        except Exception:
-            pass
+        unregister_connection(websocket)
 
 @app.get('/events/schema')
 def events_schema():
@@ -583,7 +670,10 @@ def events_schema():
             'offer_created': {'desc': 'Offer created', 'fields': ['id','domain','price','offerer','competition_id']},
             'offer_accepted': {'desc': 'Offer accepted', 'fields': ['id','domain','price','offerer','seller','competition_id']},
             'offer_cancelled': {'desc': 'Offer cancelled', 'fields': ['id','domain','price','offerer','competition_id']},
-            'subscribed': {'desc': 'Ack for subscription', 'fields': ['events']},
+            'subscribed': {'desc': 'Ack for subscription', 'fields': ['events','competitions','seq']},
+            'hello': {'desc': 'Connection greeting with current sequence', 'fields': ['seq']},
+            'batch': {'desc': 'Micro-batched frames (opt-in via batch=1 or SUB batch)', 'fields': ['count','events']},
+            'resync_required': {'desc': 'Replay gap not covered; refetch state over REST', 'fields': ['since_seq','oldest_seq','latest_seq']},
             'unsubscribed': {'desc': 'Ack for unsubscribe', 'fields': []},
         }
     }
@@ -593,7 +683,7 @@ def root():
     logger.info("Root endpoint accessed")
     return {"service": "domacross-api", "status": "ok"}
 
-@app.get("/metrics")
+@app.get("/metrics", response_class=PlainTextResponse)
 def metrics():
     # Basic Prometheus-style exposition without external lib
     lines = []
@@ -622,6 +712,79 @@ def metrics():
         lines.append(f"ws_broadcast_latency_seconds_p95 {ws_stats['p95']}")
         lines.append(f"ws_broadcast_latency_seconds_avg {ws_stats['avg']}")
         lines.append(f"ws_broadcast_latency_samples {ws_stats['count']}")
+        from app.services.metrics_service import get_ws_latency_exposition
+        lines.extend(get_ws_latency_exposition())
+    except Exception:
+        pass
+    # Websocket fan-out queues (per-connection send queues aggregated)
+    try:
+        fan = _bc.get_connection_stats()
+        lines.append(f"ws_connections {fan['connections']}")
+        lines.append(f"ws_send_queue_depth {fan['queue_depth']}")
+        lines.append(f"ws_send_queue_depth_max {fan['max_queue_depth']}")
+        lines.append(f"ws_lagging_connections {fan['lagging_connections']}")
+        lines.append(f"ws_frames_enqueued_total {fan['enqueued']}")
+        lines.append(f"ws_frames_sent_total {fan['sent']}")
+        lines.append(f"ws_frames_dropped_total {fan['dropped']}")
+        lines.append(f"ws_frames_coalesced_total {fan['coalesced']}")
+        lines.append(f"ws_slow_consumer_disconnects_total {fan['slow_disconnects']}")
+        lines.append(f"ws_unsequenced_events_dropped_total {fan['unsequenced']}")
+        bridge = _bc.get_sync_bridge().stats()
+        lines.append(f"ws_sync_publish_submitted_total {bridge['submitted']}")
+        lines.append(f"ws_sync_publish_published_total {bridge['published']}")
+        lines.append(f"ws_sync_publish_dropped_total {bridge['dropped']}")
+        lines.append(f"ws_sync_publish_deferred_total {bridge['deferred']}")
+        lines.append(f"ws_sync_publish_pending {bridge['pending']}")
+        backend = _bc.get_broadcast_backend()
+        if hasattr(backend, 'published'):
+            lines.append(f"ws_bus_published_total {backend.published}")
+            lines.append(f"ws_bus_received_total {backend.received}")
+            lines.append(f"ws_bus_errors_total {backend.errors}")
+    except Exception:
+        pass
+    # In-memory leaderboards (tick-coalesced rank deltas)
+    try:
+        from app.services.leaderboard_service import leaderboard_service as lbs
+        lb = lbs.stats()
+        lines.append(f"leaderboard_competitions_loaded {lb['competitions']}")
+        lines.append(f"leaderboard_updates_total {lb['updates']}")
+        lines.append(f"leaderboard_loads_total {lb['loads']}")
+        lines.append(f"leaderboard_deltas_total {lb['deltas']}")
+    except Exception:
+        pass
+    # Audit integrity chain verifier (checkpoints)
+    try:
+        from app.services.audit_verify_service import audit_chain_verifier as acv
+        av = acv.stats()
+        lines.append(f"audit_chain_verified_through {av['verified_through']}")
+        lines.append(f"audit_chain_verified_total {av['verified_total']}")
+        lines.append(f"audit_chain_checkpoints_written_total {av['checkpoints_written']}")
+        lines.append(f"audit_chain_break_event_id {av['break_event_id']}")
+    except Exception:
+        pass
+    # Merkle root anchoring worker
+    try:
+        from app.services.anchor_service import anchor_worker as aw
+        an = aw.stats()
+        lines.append(f"anchor_roots_submitted_total {an['submitted']}")
+        lines.append(f"anchor_roots_superseded_total {an['superseded']}")
+        lines.append(f"anchor_transactions_total {an['anchored']}")
+        lines.append(f"anchor_confirmed_total {an['confirmed']}")
+        lines.append(f"anchor_failures_total {an['failures']}")
+        lines.append(f"anchor_pending {an['pending'] + an['inflight']}")
+    except Exception:
+        pass
+    # Snapshot scheduler lease (leader election across processes)
+    try:
+        from app.services.snapshot_scheduler import snapshot_scheduler as sched
+        ss = sched.stats()
+        lines.append(f"snapshot_scheduler_is_leader {ss['is_leader']}")
+        lines.append(f"snapshot_scheduler_lease_acquired_total {ss['acquired']}")
+        lines.append(f"snapshot_scheduler_lease_renewals_total {ss['renewals']}")
+        lines.append(f"snapshot_scheduler_lease_lost_total {ss['lost']}")
+        lines.append(f"snapshot_scheduler_snapshots_total {ss['snapshots']}")
+        lines.append(f"snapshot_scheduler_indexed_events_total {ss['indexed']}")
+        lines.append(f"snapshot_scheduler_errors_total {ss['errors']}")
     except Exception:
         pass
     # Orderbook & valuation counters
@@ -649,6 +812,16 @@ def metrics():
             lines.append(f"valuation_batches_total {getattr(vs,'total_batches')}")
         if hasattr(vs, 'total_valuations'):
             lines.append(f"valuation_records_total {getattr(vs,'total_valuations')}")
+        lines.append(f"valuation_cache_hits_total {vs.cache.hits}")
+        lines.append(f"valuation_cache_misses_total {vs.cache.misses}")
+    except Exception:
+        pass
+    try:
+        from app.services.trade_state import trade_state as ts
+        st = ts.stats()
+        lines.append(f"valuation_trade_state_domains {st['domains']}")
+        lines.append(f"valuation_trade_state_loads_total {st['loads']}")
+        lines.append(f"valuation_trade_state_applied_total {st['applied']}")
     except Exception:
         pass
     return "\n".join(lines) + "\n"
@@ -1,4 +1,6 @@
 from sqlalchemy import Column, Integer, String, DateTime, Numeric, Text, JSON, ForeignKey, UniqueConstraint, Boolean
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 from sqlalchemy.sql import func
 from app.database import Base
 
@@ -106,6 +108,12 @@ class Domain(Base):
     doma_rank_score = Column(Numeric(5,2), nullable=True, index=True)  # DomaRank score 0-100
     is_fractionalized = Column(Boolean, default=False, index=True)
 
+class TldStat(Base):
+    """Domain count per TLD, maintained on every Domain insert/delete/TLD change (scarcity input)."""
+    __tablename__ = "tld_stats"
+    tld = Column(String(32), primary_key=True)
+    domain_count = Column(Integer, nullable=False, default=0)
+
 class Listing(Base):
     __tablename__ = "listings"
     id = Column(Integer, primary_key=True, index=True)
@@ -147,6 +155,16 @@ class Valuation(Base):
     factors = Column(JSON, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
 
+class DomainLatestValuation(Base):
+    """Newest Valuation per domain, upserted in the same transaction as each Valuation insert."""
+    __tablename__ = 'domain_latest_valuations'
+    domain_name = Column(String(255), ForeignKey('domains.name'), primary_key=True)
+    valuation_id = Column(Integer, nullable=False)
+    model_version = Column(String(32), nullable=False)
+    value = Column(Numeric(18,8), nullable=False)
+    factors = Column(JSON, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
 class DomainValuationOverride(Base):
     __tablename__ = 'domain_valuation_overrides'
     id = Column(Integer, primary_key=True, index=True)
@@ -425,6 +443,16 @@ class AuditEvent(Base):
     payload = Column(JSON, nullable=True)  # canonical snapshot for merkle hashing
     created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     integrity_hash = Column(String(130), nullable=True, index=True)  # sha256(prev_integrity_hash || canonical_json)
+    leaf_hash = Column(String(64), nullable=True)  # hex sha256 of the Merkle leaf object, written at insert
+
+class AuditChainCheckpoint(Base):
+    """Verified point of the integrity hash chain: every event up to event_id re-hashed to integrity_hash."""
+    __tablename__ = 'audit_chain_checkpoints'
+    id = Column(Integer, primary_key=True, index=True)
+    event_id = Column(Integer, nullable=False, unique=True, index=True)
+    integrity_hash = Column(String(130), nullable=False)
+    event_count = Column(Integer, nullable=False)  # events verified from the start of the chain
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 class MerkleSnapshot(Base):
     __tablename__ = 'merkle_snapshots'
@@ -436,6 +464,14 @@ class MerkleSnapshot(Base):
     signature = Column(String(512), nullable=True)  # base64 RSA signature of root
     anchor_tx_hash = Column(String(80), nullable=True, index=True)
 
+class SchedulerLease(Base):
+    """Time-bounded leadership of a periodic job: only ``holder`` runs it until ``expires_at``."""
+    __tablename__ = 'scheduler_leases'
+    name = Column(String(64), primary_key=True)
+    holder = Column(String(128), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    acquired_at = Column(DateTime(timezone=True), nullable=False)
+
 class MerkleAccumulator(Base):
     __tablename__ = 'merkle_accumulator'
     id = Column(Integer, primary_key=True, index=True)
@@ -443,6 +479,19 @@ class MerkleAccumulator(Base):
     node_hash = Column(String(66), nullable=False)  # 0x + hex
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), index=True)
 
+class MerkleNode(Base):
+    """Complete subtree hash of the audit-event Merkle tree (level 0 = leaves, position = event order).
+
+    Nodes are immutable once written; right-edge (partial) nodes for any tree size are derived from these.
+    """
+    __tablename__ = 'merkle_nodes'
+    id = Column(Integer, primary_key=True, index=True)
+    level = Column(Integer, nullable=False)
+    idx = Column(Integer, nullable=False)
+    node_hash = Column(String(66), nullable=False)  # 0x + hex
+    event_id = Column(Integer, nullable=True, index=True)  # leaves only: AuditEvent.id at this position
+    __table_args__ = (UniqueConstraint('level', 'idx', name='uq_merkle_node_level_idx'),)
+
 # Idempotency keys (simple replay guard)
 class IdempotencyKey(Base):
     __tablename__ = 'idempotency_keys'
@@ -648,3 +697,32 @@ class DomainValuation(Base):
     confidence_level = Column(String(16), nullable=False, index=True)  # high, medium, low
     calculated_at = Column(DateTime(timezone=True), nullable=False, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+# tld_stats follows every Domain write through these session hooks, registered with the model so the
+# counts hold for any session whichever service modules happen to be imported
+@event.listens_for(Session, 'after_flush')
+def _tld_stats_flush(session, flush_context):
+    from app.services import tld_stats
+    tld_stats.count_flush(session)
+
+
+def _touches_tld(state) -> bool:
+    if state.is_delete:
+        return True
+    params = state.parameters if isinstance(state.parameters, list) else [state.parameters or {}]
+    return 'tld' in state.statement.compile().params or any('tld' in p for p in params)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _tld_stats_bulk(state):
+    # bulk DELETE / UPDATE statements (query(Domain).delete() included) bypass the flush, so recount
+    # on the same connection once they ran
+    if not (state.is_delete or state.is_update) or state.bind_mapper is None or state.bind_mapper.class_ is not Domain:
+        return None
+    if not _touches_tld(state):
+        return None
+    result = state.invoke_statement()
+    from app.services import tld_stats
+    tld_stats.recount(state.session.connection())
+    return result
@@ -29,6 +29,7 @@ from app.config import settings
 from app.broadcast import get_sync_broadcast
 from math import sqrt
 from app.services.metrics_service import get_full_leaderboard
+from app.services.leaderboard_service import leaderboard_service
 from decimal import Decimal
 
 getcontext().prec = 28
@@ -247,6 +248,7 @@ async def join_competition(
     )
     db.add(participant)
     db.commit()
+    leaderboard_service.update(competition_id, participant.id, participant.user_id, 0)
     return competition
 
 
@@ -320,6 +322,7 @@ async def update_portfolio(
     participant.portfolio_value = payload.portfolio_value
     db.add(participant)
     db.commit()
+    leaderboard_service.update(competition_id, participant.id, participant.user_id, payload.portfolio_value)
     return competition
 
 @router.get('/competitions/{competition_id}/epochs')
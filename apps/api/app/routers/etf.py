@@ -165,13 +165,17 @@ def get_etf_positions(etf_id: int, db: Session = Depends(get_db)):
 
 def _compute_nav(db: Session, etf: DomainETFModel) -> Decimal:
     # NAV = sum(weight% * domain_value); use valuations table fallback to last_floor_price
-    from app.models.database import Valuation, Domain
+    from app.models.database import Domain
+    from app.services.latest_valuations import get_latest_values
     positions = db.query(DomainETFPositionModel).filter(DomainETFPositionModel.etf_id == etf.id).all()
     total = Decimal(0)
+    values = get_latest_values(db, [p.domain_name for p in positions])
+    missing = [p.domain_name for p in positions if p.domain_name not in values]
+    floors = dict(db.query(Domain.name, Domain.last_floor_price).filter(Domain.name.in_(missing))) if missing else {}
     for p in positions:
-        val = db.query(Valuation.value).filter(Valuation.domain_name == p.domain_name).order_by(Valuation.created_at.desc()).limit(1).scalar()
+        val = values.get(p.domain_name)
         if val is None:
-            val = db.query(Domain.last_floor_price).filter(Domain.name == p.domain_name).scalar() or Decimal(0)
+            val = floors.get(p.domain_name) or Decimal(0)
         weight_pct = Decimal(p.weight_bps) / Decimal(10000)
         total += (val or Decimal(0)) * weight_pct
     return total
@@ -12,6 +12,7 @@ from app.models.database import User as UserModel
 from datetime import datetime, timezone, timedelta
 from app.broadcast import get_sync_broadcast
 from app.services.metrics_service import invalidate_leaderboard_cache
+from app.services.leaderboard_service import leaderboard_service
 from app.services.abuse_guard import abuse_guard
 from fastapi import Request
 from app.services.governance_service import governance_service
@@ -215,29 +216,11 @@ def _post_trade_hooks(db: Session, trade: Trade, domain_name: str):
         reward.concentration_index = concentration_index
     db.flush()
     leaderboard_comp_id = comp.id
-    # After reward/points update, broadcast leaderboard delta for this participant (simplified rank computation)
-    if leaderboard_comp_id and broadcast:
-        # Compute rank with window function approximation via ordering
-        from app.models.database import Participant as P2
-        rows = (db.query(P2.id, P2.user_id, P2.portfolio_value)
-                .filter(P2.competition_id==leaderboard_comp_id)
-                .order_by(P2.portfolio_value.desc())
-                .limit(50).all())  # only top 50 for delta context
-        rank = None
-        for idx, r in enumerate(rows, start=1):
-            if r.id == part.id:
-                rank = idx
-                break
-        broadcast({
-            'type': 'leaderboard_delta',
-            'competition_id': leaderboard_comp_id,
-            'updates': [{
-                'participant_id': part.id,
-                'user_id': part.user_id,
-                'portfolio_value': str(part.portfolio_value or 0),
-                'rank': rank,
-            }]
-        })
+    # Rank comes from the in-memory ordered leaderboard; the new value is applied when this transaction
+    # commits and the delta for this participant and everyone it displaced goes out on the next tick
+    if leaderboard_comp_id:
+        leaderboard_service.ensure_loaded(db, leaderboard_comp_id)
+        leaderboard_service.queue_update(db, leaderboard_comp_id, part.id, part.user_id, part.portfolio_value)
     invalidate_leaderboard_cache(leaderboard_comp_id)
 
 def _get_or_create_domain(db: Session, name: str) -> Domain:
@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, Response, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, Request
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.models.database import AuditEvent, MerkleSnapshot, DomainETFShareFlow, DomainETFFeeEvent, DomainETFRedemptionIntent, DomainETF as DomainETFModel
 from app.models.database import IdempotencyKey
-from app.services.merkle_service import merkle_service
+from app.services.merkle_service import merkle_service, recompute_jobs
 from app.services.audit_service import record_audit_event
+from app.services.canonical_json import leaf_digest
+from app.services import audit_export_service as audit_export
+from app.services.audit_verify_service import audit_chain_verifier, chain_hash, checkpoints_between
 from app.services.blockchain_service import blockchain_service
 from app.services.redemption_validation import validate_redemption_receipt
 from app.services.competition_settlement_validation import validate_competition_settlement_receipt
@@ -52,22 +55,7 @@ def _enforce_rate_limit(request: Request, bucket: str, capacity: int = 120, refi
 
 def _hash_leaf(obj: dict) -> bytes:
     # Stable JSON encoding (sorted keys) then sha256
-    import json
-    encoded = json.dumps(obj, sort_keys=True, separators=(',',':')).encode()
-    return sha256(encoded).digest()
-
-def _build_merkle(leaves: list[bytes]) -> bytes:
-    if not leaves:
-        return b'\x00'*32
-    layer = leaves
-    while len(layer) > 1:
-        nxt: list[bytes] = []
-        for i in range(0,len(layer),2):
-            left = layer[i]
-            right = layer[i+1] if i+1 < len(layer) else left
-            nxt.append(sha256(left+right).digest())
-        layer = nxt
-    return layer[0]
+    return leaf_digest(obj)
 
 @router.get('/settlement/audit-events')
 def list_audit_events(limit: int = 200, offset: int = 0, cursor_after_id: int | None = None, event_type: str | None = None, entity_type: str | None = None, entity_id: int | None = None, db: Session = Depends(get_db), user: UserModel = Depends(get_current_user)):
@@ -160,30 +148,24 @@ def create_redemption_intent(etf_id: int, body: RedemptionCreateRequest, request
     record_audit_event(db, event_type='REDEMPTION_INTENT_CREATE', entity_type='REDEMPTION_INTENT', entity_id=intent.id, user_id=user.id, payload={'etf_id': etf_id, 'shares': str(intent.shares)})
     return {'id': intent.id, 'shares': str(intent.shares), 'idempotent': False}
 
-@router.post('/settlement/merkle/recompute')
-def recompute_merkle(db: Session = Depends(get_db), user: UserModel = Depends(get_current_user)):
+@router.post('/settlement/merkle/recompute', status_code=202)
+def recompute_merkle(user: UserModel = Depends(get_current_user)):
     # Simple admin gate (could use config admin list)
     from app.config import settings
     if user.wallet_address.lower() not in settings.admin_wallets:
         raise HTTPException(status_code=403, detail='Not authorized')
-    rows = db.query(AuditEvent).order_by(AuditEvent.id.asc()).all()
-    leaves = []
-    for r in rows:
-        base = {
-            'id': r.id,
-            't': r.event_type,
-            'e': r.entity_type,
-            'eid': r.entity_id,
-            'u': r.user_id,
-            'p': r.payload
-        }
-        leaves.append(_hash_leaf(base))
-    root = _build_merkle(leaves).hex()
-    snap = MerkleSnapshot(last_event_id=rows[-1].id if rows else 0, merkle_root='0x'+root, event_count=len(rows))
-    db.add(snap)
-    db.commit()
-    db.refresh(snap)
-    return { 'merkle_root': snap.merkle_root, 'event_count': snap.event_count, 'last_event_id': snap.last_event_id }
+    # full streamed recompute runs in the background; poll the returned job handle
+    return recompute_jobs.start()
+
+@router.get('/settlement/merkle/recompute/{job_id}')
+def recompute_merkle_status(job_id: str, user: UserModel = Depends(get_current_user)):
+    from app.config import settings
+    if user.wallet_address.lower() not in settings.admin_wallets:
+        raise HTTPException(status_code=403, detail='Not authorized')
+    job = recompute_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail='job not found')
+    return job
 
 @router.get('/settlement/etfs/{etf_id}/proof')
 def etf_settlement_proof(etf_id: int, db: Session = Depends(get_db)):
@@ -205,13 +187,24 @@ def etf_settlement_proof(etf_id: int, db: Session = Depends(get_db)):
     }
 
 @router.get('/settlement/audit-events/{event_id}/merkle-proof')
-def audit_event_merkle_proof(event_id: int, db: Session = Depends(get_db)):
-    proof = merkle_service.compute_proof_path(db, event_id)
+def audit_event_merkle_proof(event_id: int, snapshot_id: int | None = None, db: Session = Depends(get_db)):
+    # snapshot_id pins the proof to that (historical) snapshot's root; default is the current tree
+    snap = None
+    tree_size = None
+    if snapshot_id is not None:
+        snap = db.query(MerkleSnapshot).filter(MerkleSnapshot.id==snapshot_id).first()
+        if not snap:
+            raise HTTPException(status_code=404, detail='snapshot not found')
+        tree_size = merkle_service.snapshot_size(db, snap)
+    proof = merkle_service.compute_proof_path(db, event_id, tree_size=tree_size)
+    if proof.get('error') == 'event not indexed yet':
+        raise HTTPException(status_code=409, detail=proof['error'])  # on-demand indexing lost a race; retry
     if 'error' in proof:
         raise HTTPException(status_code=404, detail=proof['error'])
     # Attach leaf payload + latest snapshot signature if available
     ae = db.query(AuditEvent).filter(AuditEvent.id==event_id).first()
-    snap = db.query(MerkleSnapshot).order_by(MerkleSnapshot.id.desc()).first()
+    if snap is None:
+        snap = db.query(MerkleSnapshot).order_by(MerkleSnapshot.id.desc()).first()
     leaf = None
     if ae:
         leaf = { 'id': ae.id, 't': ae.event_type, 'e': ae.entity_type, 'eid': ae.entity_id, 'u': ae.user_id, 'p': ae.payload }
@@ -221,6 +214,68 @@ def audit_event_merkle_proof(event_id: int, db: Session = Depends(get_db)):
         proof['anchor_tx_hash'] = snap.anchor_tx_hash
     return proof
 
+class MultiProofRequest(BaseModel):
+    event_ids: List[int] | None = None
+    # or select a range / subset (e.g. one ETF's fee history: entity_type='ETF', entity_id=7)
+    from_id: int | None = None
+    to_id: int | None = None
+    event_types: List[str] | None = None
+    entity_type: str | None = None
+    entity_id: int | None = None
+    snapshot_id: int | None = None
+
+_MULTIPROOF_MAX_EVENTS = 5000
+
+@router.post('/settlement/audit-events/merkle-multiproof')
+def audit_events_merkle_multiproof(body: MultiProofRequest, db: Session = Depends(get_db)):
+    """Compact inclusion proof for many audit events against one root (siblings deduplicated)."""
+    if body.event_ids:
+        if len(body.event_ids) > _MULTIPROOF_MAX_EVENTS:
+            raise HTTPException(status_code=400, detail=f'at most {_MULTIPROOF_MAX_EVENTS} event_ids per request')
+        rows = db.query(AuditEvent).filter(AuditEvent.id.in_(body.event_ids)).order_by(AuditEvent.id.asc()).all()
+    else:
+        if body.from_id is None and body.to_id is None and not body.event_types and body.entity_type is None:
+            raise HTTPException(status_code=400, detail='event_ids or a range / filter is required')
+        q = db.query(AuditEvent)
+        if body.from_id is not None:
+            q = q.filter(AuditEvent.id >= body.from_id)
+        if body.to_id is not None:
+            q = q.filter(AuditEvent.id <= body.to_id)
+        if body.event_types:
+            q = q.filter(AuditEvent.event_type.in_(body.event_types))
+        if body.entity_type is not None:
+            q = q.filter(AuditEvent.entity_type==body.entity_type)
+        if body.entity_id is not None:
+            q = q.filter(AuditEvent.entity_id==body.entity_id)
+        rows = q.order_by(AuditEvent.id.asc()).limit(_MULTIPROOF_MAX_EVENTS + 1).all()
+    next_from_id = None
+    if len(rows) > _MULTIPROOF_MAX_EVENTS:
+        next_from_id = rows[_MULTIPROOF_MAX_EVENTS].id
+        rows = rows[:_MULTIPROOF_MAX_EVENTS]
+    snap = None
+    tree_size = None
+    if body.snapshot_id is not None:
+        snap = db.query(MerkleSnapshot).filter(MerkleSnapshot.id==body.snapshot_id).first()
+        if not snap:
+            raise HTTPException(status_code=404, detail='snapshot not found')
+        tree_size = merkle_service.snapshot_size(db, snap)
+    proof = merkle_service.compute_multi_proof(db, [r.id for r in rows], tree_size=tree_size)
+    if snap is None:
+        latest = db.query(MerkleSnapshot).order_by(MerkleSnapshot.id.desc()).first()
+        if latest and latest.merkle_root == proof['merkle_root']:
+            snap = latest
+    positions = proof.pop('positions')
+    proof['leaves'] = [
+        { 'event_id': r.id, 'position': positions[r.id], 'leaf': { 'id': r.id, 't': r.event_type, 'e': r.entity_type, 'eid': r.entity_id, 'u': r.user_id, 'p': r.payload } }
+        for r in rows if r.id in positions
+    ]
+    if body.event_ids:
+        found = {r.id for r in rows}
+        proof['missing'] = sorted(set(proof['missing']) | {i for i in body.event_ids if i not in found})
+    proof['snapshot'] = { 'id': snap.id, 'merkle_root': snap.merkle_root, 'signature': snap.signature, 'anchor_tx_hash': snap.anchor_tx_hash } if snap else None
+    proof['next_from_id'] = next_from_id
+    return proof
+
 @router.post('/settlement/etfs/{etf_id}/redemption-proof/{intent_id}')
 def submit_redemption_proof(etf_id: int, intent_id: int, tx_hash: str, db: Session = Depends(get_db), user: UserModel = Depends(get_current_user)):
     # Mark redemption intent executed if not already; rely on existing execute path but log audit event
@@ -230,8 +285,7 @@ def submit_redemption_proof(etf_id: int, intent_id: int, tx_hash: str, db: Sessi
     if intent.executed_at is None:
         raise HTTPException(status_code=400, detail='Intent not yet executed in system (call execute first)')
     # Create audit event for provenance linking on-chain tx hash to executed redemption
-    ae = AuditEvent(event_type='REDEMPTION_PROOF', entity_type='REDEMPTION_INTENT', entity_id=intent.id, user_id=user.id, payload={'tx_hash': tx_hash, 'etf_id': etf_id, 'shares': str(intent.shares)})
-    db.add(ae)
+    ae = record_audit_event(db, event_type='REDEMPTION_PROOF', entity_type='REDEMPTION_INTENT', entity_id=intent.id, user_id=user.id, payload={'tx_hash': tx_hash, 'etf_id': etf_id, 'shares': str(intent.shares)})
     db.commit()
     db.refresh(ae)
     return { 'audit_event_id': ae.id }
@@ -297,19 +351,17 @@ def audit_export_stream(response: Response, db: Session = Depends(get_db), after
     import json
     prev_hash = None
     integrity_ok = True
+    pins: dict[int, str] = {}
+    if verify_integrity:
+        # chain hash at the cursor, walked from the nearest verified checkpoint (not assumed empty)
+        prev_hash, integrity_ok = audit_chain_verifier.seed(db, after_id)
+        if rows:
+            pins = checkpoints_between(db, rows[0].id, rows[-1].id)
     lines = []
     for r in rows:
         # Optional integrity verification (recompute digest from previous)
         if verify_integrity:
-            canonical = json.dumps({
-                'event_type': r.event_type,
-                'entity_type': r.entity_type,
-                'entity_id': r.entity_id,
-                'user_id': r.user_id,
-                'payload': r.payload
-            }, sort_keys=True, separators=(',',':'))
-            expected = sha256(((prev_hash or '') + canonical).encode()).hexdigest()
-            if expected != r.integrity_hash:
+            if chain_hash(prev_hash or '', r) != r.integrity_hash or pins.get(r.id, r.integrity_hash) != r.integrity_hash:
                 integrity_ok = False
             prev_hash = r.integrity_hash
         lines.append(json.dumps({
@@ -331,47 +383,32 @@ def audit_export_stream(response: Response, db: Session = Depends(get_db), after
     return PlainTextResponse(body, media_type='application/jsonl; charset=utf-8', headers=response.headers)
 
 @router.get('/settlement/audit-export/stream')
-def audit_export_true_stream(db: Session = Depends(get_db), after_id: int | None = None, batch_size: int = 2000, verify_integrity: bool = False, user: UserModel = Depends(get_current_user)):
+def audit_export_true_stream(request: Request, db: Session = Depends(get_db), after_id: int | None = None, to_id: int | None = None, batch_size: int = 2000, verify_integrity: bool = False, fmt: str = Query('jsonl', alias='format'), compression: str | None = None, user: UserModel = Depends(get_current_user)):
+    # format: jsonl | arrow | parquet; compression (gzip | zstd) becomes the Content-Encoding
     from app.config import settings as _settings
     if user.wallet_address.lower() not in _settings.admin_wallets:
         raise HTTPException(status_code=403, detail='Not authorized')
     batch_size = max(1, min(batch_size, 10000))
-    import json
-    def gen():
-        prev_hash = None
-        last_id = after_id
-        while True:
-            q = db.query(AuditEvent).order_by(AuditEvent.id.asc())
-            if last_id:
-                q = q.filter(AuditEvent.id > last_id)
-            rows = q.limit(batch_size).all()
-            if not rows:
-                break
-            for r in rows:
-                if verify_integrity:
-                    canonical = json.dumps({
-                        'event_type': r.event_type,
-                        'entity_type': r.entity_type,
-                        'entity_id': r.entity_id,
-                        'user_id': r.user_id,
-                        'payload': r.payload
-                    }, sort_keys=True, separators=(',',':'))
-                    expected = sha256(((prev_hash or '') + canonical).encode()).hexdigest()
-                    r.integrity_ok = (expected == r.integrity_hash)
-                    prev_hash = r.integrity_hash
-                yield json.dumps({
-                    'id': r.id,
-                    'event_type': r.event_type,
-                    'entity_type': r.entity_type,
-                    'entity_id': r.entity_id,
-                    'user_id': r.user_id,
-                    'payload': r.payload,
-                    'created_at': r.created_at.isoformat(),
-                    'integrity_hash': r.integrity_hash,
-                    **({'integrity_ok': r.integrity_ok} if verify_integrity else {})
-                }, sort_keys=True) + '\n'
-            last_id = rows[-1].id
-    return StreamingResponse(gen(), media_type='application/jsonl')
+    err = audit_export.check_options(fmt, compression)
+    if err:
+        raise HTTPException(status_code=400, detail=err)
+    if compression and not audit_export.accepts_encoding(request.headers.get('accept-encoding'), compression):
+        raise HTTPException(status_code=406, detail=f'Accept-Encoding does not allow {compression}')
+    headers = {'Cache-Control': 'no-store'}
+    if compression:
+        headers['Content-Encoding'] = compression
+    body = audit_export.stream(db, after_id=after_id, to_id=to_id, batch_size=batch_size, verify_integrity=verify_integrity, fmt=fmt, compression=compression)
+    return StreamingResponse(body, media_type=audit_export.MEDIA_TYPES[fmt], headers=headers)
+
+@router.get('/settlement/audit-export/bounds')
+def audit_export_bounds(db: Session = Depends(get_db), user: UserModel = Depends(get_current_user)):
+    # id range for splitting a full export into parallel after_id/to_id fetches
+    from app.config import settings as _settings
+    if user.wallet_address.lower() not in _settings.admin_wallets:
+        raise HTTPException(status_code=403, detail='Not authorized')
+    from sqlalchemy import func as _f
+    lo, hi = db.query(_f.min(AuditEvent.id), _f.max(AuditEvent.id)).one()
+    return {'min_id': lo, 'max_id': hi}
 
 # --- Competition Settlement Flow ---
 
@@ -592,8 +629,12 @@ def snapshot_with_proofs(request: Request, response: Response, limit: int = 5, c
     events = q.order_by(AuditEvent.id.desc()).limit(limit).all()
     proofs = []
     lowest_id = None
+    snap_size = merkle_service.snapshot_size(db, snap)
     for ev in events:
-        proof = merkle_service.compute_proof_path(db, ev.id)
+        # proofs verify against the returned snapshot root; events newer than it prove against the current tree
+        proof = merkle_service.compute_proof_path(db, ev.id, tree_size=snap_size)
+        if proof.get('error') == 'event not in snapshot':
+            proof = merkle_service.compute_proof_path(db, ev.id)
         if 'error' in proof:
             continue
         # Attach leaf for client-side inclusion verification
@@ -641,8 +682,11 @@ def fee_events_unified(request: Request, response: Response, limit: int = 25, cu
     rows = q.order_by(AuditEvent.id.desc()).limit(limit).all()
     proofs: list[dict[str, Any]] = []
     lowest = None
+    snap_size = merkle_service.snapshot_size(db, snap) if snap else None
     for r in rows:
-        proof = merkle_service.compute_proof_path(db, r.id)
+        proof = merkle_service.compute_proof_path(db, r.id, tree_size=snap_size)
+        if proof.get('error') == 'event not in snapshot':
+            proof = merkle_service.compute_proof_path(db, r.id)
         if 'error' in proof:
             leaf = None
         else:
@@ -1,12 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Dict, Any
 from sqlalchemy.orm import Session
 from decimal import Decimal
 from app.database import get_db
 from app.services.valuation_service import valuation_service
+from app.services import tld_stats
+from app.services.latest_valuations import get_latest, get_latest_values
 from app.models.database import Listing, Offer, Domain, DomainValuationOverride, Valuation, DomainValuationDispute
 from datetime import datetime, timezone, timedelta
+import json
 
 router = APIRouter()
 
@@ -16,45 +21,34 @@ class ValuationBatchRequest(BaseModel):
 class ValuationBatchResponse(BaseModel):
     results: List[Dict[str, Any]]
 
-@router.post("/valuation/batch", response_model=ValuationBatchResponse)
-async def valuation_batch(payload: ValuationBatchRequest, db: Session = Depends(get_db)):
+def _batch_context(db: Session, names: List[str]) -> Dict[str, Any]:
     # Build context maps
     listings_map: Dict[str, List[Decimal]] = {}
     offers_map: Dict[str, List[Decimal]] = {}
     floors: Dict[str, Decimal] = {}
+    lowered = [d.lower() for d in names]
     # gather listing/offer prices
-    for l in db.query(Listing).filter(Listing.domain_name.in_([d.lower() for d in payload.domains]), Listing.active == True).all():  # noqa: E712
+    for l in db.query(Listing).filter(Listing.domain_name.in_(lowered), Listing.active == True).all():  # noqa: E712
         listings_map.setdefault(l.domain_name, []).append(Decimal(str(l.price)))
-    for o in db.query(Offer).filter(Offer.domain_name.in_([d.lower() for d in payload.domains]), Offer.active == True).all():  # noqa: E712
+    for o in db.query(Offer).filter(Offer.domain_name.in_(lowered), Offer.active == True).all():  # noqa: E712
         offers_map.setdefault(o.domain_name, []).append(Decimal(str(o.price)))
-    for dom in db.query(Domain).filter(Domain.name.in_([d.lower() for d in payload.domains])).all():
+    for dom in db.query(Domain).filter(Domain.name.in_(lowered)).all():
         if dom.last_floor_price is not None:
             floors[dom.name] = Decimal(str(dom.last_floor_price))
-    # tld counts for scarcity
-    tld_counts: Dict[str, int] = {}
-    domain_rows = db.query(Domain.tld).all()
-    for (tld,) in domain_rows:
-        if tld:
-            tld_counts[tld] = tld_counts.get(tld, 0) + 1
-    context = {"listings": listings_map, "offers": offers_map, "floors": floors, "tld_counts": tld_counts}
-    # Capture previous valuation map for delta emission
-    prev_vals: Dict[str, Decimal] = {}
-    from decimal import Decimal as _D
-    for d in payload.domains:
-        last = db.query(Valuation).filter(Valuation.domain_name==d.lower()).order_by(Valuation.created_at.desc()).first()
-        if last:
-            try:
-                prev_vals[d.lower()] = _D(str(last.value))
-            except Exception:
-                pass
+    # tld counts for scarcity (materialized per TLD; only the TLDs in this batch)
+    tld_counts = tld_stats.tld_counts(db, {d.split('.')[-1] for d in lowered if '.' in d})
+    return {"listings": listings_map, "offers": offers_map, "floors": floors, "tld_counts": tld_counts}
 
-    results = valuation_service.value_domains(db, payload.domains, context)
+def _broadcast_results(results: List[Dict[str, Any]], prev_vals: Dict[str, Decimal]):
     # Broadcast each valuation update enriched with delta info
+    from decimal import Decimal as _D
     try:
         from app.broadcast import get_sync_broadcast
         bc = get_sync_broadcast()
         if bc:
             for r in results:
+                if r.get('cached'):
+                    continue  # unchanged valuation, nothing new to announce
                 domain_lower = r['domain']
                 current_v = None
                 try:
@@ -82,18 +76,77 @@ async def valuation_batch(payload: ValuationBatchRequest, db: Session = Depends(
                 bc(payload_evt)
     except Exception:
         pass
-    return {"results": results}
+
+def _value_chunk(db: Session, names: List[str]) -> List[Dict[str, Any]]:
+    context = _batch_context(db, names)
+    # Capture previous valuation map for delta emission
+    prev_vals: Dict[str, Decimal] = get_latest_values(db, names)
+    results = valuation_service.value_domains(db, names, context)  # commits
+    _broadcast_results(results, prev_vals)
+    return results
+
+@router.post("/valuation/batch", response_model=ValuationBatchResponse)
+async def valuation_batch(payload: ValuationBatchRequest, db: Session = Depends(get_db)):
+    return {"results": _value_chunk(db, payload.domains)}
+
+def _chunk_session() -> Session:
+    from app.database import SessionLocal
+    return SessionLocal()
+
+def _value_chunk_in_session(names: List[str]) -> List[Dict[str, Any]]:
+    # runs on a worker thread: its own session (and transaction) per chunk, closed here
+    db = _chunk_session()
+    try:
+        return _value_chunk(db, names)
+    finally:
+        db.close()
+
+@router.post("/valuation/batch/stream")
+async def valuation_batch_stream(payload: ValuationBatchRequest, chunk_size: int | None = None):
+    """NDJSON variant of ``/valuation/batch`` for large domain lists.
+
+    Domains are valued ``chunk_size`` at a time (default ``valuation_stream_chunk_size``) on the threadpool,
+    each chunk in its own session and transaction, and its result lines are streamed as soon as it
+    commits. A failing chunk is rolled back and ends the stream with an ``{"error": ...}`` line; earlier
+    chunks stay committed.
+    """
+    size = max(1, min(chunk_size or app_settings.valuation_stream_chunk_size, app_settings.valuation_stream_max_chunk_size))
+    domains = list(payload.domains)
+
+    async def body():
+        for i in range(0, len(domains), size):
+            try:
+                results = await run_in_threadpool(_value_chunk_in_session, domains[i:i + size])
+            except Exception as e:
+                yield json.dumps({'error': str(e) or e.__class__.__name__, 'offset': i}) + '\n'
+                return
+            yield ''.join(json.dumps(r, default=str) + '\n' for r in results)
+
+    return StreamingResponse(body(), media_type='application/x-ndjson', headers={'Cache-Control': 'no-store'})
 
 @router.get('/valuation/latest')
-async def latest_valuations(domain: str, lookback_minutes: int = 1440, db: Session = Depends(get_db)):
-    cutoff = datetime.now(timezone.utc) - timedelta(minutes=lookback_minutes)
-    rows = db.query(Valuation).filter(Valuation.domain_name==domain.lower(), Valuation.created_at >= cutoff).order_by(Valuation.created_at.desc()).limit(50).all()
-    out = []
-    for r in rows:
-        age_sec = (datetime.now(timezone.utc) - r.created_at).total_seconds() if r.created_at else None
+async def latest_valuations(domain: str, lookback_minutes: int = 1440, limit: int = 50, db: Session = Depends(get_db)):
+    """Up to ``limit`` (max 50) valuations inside the lookback, newest first. ``limit=1`` is served from
+    ``domain_latest_valuations`` alone; a domain whose newest valuation is outside the lookback skips
+    the history query."""
+    def _aware(ts):
+        return ts.replace(tzinfo=timezone.utc) if ts is not None and ts.tzinfo is None else ts
+
+    def _item(value, created_at, model_version, factors):
+        created_at = _aware(created_at)
+        age_sec = (datetime.now(timezone.utc) - created_at).total_seconds() if created_at else None
         stale = age_sec is not None and age_sec > 3600
-        out.append({ 'value': str(r.value), 'created_at': r.created_at.isoformat() if r.created_at else None, 'model_version': r.model_version, 'factors': r.factors, 'stale': stale })
-    return { 'domain': domain.lower(), 'valuations': out }
+        return { 'value': str(value), 'created_at': created_at.isoformat() if created_at else None, 'model_version': model_version, 'factors': factors, 'stale': stale }
+
+    cutoff = datetime.now(timezone.utc) - timedelta(minutes=lookback_minutes)
+    latest = get_latest(db, [domain]).get(domain.lower())
+    if latest is None or latest.created_at is None or _aware(latest.created_at) < cutoff:
+        return { 'domain': domain.lower(), 'valuations': [] }
+    limit = max(1, min(limit, 50))
+    if limit == 1:
+        return { 'domain': domain.lower(), 'valuations': [_item(latest.value, latest.created_at, latest.model_version, latest.factors)] }
+    rows = db.query(Valuation).filter(Valuation.domain_name==domain.lower(), Valuation.created_at >= cutoff).order_by(Valuation.created_at.desc()).limit(limit).all()
+    return { 'domain': domain.lower(), 'valuations': [_item(r.value, r.created_at, r.model_version, r.factors) for r in rows] }
 
 @router.get('/valuation/factors')
 async def valuation_factors(domain: str, db: Session = Depends(get_db)):
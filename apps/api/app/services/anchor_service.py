@@ -0,0 +1,228 @@
+"""Asynchronous on-chain anchoring of Merkle snapshot roots.
+
+Snapshot creation only calls ``anchor_worker.submit`` (a lock-protected assignment); the worker thread
+does the chain I/O on its own event loop, so neither snapshotting nor the API loop waits on RPC
+round trips (the web3 calls underneath are blocking). Roots are coalesced: only the newest submitted root is
+anchored, at most once per ``anchor_interval_seconds``, and roots superseded while waiting are skipped
+(anchoring a later root commits to every earlier event as well). Failed submissions retry with
+exponential backoff. The worker hands out nonces from a local counter (seeded from the chain's pending
+count for ``anchor_sender_address``) and, when ``anchor_confirmations`` > 0, waits for that many
+confirmations before the next root, re-queuing the root if its transaction fails or never confirms.
+``anchor_tx_hash`` is written back to the snapshot row once a transaction is submitted.
+
+Every replica shares ``anchor_sender_address``, so only the holder of the ``merkle:snapshot`` lease
+(``snapshot_scheduler``) anchors: a non-leader's tick drops whatever it queued and forgets its nonce,
+and a process recovers the newest unanchored snapshot only when it takes the lease. Roots queued on a
+non-leader are covered by the leader's next root.
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+from app.config import settings
+from app.models.database import MerkleSnapshot
+from app.services.blockchain_service import blockchain_service
+
+logger = logging.getLogger(__name__)
+
+
+class AnchorWorker:
+    def __init__(self, session_factory: Callable | None = None, chain=None, clock: Callable[[], float] = time.monotonic,
+                 is_leader: Callable[[], bool] | None = None):
+        self._lock = threading.Lock()
+        self._session_factory = session_factory
+        self._is_leader = is_leader
+        self.chain = chain or blockchain_service
+        self.clock = clock
+        self._pending: Optional[tuple[int, str]] = None  # (snapshot_id, root) waiting to be anchored
+        # submitted and awaiting confirmations: snapshot_id, root, tx_hash, nonce, submitted_at
+        self._inflight: Optional[dict] = None
+        self._nonce: Optional[int] = None
+        self._next_at = 0.0
+        self._failures = 0
+        self._recovered = False
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        # counters
+        self.submitted = 0
+        self.anchored = 0
+        self.confirmed = 0
+        self.superseded = 0
+        self.failures = 0
+        self.last_anchored_snapshot_id: Optional[int] = None
+
+    def _session(self):
+        if self._session_factory is None:
+            from app.database import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory()
+
+    # --- producer side (any thread) ---
+    def submit(self, snapshot_id: int, root: str):
+        """Queue ``root`` for anchoring, replacing any root still waiting. Never blocks on the chain."""
+        with self._lock:
+            if self._pending is not None:
+                self.superseded += 1
+            self._pending = (snapshot_id, root)
+            self.submitted += 1
+
+    # --- worker side ---
+    def _leading(self) -> bool:
+        if self._is_leader is None:
+            # lazy: snapshot_scheduler imports merkle_service, which imports this module
+            from app.services.snapshot_scheduler import snapshot_scheduler
+            return snapshot_scheduler.is_leader
+        return self._is_leader()
+
+    def _stand_down(self):
+        # another replica anchors from the same sender address: keep no queue, nonce or in-flight tx,
+        # and recover from the table again if this process takes the lease later
+        with self._lock:
+            self._pending = None
+        self._inflight = None
+        self._nonce = None
+        self._failures = 0
+        self._next_at = 0.0
+        self._recovered = False
+
+    def _recover(self):
+        # a restart loses the in-memory queue; pick up the newest snapshot that was never anchored
+        with self._session() as db:
+            snap = db.query(MerkleSnapshot).order_by(MerkleSnapshot.id.desc()).first()
+            if snap and not snap.anchor_tx_hash:
+                with self._lock:
+                    if self._pending is None:
+                        self._pending = (snap.id, snap.merkle_root)
+
+    def _write_tx_hash(self, snapshot_id: int, tx_hash: str):
+        with self._session() as db:
+            db.query(MerkleSnapshot).filter(MerkleSnapshot.id == snapshot_id).update({'anchor_tx_hash': tx_hash}, synchronize_session=False)
+            db.commit()
+
+    def _backoff(self, now: float):
+        self._failures += 1
+        self.failures += 1
+        delay = min(settings.anchor_backoff_max_seconds, settings.anchor_backoff_base_seconds * (2 ** (self._failures - 1)))
+        self._next_at = now + delay
+
+    def _requeue(self, inflight: dict):
+        # a newer root supersedes the failed one; otherwise try it again
+        with self._lock:
+            if self._pending is None:
+                self._pending = (inflight['snapshot_id'], inflight['root'])
+
+    async def _next_nonce(self) -> Optional[int]:
+        if self._nonce is None and settings.anchor_sender_address:
+            self._nonce = await self.chain.get_pending_nonce(settings.anchor_sender_address)
+        return self._nonce
+
+    async def _check_inflight(self, now: float) -> bool:
+        """True while the in-flight transaction still blocks the next submission."""
+        inflight = self._inflight
+        if inflight is None:
+            return False
+        status = await self.chain.get_confirmations(inflight['tx_hash'])
+        if status is not None and status >= settings.anchor_confirmations:
+            self._inflight = None
+            self.confirmed += 1
+            return False
+        if status == -1 or now - inflight['submitted_at'] >= settings.anchor_confirm_timeout_seconds:
+            # reverted or dropped: reuse its nonce so the retry replaces it
+            logger.warning("[anchor] tx %s for snapshot %s not confirmed; re-queuing", inflight['tx_hash'], inflight['snapshot_id'])
+            self._inflight = None
+            self._nonce = inflight['nonce']
+            self._requeue(inflight)
+            self._backoff(now)
+            return True
+        return True
+
+    async def tick(self) -> Optional[str]:
+        """One worker step; returns the tx hash when a root was submitted (only on the lease holder)."""
+        if not self._leading():
+            self._stand_down()
+            return None
+        if not self._recovered:
+            self._recovered = True
+            try:
+                self._recover()
+            except Exception:
+                logger.exception("[anchor] recovery of unanchored snapshot failed")
+        now = self.clock()
+        if await self._check_inflight(now) or now < self._next_at:
+            return None
+        with self._lock:
+            job, self._pending = self._pending, None
+        if job is None:
+            return None
+        snapshot_id, root = job
+        tx_hash = None
+        nonce = None
+        try:
+            if self.chain.ensure_initialized():
+                nonce = await self._next_nonce()
+                tx_hash = await self.chain.anchor_merkle_root(root, nonce=nonce)
+        except Exception:
+            logger.exception("[anchor] submission for snapshot %s failed", snapshot_id)
+        if not tx_hash:
+            self._requeue({'snapshot_id': snapshot_id, 'root': root})
+            self._backoff(now)
+            return None
+        self._failures = 0
+        if nonce is not None:
+            self._nonce = nonce + 1
+        self._next_at = now + settings.anchor_interval_seconds
+        self.anchored += 1
+        self.last_anchored_snapshot_id = snapshot_id
+        if settings.anchor_confirmations > 0:
+            self._inflight = {'snapshot_id': snapshot_id, 'root': root, 'tx_hash': tx_hash, 'nonce': nonce, 'submitted_at': now}
+        try:
+            self._write_tx_hash(snapshot_id, tx_hash)
+        except Exception:
+            logger.exception("[anchor] storing tx hash for snapshot %s failed", snapshot_id)
+        logger.info("[anchor] snapshot %s root=%s tx=%s", snapshot_id, root, tx_hash)
+        return tx_hash
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self, poll_seconds: float):
+        loop = asyncio.new_event_loop()
+        try:
+            while not self._stop.is_set():
+                try:
+                    loop.run_until_complete(self.tick())
+                except Exception:
+                    logger.exception('[anchor] tick failed')
+                self._stop.wait(poll_seconds)
+        finally:
+            loop.close()
+
+    def start(self, poll_seconds: float = 1.0):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(poll_seconds,), name="merkle-anchor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            'submitted': self.submitted,
+            'anchored': self.anchored,
+            'confirmed': self.confirmed,
+            'superseded': self.superseded,
+            'failures': self.failures,
+            'pending': 1 if self._pending else 0,
+            'inflight': 1 if self._inflight else 0,
+        }
+
+
+anchor_worker = AnchorWorker()
@@ -0,0 +1,232 @@
+"""Streaming audit export encoders.
+
+Rows come from one server-side cursor (``yield_per``) as column tuples rather than per-batch ORM
+queries. They are encoded as JSON lines (orjson when installed), an Arrow IPC stream or Parquet, and
+optionally compressed on the fly with gzip or zstd (sync-flushed per batch so consumers can decode
+progressively). pyarrow and zstandard are optional; the corresponding modes report unavailable.
+"""
+import json
+import zlib
+from typing import Iterator, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models.database import AuditEvent
+from app.services.audit_verify_service import audit_chain_verifier, chain_hash, checkpoints_between
+
+try:  # optional fast encoder
+    import orjson as _orjson
+except Exception:  # pragma: no cover - fallback path
+    _orjson = None
+try:  # optional zstd content encoding
+    import zstandard as _zstd
+except Exception:
+    _zstd = None
+try:  # optional columnar formats
+    import pyarrow as _pa
+    import pyarrow.ipc  # noqa: F401
+    import pyarrow.parquet as _pq
+except Exception:
+    _pa = None
+    _pq = None
+
+EXPORT_COLUMNS = (AuditEvent.id, AuditEvent.event_type, AuditEvent.entity_type, AuditEvent.entity_id, AuditEvent.user_id,
+                  AuditEvent.payload, AuditEvent.created_at, AuditEvent.integrity_hash)
+
+MEDIA_TYPES = {
+    'jsonl': 'application/jsonl',
+    'arrow': 'application/vnd.apache.arrow.stream',
+    'parquet': 'application/vnd.apache.parquet',
+}
+COMPRESSIONS = ('gzip', 'zstd')
+
+
+def accepts_encoding(accept_encoding: Optional[str], coding: str) -> bool:
+    """Whether an ``Accept-Encoding`` header admits ``coding`` (no header admits any coding, RFC 9110)."""
+    if accept_encoding is None:
+        return True
+    qualities = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key.lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qualities[name.strip().lower()] = q
+    q = qualities.get(coding, qualities.get('*', 0.0))
+    return q > 0
+
+
+def check_options(fmt: str, compression: Optional[str]) -> Optional[str]:
+    """Error message for an unsupported/unavailable format or compression, else None."""
+    if fmt not in MEDIA_TYPES:
+        return f"format must be one of {', '.join(MEDIA_TYPES)}"
+    if fmt != 'jsonl' and _pa is None:
+        return f'{fmt} export requires pyarrow'
+    if compression is not None:
+        if compression not in COMPRESSIONS:
+            return f"compression must be one of {', '.join(COMPRESSIONS)}"
+        if compression == 'zstd' and _zstd is None:
+            return 'zstd compression requires zstandard'
+        if fmt == 'parquet':
+            return 'parquet is compressed internally (zstd pages); omit compression'
+    return None
+
+
+def iter_rows(db: Session, after_id: Optional[int], to_id: Optional[int], batch_size: int, verify_integrity: bool) -> Iterator[list[dict]]:
+    """Export rows in id order, one list per cursor batch; ``integrity_ok`` added when verifying."""
+    prev_hash, seed_ok = audit_chain_verifier.seed(db, after_id) if verify_integrity else ('', True)
+    stmt = select(*EXPORT_COLUMNS).order_by(AuditEvent.id.asc())
+    if after_id:
+        stmt = stmt.where(AuditEvent.id > after_id)
+    if to_id is not None:
+        stmt = stmt.where(AuditEvent.id <= to_id)
+    result = db.execute(stmt.execution_options(yield_per=batch_size))
+    for part in result.partitions():
+        pins = checkpoints_between(db, part[0].id, part[-1].id) if verify_integrity else {}
+        rows = []
+        for r in part:
+            row = {
+                'id': r.id,
+                'event_type': r.event_type,
+                'entity_type': r.entity_type,
+                'entity_id': r.entity_id,
+                'user_id': r.user_id,
+                'payload': r.payload,
+                'created_at': r.created_at,
+                'integrity_hash': r.integrity_hash,
+            }
+            if verify_integrity:
+                # a broken stretch before the cursor surfaces on the first exported row
+                row['integrity_ok'] = seed_ok and chain_hash(prev_hash, r) == r.integrity_hash and pins.get(r.id, r.integrity_hash) == r.integrity_hash
+                seed_ok = True
+                prev_hash = r.integrity_hash or ''
+            rows.append(row)
+        yield rows
+
+
+def _dumps(obj: dict) -> bytes:
+    if _orjson is not None:
+        try:
+            return _orjson.dumps(obj, option=_orjson.OPT_SORT_KEYS)
+        except Exception:
+            pass  # e.g. >64-bit ints in a payload
+    # raw UTF-8 like orjson, so a row encodes to the same bytes on either path
+    return json.dumps(obj, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+def jsonl_chunks(batches: Iterator[list[dict]]) -> Iterator[bytes]:
+    for rows in batches:
+        out = []
+        for row in rows:
+            row['created_at'] = row['created_at'].isoformat() if row['created_at'] else None
+            out.append(_dumps(row))
+        yield b'\n'.join(out) + b'\n'
+
+
+class _ChunkSink:
+    """Write-only file object for pyarrow writers; bytes written so far are handed out by ``drain``."""
+
+    def __init__(self):
+        self._parts: list[bytes] = []
+        self._pos = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def writable(self) -> bool:
+        return True
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        out = b''.join(self._parts)
+        self._parts.clear()
+        return out
+
+
+def _schema(verify_integrity: bool):
+    fields = [
+        ('id', _pa.int64()), ('event_type', _pa.string()), ('entity_type', _pa.string()), ('entity_id', _pa.int64()),
+        ('user_id', _pa.int64()), ('payload', _pa.string()), ('created_at', _pa.timestamp('us', tz='UTC')),
+        ('integrity_hash', _pa.string()),
+    ]
+    if verify_integrity:
+        fields.append(('integrity_ok', _pa.bool_()))
+    return _pa.schema(fields)
+
+
+def _record_batch(rows: list[dict], schema):
+    for row in rows:
+        row['payload'] = None if row['payload'] is None else _dumps(row['payload']).decode()
+    return _pa.RecordBatch.from_pylist(rows, schema=schema)
+
+
+def arrow_chunks(batches: Iterator[list[dict]], verify_integrity: bool) -> Iterator[bytes]:
+    """Arrow IPC stream, one record batch per cursor batch (payload as a JSON string column)."""
+    schema = _schema(verify_integrity)
+    sink = _ChunkSink()
+    writer = _pa.ipc.new_stream(sink, schema)
+    for rows in batches:
+        writer.write_batch(_record_batch(rows, schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def parquet_chunks(batches: Iterator[list[dict]], verify_integrity: bool) -> Iterator[bytes]:
+    """Parquet file, one row group per cursor batch; the footer follows the last batch."""
+    schema = _schema(verify_integrity)
+    sink = _ChunkSink()
+    writer = _pq.ParquetWriter(sink, schema, compression='zstd')
+    for rows in batches:
+        writer.write_table(_pa.Table.from_batches([_record_batch(rows, schema)], schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def compress(chunks: Iterator[bytes], encoding: Optional[str]) -> Iterator[bytes]:
+    if encoding is None:
+        yield from chunks
+        return
+    if encoding == 'gzip':
+        co = zlib.compressobj(6, zlib.DEFLATED, 31)
+        flush, sync = co.flush, zlib.Z_SYNC_FLUSH
+    else:
+        co = _zstd.ZstdCompressor(level=3).compressobj()
+        flush, sync = co.flush, _zstd.COMPRESSOBJ_FLUSH_BLOCK
+    for chunk in chunks:
+        out = co.compress(chunk) + flush(sync)
+        if out:
+            yield out
+    yield flush()
+
+
+def stream(db: Session, *, after_id: Optional[int], to_id: Optional[int], batch_size: int, verify_integrity: bool, fmt: str, compression: Optional[str]) -> Iterator[bytes]:
+    batches = iter_rows(db, after_id, to_id, batch_size, verify_integrity)
+    if fmt == 'arrow':
+        chunks = arrow_chunks(batches, verify_integrity)
+    elif fmt == 'parquet':
+        chunks = parquet_chunks(batches, verify_integrity)
+    else:
+        chunks = jsonl_chunks(batches)
+    return compress(chunks, compression)
@@ -1,8 +1,77 @@
+from sqlalchemy import bindparam, event, insert, update
 from sqlalchemy.orm import Session
-from typing import Any
+from sqlalchemy.orm.attributes import set_committed_value
+from typing import Any, Iterable
 from app.models.database import AuditEvent
+from app.services.canonical_json import chain_canonical, event_leaf_hash
+from app.services.db_lock import advisory_xact_lock
 from hashlib import sha256
-import json
+
+CHAIN_LOCK = 'audit:chain'
+_HEAD_KEY = 'audit_chain_head'
+
+
+class AuditSequencer:
+    """Hands the integrity hash chain head to one writer at a time.
+
+    The head is read once per transaction (after taking the chain's advisory lock on Postgres, so
+    concurrent writers queue instead of forking the chain) and cached on the session; further events
+    in that transaction chain off the cache without querying. Commit / rollback drops the cache and
+    releases the lock, handing the chain to the next writer.
+    """
+
+    def head(self, db: Session) -> str:
+        cached = db.info.get(_HEAD_KEY)
+        if cached is not None:
+            return cached
+        advisory_xact_lock(db, CHAIN_LOCK)
+        prev = db.query(AuditEvent.integrity_hash).order_by(AuditEvent.id.desc()).first()
+        head = prev.integrity_hash if prev and prev.integrity_hash else ''
+        db.info[_HEAD_KEY] = head
+        return head
+
+    def advance(self, db: Session, digest: str):
+        db.info[_HEAD_KEY] = digest
+
+    def next_hash(self, db: Session, canonical: str) -> str:
+        digest = sha256((self.head(db) + canonical).encode()).hexdigest()
+        self.advance(db, digest)
+        return digest
+
+
+audit_sequencer = AuditSequencer()
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _drop_chain_head(session: Session, transaction):
+    # a real boundary (root or savepoint, not flush's internal subtransaction) may have discarded
+    # (rollback) or published (commit) chained rows
+    if transaction.parent is None or transaction.nested:
+        session.info.pop(_HEAD_KEY, None)
+
+
+_LEAF_UPDATE = update(AuditEvent.__table__).where(AuditEvent.__table__.c.id == bindparam('_id')).values(leaf_hash=bindparam('_leaf'))
+
+
+def store_leaf_hashes(db: Session, leaves: dict[int, str]):
+    """Fill ``leaf_hash`` for already-inserted rows (event id -> hex leaf hash)."""
+    if leaves:
+        db.execute(_LEAF_UPDATE, [{'_id': i, '_leaf': h} for i, h in leaves.items()])
+
+
+@event.listens_for(Session, 'after_flush')
+def _store_leaf_hashes(session: Session, flush_context):
+    # the leaf covers the row id, so it can only be hashed once the INSERT assigned one; one
+    # executemany per flush stores it for every audit row just written
+    params = []
+    for obj in session.new:
+        if isinstance(obj, AuditEvent) and obj.leaf_hash is None and obj.id is not None:
+            leaf = event_leaf_hash(obj.id, obj.event_type, obj.entity_type, obj.entity_id, obj.user_id, obj.payload)
+            set_committed_value(obj, 'leaf_hash', leaf)
+            params.append({'_id': obj.id, '_leaf': leaf})
+    if params:
+        session.connection().execute(_LEAF_UPDATE, params)
+
 
 def record_audit_event(db: Session, *, event_type: str, entity_type: str, entity_id: int | None = None, user_id: int | None = None, payload: Any | None = None) -> AuditEvent:
     """Persist an immutable audit event row.
@@ -22,17 +91,44 @@ def record_audit_event(db: Session, *, event_type: str, entity_type: str, entity
     payload : Any | None
         Canonical snapshot / metadata used for Merkle hashing
     """
-    # Fetch previous integrity hash
-    prev = db.query(AuditEvent).order_by(AuditEvent.id.desc()).first()
-    prev_hash = prev.integrity_hash if prev and prev.integrity_hash else ''
-    canonical = json.dumps({
-        'event_type': event_type,
-        'entity_type': entity_type,
-        'entity_id': entity_id,
-        'user_id': user_id,
-        'payload': payload
-    }, sort_keys=True, separators=(',',':'))
-    digest = sha256((prev_hash + canonical).encode()).hexdigest()
+    digest = audit_sequencer.next_hash(db, chain_canonical(event_type, entity_type, entity_id, user_id, payload))
     ae = AuditEvent(event_type=event_type, entity_type=entity_type, entity_id=entity_id, user_id=user_id, payload=payload, integrity_hash=digest)
     db.add(ae)
     return ae
+
+
+def record_audit_events_bulk(db: Session, events: Iterable[dict]) -> list[str]:
+    """Append many audit events: one pass over the chain, one executemany insert.
+
+    Each item takes the keyword arguments of ``record_audit_event`` (``event_type``, ``entity_type``
+    and optional ``entity_id`` / ``user_id`` / ``payload``). Returns the integrity hashes in order.
+    Rows are inserted immediately (not as pending ORM objects), after flushing anything pending so
+    id order keeps matching chain order; their leaf hashes follow in one executemany update.
+    """
+    items = list(events)
+    if not items:
+        return []
+    db.flush()
+    head = audit_sequencer.head(db)
+    rows = []
+    for ev in items:
+        entity_id = ev.get('entity_id')
+        user_id = ev.get('user_id')
+        payload = ev.get('payload')
+        head = sha256((head + chain_canonical(ev['event_type'], ev['entity_type'], entity_id, user_id, payload)).encode()).hexdigest()
+        rows.append({
+            'event_type': ev['event_type'],
+            'entity_type': ev['entity_type'],
+            'entity_id': entity_id,
+            'user_id': user_id,
+            'payload': payload,
+            'integrity_hash': head,
+        })
+    table = AuditEvent.__table__
+    ids = db.execute(insert(table).returning(table.c.id, sort_by_parameter_order=True), rows).scalars().all()
+    store_leaf_hashes(db, {
+        i: event_leaf_hash(i, r['event_type'], r['entity_type'], r['entity_id'], r['user_id'], r['payload'])
+        for i, r in zip(ids, rows)
+    })
+    audit_sequencer.advance(db, head)
+    return [r['integrity_hash'] for r in rows]
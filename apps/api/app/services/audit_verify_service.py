@@ -0,0 +1,181 @@
+"""Checkpointed verification of the audit integrity hash chain.
+
+A background pass re-hashes the chain forward from the newest checkpoint and records a new
+``AuditChainCheckpoint`` every ``audit_checkpoint_interval`` verified events. Any range can then be
+verified starting from the nearest checkpoint at or before it instead of from the first event, and the
+full chain splits into independent checkpoint-to-checkpoint segments (``app.cli.verify_audit_chain``
+verifies them in parallel). All walks read fixed-size keyset batches, so memory stays bounded.
+"""
+import logging
+import threading
+from hashlib import sha256
+from typing import Any, Iterator, Optional
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.database import AuditEvent, AuditChainCheckpoint
+from app.services.canonical_json import chain_canonical
+from app.services.db_lock import try_advisory_xact_lock
+
+logger = logging.getLogger(__name__)
+
+VERIFY_LOCK = 'audit:verify'
+
+_CHAIN_COLUMNS = (AuditEvent.id, AuditEvent.event_type, AuditEvent.entity_type, AuditEvent.entity_id,
+                  AuditEvent.user_id, AuditEvent.payload, AuditEvent.integrity_hash)
+
+
+def chain_hash(prev_hash: str, r: Any) -> str:
+    """Integrity hash ``r`` must carry when chained after ``prev_hash``."""
+    return sha256((prev_hash + chain_canonical(r.event_type, r.entity_type, r.entity_id, r.user_id, r.payload)).encode()).hexdigest()
+
+
+def checkpoints_between(db: Session, lo: int, hi: int) -> dict[int, str]:
+    rows = db.query(AuditChainCheckpoint.event_id, AuditChainCheckpoint.integrity_hash).filter(
+        AuditChainCheckpoint.event_id >= lo, AuditChainCheckpoint.event_id <= hi).all()
+    return {r.event_id: r.integrity_hash for r in rows}
+
+
+def walk_chain(db: Session, prev_hash: str, after_id: Optional[int], to_id: Optional[int] = None, batch_size: int = 2000) -> Iterator[tuple[Any, bool]]:
+    """Yield ``(row, ok)`` for events after ``after_id`` (through ``to_id``) in id order.
+
+    ``prev_hash`` is the chain hash at ``after_id``. A row is ok when it re-hashes from its predecessor's
+    stored hash and, where a checkpoint sits on it, still matches the checkpoint (a rewritten prefix
+    re-chained end to end passes the first test but not the second).
+    """
+    cursor = after_id
+    while True:
+        q = db.query(*_CHAIN_COLUMNS).order_by(AuditEvent.id.asc())
+        if cursor is not None:
+            q = q.filter(AuditEvent.id > cursor)
+        if to_id is not None:
+            q = q.filter(AuditEvent.id <= to_id)
+        batch = q.limit(batch_size).all()
+        if not batch:
+            return
+        pins = checkpoints_between(db, batch[0].id, batch[-1].id)
+        for r in batch:
+            ok = chain_hash(prev_hash, r) == r.integrity_hash and pins.get(r.id, r.integrity_hash) == r.integrity_hash
+            yield r, ok
+            prev_hash = r.integrity_hash or ''
+        cursor = batch[-1].id
+
+
+def verify_segment(db: Session, after_id: Optional[int], start_hash: str, end_id: Optional[int], end_hash: Optional[str], batch_size: int = 2000) -> dict:
+    """Verify events in (after_id, end_id]; ``end_id`` None means through the newest event."""
+    bad: list[int] = []
+    events = 0
+    last = start_hash
+    for r, ok in walk_chain(db, start_hash, after_id, end_id, batch_size):
+        events += 1
+        if not ok and len(bad) < 100:
+            bad.append(r.id)
+        last = r.integrity_hash or ''
+    end_ok = end_hash is None or last == end_hash
+    return {'after_id': after_id, 'end_id': end_id, 'events': events, 'bad_event_ids': bad, 'ok': not bad and end_ok}
+
+
+class AuditChainVerifier:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.verified_through: Optional[int] = None
+        self.verified_total = 0
+        self.checkpoints_written = 0
+        self.break_event_id: Optional[int] = None
+        # (event_id, chain hash, events verified through it): where the next pass resumes, so the
+        # stretch since the newest checkpoint is not re-walked every tick
+        self._resume: Optional[tuple[int, str, int]] = None
+
+    def nearest_checkpoint(self, db: Session, at_or_before: Optional[int] = None) -> Optional[AuditChainCheckpoint]:
+        q = db.query(AuditChainCheckpoint)
+        if at_or_before is not None:
+            q = q.filter(AuditChainCheckpoint.event_id <= at_or_before)
+        return q.order_by(AuditChainCheckpoint.event_id.desc()).first()
+
+    def seed(self, db: Session, after_id: Optional[int], batch_size: int = 2000) -> tuple[str, bool]:
+        """Chain hash at ``after_id`` (to verify the rows after it) and whether the walk to it held.
+
+        Walks forward from the nearest checkpoint, so at most ``audit_checkpoint_interval`` rows once
+        the background verifier has caught up.
+        """
+        if not after_id:
+            return '', True
+        cp = self.nearest_checkpoint(db, after_id)
+        prev = cp.integrity_hash if cp else ''
+        ok = True
+        for r, row_ok in walk_chain(db, prev, cp.event_id if cp else None, after_id, batch_size):
+            ok = ok and row_ok
+            prev = r.integrity_hash or ''
+        return prev, ok
+
+    def segments(self, db: Session) -> list[tuple[Optional[int], str, Optional[int], Optional[str]]]:
+        """``(after_id, start_hash, end_id, end_hash)`` between consecutive checkpoints, plus the open tail."""
+        cps = db.query(AuditChainCheckpoint.event_id, AuditChainCheckpoint.integrity_hash).order_by(AuditChainCheckpoint.event_id.asc()).all()
+        out = []
+        after, prev = None, ''
+        for cp in cps:
+            out.append((after, prev, cp.event_id, cp.integrity_hash))
+            after, prev = cp.event_id, cp.integrity_hash
+        out.append((after, prev, None, None))
+        return out
+
+    def run_once(self, db: Session, batch_size: int = 2000, interval: Optional[int] = None, max_events: Optional[int] = None) -> int:
+        """Verify forward from the newest checkpoint, checkpointing every ``interval`` events.
+
+        Stops at the first event that fails verification (no checkpoint is ever written past it).
+        Returns the number of events verified.
+        """
+        interval = max(1, interval or settings.audit_checkpoint_interval)
+        if not self._lock.acquire(blocking=False):
+            return 0
+        try:
+            if not try_advisory_xact_lock(db, VERIFY_LOCK):
+                return 0  # another worker is verifying
+            cp = self.nearest_checkpoint(db)
+            cp_count = cp.event_count if cp else 0
+            after, prev, count = (cp.event_id, cp.integrity_hash, cp_count) if cp else (None, '', 0)
+            resume = self._resume
+            if resume and resume[2] >= count and (after is None or resume[0] >= after):
+                row = db.query(AuditEvent.integrity_hash).filter(AuditEvent.id == resume[0]).first()
+                if row and (row.integrity_hash or '') == resume[1]:
+                    after, prev, count = resume
+            since = count - cp_count
+            verified = 0
+            broke = None
+            for r, ok in walk_chain(db, prev, after, None, batch_size):
+                if not ok:
+                    broke = r.id
+                    break
+                verified += 1
+                since += 1
+                after, prev, count = r.id, r.integrity_hash, count + 1
+                if since >= interval:
+                    db.add(AuditChainCheckpoint(event_id=r.id, integrity_hash=r.integrity_hash, event_count=count))
+                    self.checkpoints_written += 1
+                    since = 0
+                if max_events and verified >= max_events:
+                    break
+            db.commit()
+            if after is not None:
+                self._resume = (after, prev, count)
+                self.verified_through = after
+            if broke is not None and broke != self.break_event_id:
+                logger.error("[audit] integrity chain verification failed at event id=%s", broke)
+            if broke is not None or not max_events or verified < max_events:
+                self.break_event_id = broke
+            self.verified_total += verified
+            return verified
+        finally:
+            self._lock.release()
+
+    def stats(self) -> dict:
+        return {
+            'verified_through': self.verified_through or 0,
+            'verified_total': self.verified_total,
+            'checkpoints_written': self.checkpoints_written,
+            'break_event_id': self.break_event_id or 0,
+        }
+
+
+audit_chain_verifier = AuditChainVerifier()
@@ -151,13 +151,33 @@ class BlockchainService:
         # Update DB
         pass
 
-    async def anchor_merkle_root(self, merkle_root: str) -> Optional[str]:
+    async def get_pending_nonce(self, address: str) -> int:
+        """Next nonce for ``address``, counting transactions still in the mempool."""
+        if not self.web3:
+            raise Exception("Blockchain connection not configured (web3 not initialized)")
+        return self.web3.eth.get_transaction_count(Web3.to_checksum_address(address), 'pending')
+
+    async def get_confirmations(self, tx_hash: str) -> Optional[int]:
+        """Confirmations of a mined transaction; -1 if it reverted, None while pending/unknown."""
+        if not self.web3:
+            return None
+        try:
+            receipt = self.web3.eth.get_transaction_receipt(tx_hash)
+        except Exception:
+            return None
+        if receipt is None:
+            return None
+        if receipt.get('status') == 0:
+            return -1
+        return self.web3.eth.block_number - receipt['blockNumber'] + 1
+
+    async def anchor_merkle_root(self, merkle_root: str, nonce: Optional[int] = None) -> Optional[str]:
         """Anchor merkle root on-chain (stub).
 
         Returns tx hash if broadcast succeeded. In production this would submit
-        a transaction to a registry/anchor contract. For now we simulate
-        anchoring by returning a pseudo tx hash derived from root if web3 is
-        configured, else None.
+        a transaction to a registry/anchor contract (with ``nonce`` when the
+        caller manages nonces). For now we simulate anchoring by returning a
+        pseudo tx hash derived from root if web3 is configured, else None.
         """
         if not self.web3:
             return None
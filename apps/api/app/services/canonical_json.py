@@ -0,0 +1,65 @@
+"""Canonical JSON encoding shared by every audit / Merkle hashing site.
+
+The canonical form is ``json.dumps(obj, sort_keys=True, separators=(',', ':'))`` (ASCII, ``\\uXXXX``
+escapes); existing chain hashes, leaf hashes and stored roots were produced with it. orjson emits the
+same bytes for the common case much faster, so it is used when installed and its output cannot differ:
+anything non-ASCII or DEL (orjson writes them raw) or containing a float (repr formatting differs, e.g.
+``1e+16`` vs ``1e16``) is re-encoded with the stdlib, as is anything orjson rejects (non-str keys,
+>64-bit ints). Audit payloads carry amounts as strings, so the fast path is the normal one. (NaN /
+Infinity, which no JSON column can store, are the one input where the two encoders disagree.)
+"""
+import json
+import re
+from hashlib import sha256
+from typing import Any
+
+try:  # optional accelerator
+    import orjson as _orjson
+except Exception:  # pragma: no cover - fallback path
+    _orjson = None
+
+# a number token (after ``:`` / ``,`` / ``[``) with a fraction or exponent, i.e. a float; a string
+# such as "x:1.5" also matches, which only costs a stdlib re-encode. Bare scalars skip the fast path.
+_FLOAT = re.compile(rb'[:,\[]-?\d+[.eE]')
+
+
+def _stdlib(obj: Any) -> bytes:
+    return json.dumps(obj, sort_keys=True, separators=(',', ':')).encode()
+
+
+def canonical_dumps(obj: Any) -> bytes:
+    """Canonical (sorted keys, compact, ASCII) JSON encoding of ``obj``."""
+    if _orjson is not None and isinstance(obj, (dict, list)):
+        try:
+            out = _orjson.dumps(obj, option=_orjson.OPT_SORT_KEYS)
+        except Exception:
+            return _stdlib(obj)
+        if out.isascii() and b'\x7f' not in out and not _FLOAT.search(out):
+            return out
+    return _stdlib(obj)
+
+
+def leaf_digest(obj: Any) -> bytes:
+    """sha256 of the canonical encoding (Merkle leaf / proof hash)."""
+    return sha256(canonical_dumps(obj)).digest()
+
+
+def event_leaf_obj(event_id: int, event_type: str, entity_type: str, entity_id: int | None, user_id: int | None, payload: Any | None) -> dict:
+    """Object hashed into an audit event's Merkle leaf (the web verifier rebuilds the same keys)."""
+    return {'id': event_id, 't': event_type, 'e': entity_type, 'eid': entity_id, 'u': user_id, 'p': payload}
+
+
+def event_leaf_hash(event_id: int, event_type: str, entity_type: str, entity_id: int | None, user_id: int | None, payload: Any | None) -> str:
+    """Hex leaf hash as stored in ``AuditEvent.leaf_hash``."""
+    return leaf_digest(event_leaf_obj(event_id, event_type, entity_type, entity_id, user_id, payload)).hex()
+
+
+def chain_canonical(event_type: str, entity_type: str, entity_id: int | None, user_id: int | None, payload: Any | None) -> str:
+    """Canonical body folded into the integrity hash chain: sha256(prev_hash + chain_canonical(...))."""
+    return canonical_dumps({
+        'event_type': event_type,
+        'entity_type': entity_type,
+        'entity_id': entity_id,
+        'user_id': user_id,
+        'payload': payload,
+    }).decode()
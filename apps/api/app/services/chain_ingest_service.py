@@ -15,7 +15,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import Column, Integer, String
 from app.database import engine, Base
 from app.services.blockchain_service import blockchain_service
-from app.services.audit_service import record_audit_event
+from app.services.audit_service import record_audit_event, record_audit_events_bulk
 from app.models.database import Trade, Participant, User, Competition, MarketplaceOrderCache
 from app.services.cost_basis_service import apply_trade_cost_basis
 from app.config import settings
@@ -308,6 +308,7 @@ class ChainIngestService:
                 logs = web3.eth.get_logs({'fromBlock': bn, 'toBlock': bn})  # type: ignore[attr-defined]
             except Exception:
                 logs = []
+            log_events = []
             for lg in logs:
                 try:
                     # Basic shape extraction; real filters would match contract / topics
@@ -319,16 +320,14 @@ class ChainIngestService:
                         'transactionHash': getattr(getattr(lg,'transactionHash',''), 'hex', lambda: getattr(lg,'transactionHash', ''))(),
                         'logIndex': getattr(lg, 'logIndex', None),
                     }
-                    record_audit_event(
-                        db,
-                        event_type='CHAIN_LOG_INGEST',
-                        entity_type='LOG',
-                        entity_id=bn,
-                        user_id=None,
-                        payload=rec,
-                    )
+                    log_events.append({'event_type': 'CHAIN_LOG_INGEST', 'entity_type': 'LOG', 'entity_id': bn, 'payload': rec})
                 except Exception:
                     logger.exception("[chain] failed to record log event for block %s", bn)
+            # One chained executemany per block instead of a head lookup + insert per log
+            try:
+                record_audit_events_bulk(db, log_events)
+            except Exception:
+                logger.exception("[chain] failed to record log events for block %s", bn)
             # Marketplace event decoding after generic audit log ingestion
             try:
                 self._maybe_decode_marketplace_events(db, logs, datetime.fromtimestamp(block.timestamp, tz=timezone.utc))  # type: ignore
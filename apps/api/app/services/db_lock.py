@@ -0,0 +1,76 @@
+"""Cross-process mutual exclusion using Postgres advisory locks.
+
+On other dialects (SQLite in tests / local dev there is a single process) the helpers always succeed.
+Longer-lived leadership (periodic jobs) uses leases in ``scheduler_leases`` instead, which work on any
+dialect and survive pooled connections being recycled.
+"""
+import zlib
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import or_, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.database import SchedulerLease
+
+
+def lock_key(name: str) -> int:
+    """Stable signed 32-bit key for a lock name (fits pg advisory bigint keys)."""
+    return zlib.crc32(name.encode()) - (1 << 31)
+
+
+def is_postgres(db: Session) -> bool:
+    try:
+        return db.get_bind().dialect.name == 'postgresql'
+    except Exception:
+        return False
+
+
+def try_advisory_xact_lock(db: Session, name: str) -> bool:
+    """Take ``name`` for the rest of the current transaction (released on commit/rollback); False if held elsewhere."""
+    if not is_postgres(db):
+        return True
+    return bool(db.execute(text('SELECT pg_try_advisory_xact_lock(:k)'), {'k': lock_key(name)}).scalar())
+
+
+def advisory_xact_lock(db: Session, name: str) -> None:
+    """Block until ``name`` is held for the rest of the current transaction."""
+    if is_postgres(db):
+        db.execute(text('SELECT pg_advisory_xact_lock(:k)'), {'k': lock_key(name)})
+
+
+def acquire_lease(db: Session, name: str, holder: str, ttl_seconds: float, now: datetime | None = None) -> bool:
+    """Take or renew lease ``name`` for ``holder`` until now + ttl; False while another holder's lease is live.
+
+    The conditional UPDATE is atomic per row, so of several contenders for an expired lease only one wins.
+    Commits the session.
+    """
+    now = now or datetime.now(timezone.utc)
+    expires = now + timedelta(seconds=ttl_seconds)
+    res = db.execute(
+        update(SchedulerLease)
+        .where(SchedulerLease.name == name, or_(SchedulerLease.holder == holder, SchedulerLease.expires_at < now))
+        .values(holder=holder, expires_at=expires, acquired_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    won = res.rowcount == 1
+    if not won and db.get(SchedulerLease, name) is None:
+        try:
+            with db.begin_nested():
+                db.add(SchedulerLease(name=name, holder=holder, expires_at=expires, acquired_at=now))
+            won = True
+        except IntegrityError:
+            won = False  # another process created it first
+    db.commit()
+    return won
+
+
+def release_lease(db: Session, name: str, holder: str) -> None:
+    """Expire ``holder``'s lease now so another process can take over without waiting out the ttl."""
+    db.execute(
+        update(SchedulerLease)
+        .where(SchedulerLease.name == name, SchedulerLease.holder == holder)
+        .values(expires_at=datetime.now(timezone.utc))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
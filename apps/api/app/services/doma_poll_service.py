@@ -17,6 +17,7 @@ from app.models.database import Trade, Participant, Competition, User, Processed
 from app.services.cost_basis_service import apply_trade_cost_basis
 from app.database import Base, engine
 from app.services.audit_service import record_audit_event
+from app.services.leaderboard_service import leaderboard_service
 from contextlib import asynccontextmanager
 
 logger = logging.getLogger(__name__)
@@ -235,6 +236,7 @@ class DomaPollService:
             # Adjust portfolio value
             sign = Decimal(1) if trade_type == "BUY" else Decimal(-1)
             participant.portfolio_value = Decimal(participant.portfolio_value or 0) + (price * sign)
+            leaderboard_service.queue_update(session, participant.competition_id, participant.id, participant.user_id, participant.portfolio_value)
             # Apply shared cost basis logic
             domain_key = f"{token_address}:{token_id}"
             apply_trade_cost_basis(session, participant.id, domain_key, trade_type, price)
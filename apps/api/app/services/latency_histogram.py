@@ -0,0 +1,112 @@
+"""Fixed-memory, log-bucketed latency histograms with Prometheus text exposition.
+
+Observations are O(log buckets) (bisect over precomputed bounds) and memory does not grow with
+traffic, unlike the rolling sample lists these replace. Quantiles are estimated from buckets.
+"""
+from bisect import bisect_left
+from typing import Iterable
+
+# 0.5ms doubling up to ~32s; anything slower lands in +Inf
+DEFAULT_BUCKETS: tuple[float, ...] = tuple(0.0005 * (2 ** i) for i in range(17))
+
+
+class LogHistogram:
+    __slots__ = ('bounds', 'counts', 'total', 'sum')
+
+    def __init__(self, bounds: Iterable[float] = DEFAULT_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # last slot is +Inf
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        if value < 0:
+            value = 0.0
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += 1
+        self.sum += value
+
+    def merge(self, other: "LogHistogram"):
+        for i, c in enumerate(other.counts):
+            self.counts[i] += c
+        self.total += other.total
+        self.sum += other.sum
+
+    def quantile(self, q: float) -> float:
+        """Upper-bound estimate of the q-quantile (linear interpolation inside the bucket)."""
+        if self.total == 0:
+            return 0.0
+        rank = q * self.total
+        cumulative = 0
+        for i, c in enumerate(self.counts):
+            if c and cumulative + c >= rank:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.bounds[-1]
+                frac = (rank - cumulative) / c
+                return lower + (upper - lower) * frac
+            cumulative += c
+        return self.bounds[-1]
+
+    def snapshot(self) -> dict:
+        return {
+            'count': self.total,
+            'sum': self.sum,
+            'avg': (self.sum / self.total) if self.total else 0,
+            'p50': self.quantile(0.50),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+        }
+
+    def prometheus_lines(self, name: str, labels: str = '') -> list[str]:
+        sep = ',' if labels else ''
+        lines: list[str] = []
+        cumulative = 0
+        for bound, c in zip(self.bounds, self.counts):
+            cumulative += c
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{bound:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {self.total}')
+        label_part = f'{{{labels}}}' if labels else ''
+        lines.append(f'{name}_sum{label_part} {self.sum}')
+        lines.append(f'{name}_count{label_part} {self.total}')
+        return lines
+
+
+def escape_label_value(value) -> str:
+    """Label value escaped for the Prometheus text format (backslash, double quote, newline)."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class LabelledHistogram:
+    """One LogHistogram per label value (e.g. event type) with a cardinality cap."""
+
+    def __init__(self, label: str, max_series: int = 64, bounds: Iterable[float] = DEFAULT_BUCKETS):
+        self.label = label
+        self.max_series = max_series
+        self.bounds = tuple(bounds)
+        self.series: dict[str, LogHistogram] = {}
+
+    def observe(self, label_value: str | None, value: float):
+        key = label_value or 'unknown'
+        hist = self.series.get(key)
+        if hist is None:
+            if len(self.series) >= self.max_series:
+                key = 'other'
+                hist = self.series.get(key)
+            if hist is None:
+                hist = self.series[key] = LogHistogram(self.bounds)
+        hist.observe(value)
+
+    def combined(self) -> LogHistogram:
+        agg = LogHistogram(self.bounds)
+        for hist in list(self.series.values()):
+            agg.merge(hist)
+        return agg
+
+    def prometheus_lines(self, name: str, help_text: str = '') -> list[str]:
+        lines = []
+        if help_text:
+            lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for value, hist in sorted(self.series.items()):
+            lines.extend(hist.prometheus_lines(name, f'{self.label}="{escape_label_value(value)}"'))
+        return lines
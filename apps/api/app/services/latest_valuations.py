@@ -0,0 +1,107 @@
+"""Latest valuation per domain (``domain_latest_valuations``), kept next to the append-only ``valuations``.
+
+An ``after_flush`` listener upserts the projection on the flushing connection for every Valuation the
+session inserts, so it commits or rolls back with the valuation itself; bulk Core inserts call ``record``
+with the ids they got back. Upserts only move forward (higher valuation id wins), so concurrent writers
+cannot regress a domain to an older value. ``get_latest`` / ``get_latest_values`` serve any number of
+domains from one primary-key lookup instead of a ``created_at DESC LIMIT 1`` scan per domain.
+"""
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Dict, Iterable, List
+
+from sqlalchemy import Row, event, func
+from sqlalchemy.orm import Session
+
+from app.models.database import DomainLatestValuation, Valuation
+
+_CHUNK = 1000
+
+
+def _upsert(dialect: str):
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    stmt = insert(DomainLatestValuation)
+    return stmt.on_conflict_do_update(
+        index_elements=[DomainLatestValuation.domain_name],
+        set_={'valuation_id': stmt.excluded.valuation_id, 'model_version': stmt.excluded.model_version,
+              'value': stmt.excluded.value, 'factors': stmt.excluded.factors, 'created_at': stmt.excluded.created_at},
+        where=DomainLatestValuation.valuation_id < stmt.excluded.valuation_id,
+    )
+
+
+def record(conn, rows: Iterable[dict]):
+    """Upsert ``{domain_name, valuation_id, model_version, value, factors, created_at}`` rows (newest id per domain wins)."""
+    latest: Dict[str, dict] = {}
+    for r in rows:
+        cur = latest.get(r['domain_name'])
+        if cur is None or r['valuation_id'] > cur['valuation_id']:
+            latest[r['domain_name']] = r
+    if not latest:
+        return
+    stmt = _upsert(conn.dialect.name)
+    if stmt is not None:
+        conn.execute(stmt, list(latest.values()))
+        return
+    table = DomainLatestValuation.__table__
+    for r in latest.values():  # other dialects: update, insert when missing
+        res = conn.execute(table.update().where(table.c.domain_name == r['domain_name'], table.c.valuation_id < r['valuation_id'])
+                           .values(**r))
+        if not res.rowcount and conn.execute(table.select().where(table.c.domain_name == r['domain_name'])).first() is None:
+            conn.execute(table.insert().values(**r))
+
+
+def get_latest(db: Session, domains: Iterable[str]) -> Dict[str, Row]:
+    """Latest valuation row per domain (``valuation_id``, ``model_version``, ``value``, ``factors``,
+    ``created_at``); plain rows, so a projection upserted later in the same transaction is never
+    shadowed by a stale identity-map object."""
+    names = list(dict.fromkeys(d.lower() for d in domains))
+    t = DomainLatestValuation
+    out: Dict[str, Row] = {}
+    for i in range(0, len(names), _CHUNK):
+        q = db.query(t.domain_name, t.valuation_id, t.model_version, t.value, t.factors, t.created_at).filter(
+            t.domain_name.in_(names[i:i + _CHUNK]))
+        out.update({row.domain_name: row for row in q})
+    return out
+
+
+def get_latest_values(db: Session, domains: Iterable[str]) -> Dict[str, Decimal]:
+    """Latest valuation value per domain; domains never valued are omitted."""
+    names = list(dict.fromkeys(d.lower() for d in domains))
+    out: Dict[str, Decimal] = {}
+    for i in range(0, len(names), _CHUNK):
+        q = db.query(DomainLatestValuation.domain_name, DomainLatestValuation.value).filter(
+            DomainLatestValuation.domain_name.in_(names[i:i + _CHUNK]))
+        out.update({name: Decimal(str(value)) for name, value in q})
+    return out
+
+
+def rebuild(db: Session) -> int:
+    """Recompute the projection from ``valuations`` (repair / backfill); returns the number of domains."""
+    newest = db.query(func.max(Valuation.id)).group_by(Valuation.domain_name).subquery()
+    rows = db.query(Valuation.domain_name, Valuation.id, Valuation.model_version, Valuation.value, Valuation.factors,
+                    Valuation.created_at).filter(Valuation.id.in_(newest.select())).all()
+    db.query(DomainLatestValuation).delete(synchronize_session=False)
+    db.bulk_insert_mappings(DomainLatestValuation, [
+        {'domain_name': n, 'valuation_id': i, 'model_version': m, 'value': v, 'factors': f, 'created_at': c}
+        for n, i, m, v, f, c in rows])
+    db.commit()
+    return len(rows)
+
+
+@event.listens_for(Session, 'after_flush')
+def _record_valuations(session: Session, flush_context):
+    rows: List[dict] = []
+    for obj in session.new:
+        if isinstance(obj, Valuation) and obj.id is not None:
+            d = obj.__dict__
+            # created_at is a server default (not fetched at flush); the flush time stands in for it
+            rows.append({'domain_name': d.get('domain_name'), 'valuation_id': obj.id, 'model_version': d.get('model_version'),
+                         'value': d.get('value'), 'factors': d.get('factors'),
+                         'created_at': d.get('created_at') or datetime.now(timezone.utc)})
+    if rows:
+        record(session.connection(), rows)
@@ -0,0 +1,420 @@
+"""Server-maintained competition leaderboards with tick-coalesced rank deltas.
+
+Each competition is loaded from the database on first use, then kept ordered by ``portfolio_value``
+in an order-statistic structure (in-process sorted list, or a Redis ZSET when several workers must
+share one ordering). Value changes are O(log n); instead of broadcasting per trade, changes are
+marked dirty and a periodic tick publishes one ``leaderboard_delta`` per competition carrying
+every participant whose rank moved (plus those whose value changed).
+
+Writers inside a transaction call ``queue_update``: the change is applied when the session commits
+and dropped (with any competition loaded from that transaction's uncommitted rows) on rollback. The
+in-process store also re-reads its competitions every ``leaderboard_reload_seconds`` so values
+written by other workers show up.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from decimal import Decimal
+from typing import Callable, Optional
+
+from sortedcontainers import SortedList
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.database import Participant
+
+logger = logging.getLogger(__name__)
+
+_PENDING_KEY = 'leaderboard_pending'
+_LOADED_KEY = 'leaderboard_loaded'
+
+
+class MemoryLeaderboardStore:
+    """Per-process ordering: entries are ``(-value, participant_id, user_id)`` so position 0 is the leader
+    and ties break on participant id."""
+
+    name = 'memory'
+
+    def __init__(self):
+        self._order: dict[int, SortedList] = {}
+        self._entries: dict[int, dict[int, tuple]] = {}
+
+    def load(self, competition_id: int, rows: list[tuple[int, int, Decimal]]):
+        entries = {pid: (-Decimal(val or 0), pid, uid) for pid, uid, val in rows}
+        self._entries[competition_id] = entries
+        self._order[competition_id] = SortedList(entries.values())
+
+    def set(self, competition_id: int, participant_id: int, user_id: int, value: Decimal) -> tuple[Optional[int], int]:
+        order = self._order[competition_id]
+        entries = self._entries[competition_id]
+        old = entries.get(participant_id)
+        old_pos = None
+        if old is not None:
+            old_pos = order.bisect_left(old)
+            order.remove(old)
+        entry = (-Decimal(value or 0), participant_id, user_id)
+        entries[participant_id] = entry
+        order.add(entry)
+        return old_pos, order.bisect_left(entry)
+
+    def position(self, competition_id: int, participant_id: int) -> Optional[int]:
+        entry = self._entries.get(competition_id, {}).get(participant_id)
+        if entry is None:
+            return None
+        return self._order[competition_id].bisect_left(entry)
+
+    def window(self, competition_id: int, lo: int, hi: int) -> list[tuple[int, int, Decimal]]:
+        order = self._order[competition_id]
+        hi = min(hi, len(order) - 1)
+        return [(order[i][1], order[i][2], -order[i][0]) for i in range(lo, hi + 1)]
+
+    def size(self, competition_id: int) -> int:
+        return len(self._order.get(competition_id, ()))
+
+    def drop(self, competition_id: int):
+        self._order.pop(competition_id, None)
+        self._entries.pop(competition_id, None)
+
+
+# Redis orders equal scores by member, descending under ZREVRANGE; members start with the fixed-width
+# complement of the participant id so ties rank by ascending participant id, as in the memory store
+_PID_WIDTH = 12
+_PID_MAX = 10 ** _PID_WIDTH - 1
+
+
+def _member(participant_id: int, user_id: Optional[int]) -> str:
+    return f'{_PID_MAX - participant_id:0{_PID_WIDTH}d}:{"" if user_id is None else user_id}'
+
+
+def _parse_member(member) -> tuple[int, Optional[int]]:
+    if isinstance(member, bytes):
+        member = member.decode()
+    head, _, uid = member.partition(':')
+    return _PID_MAX - int(head), int(uid) if uid else None
+
+
+class RedisLeaderboardStore:
+    """Shared ordering in a ZSET per competition (ZADD / ZREVRANK / ZREVRANGE are O(log n)).
+
+    Members encode participant and user id (see ``_member``) so a window read carries everything a
+    delta needs. ``load`` replaces the key atomically (DEL + ZADD in one MULTI), so participants
+    removed from the table leave the ranking. ``drop`` forgets only this worker's member cache: the
+    ZSET is shared with the other workers and the next ``load`` rebuilds it.
+    """
+
+    name = 'redis'
+
+    def __init__(self, client, prefix: str = 'lb'):
+        self.client = client
+        self.prefix = prefix
+        self._members: dict[int, dict[int, str]] = {}
+
+    def _key(self, competition_id: int) -> str:
+        return f'{self.prefix}:{competition_id}'
+
+    def load(self, competition_id: int, rows: list[tuple[int, int, Decimal]]):
+        members = {pid: _member(pid, uid) for pid, uid, _ in rows}
+        key = self._key(competition_id)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(key)
+        if rows:
+            pipe.zadd(key, {members[pid]: float(val or 0) for pid, _, val in rows})
+        pipe.execute()
+        self._members[competition_id] = members
+
+    def set(self, competition_id: int, participant_id: int, user_id: int, value: Decimal) -> tuple[Optional[int], int]:
+        member = _member(participant_id, user_id)
+        self._members.setdefault(competition_id, {})[participant_id] = member
+        key = self._key(competition_id)
+        pipe = self.client.pipeline()
+        pipe.zrevrank(key, member)
+        pipe.zadd(key, {member: float(value or 0)})
+        pipe.zrevrank(key, member)
+        old_pos, _, new_pos = pipe.execute()
+        return old_pos, new_pos
+
+    def _find_member(self, competition_id: int, participant_id: int) -> Optional[str]:
+        # joined through another worker since this one loaded: the member is in the ZSET only
+        prefix = _member(participant_id, None)
+        for member, _ in self.client.zscan_iter(self._key(competition_id), match=f'{prefix}*'):
+            if isinstance(member, bytes):
+                member = member.decode()
+            self._members.setdefault(competition_id, {})[participant_id] = member
+            return member
+        return None
+
+    def position(self, competition_id: int, participant_id: int) -> Optional[int]:
+        member = self._members.get(competition_id, {}).get(participant_id) or self._find_member(competition_id, participant_id)
+        if member is None:
+            return None
+        return self.client.zrevrank(self._key(competition_id), member)
+
+    def window(self, competition_id: int, lo: int, hi: int) -> list[tuple[int, int, Decimal]]:
+        rows = []
+        for member, score in self.client.zrevrange(self._key(competition_id), lo, hi, withscores=True):
+            pid, uid = _parse_member(member)
+            rows.append((pid, uid, Decimal(str(score))))
+        return rows
+
+    def size(self, competition_id: int) -> int:
+        return int(self.client.zcard(self._key(competition_id)) or 0)
+
+    def drop(self, competition_id: int):
+        self._members.pop(competition_id, None)
+
+
+class _Dirty:
+    __slots__ = ('lo', 'hi', 'touched')
+
+    def __init__(self):
+        self.lo: Optional[int] = None
+        self.hi: Optional[int] = None
+        self.touched: set[int] = set()
+
+    def widen(self, lo: int, hi: int):
+        self.lo = lo if self.lo is None else min(self.lo, lo)
+        self.hi = hi if self.hi is None else max(self.hi, hi)
+
+
+class LeaderboardService:
+    def __init__(self, store=None, max_updates: int | None = None):
+        self.store = store or MemoryLeaderboardStore()
+        self.max_updates = max(1, max_updates or settings.leaderboard_delta_max_updates)
+        self._lock = threading.Lock()
+        self._loaded: set[int] = set()
+        self._loaded_at: dict[int, float] = {}
+        self._dirty: dict[int, _Dirty] = {}
+        # rank last published per competition -> participant; deltas only carry ranks that differ
+        self._published: dict[int, dict[int, int]] = {}
+        self._task: asyncio.Task | None = None
+        # counters
+        self.updates = 0
+        self.loads = 0
+        self.ticks = 0
+        self.deltas = 0
+
+    # --- state ---
+    def ensure_loaded(self, db: Session, competition_id: int):
+        if competition_id in self._loaded:
+            return
+        rows = (db.query(Participant.id, Participant.user_id, Participant.portfolio_value)
+                .filter(Participant.competition_id == competition_id).all())
+        with self._lock:
+            if competition_id in self._loaded:
+                return
+            data = [(r.id, r.user_id, Decimal(r.portfolio_value or 0)) for r in rows]
+            self.store.load(competition_id, data)
+            self._published[competition_id] = {
+                pid: idx for idx, (pid, _, _) in enumerate(self.store.window(competition_id, 0, len(data) - 1), start=1)
+            } if data else {}
+            self._loaded.add(competition_id)
+            self._loaded_at[competition_id] = time.monotonic()
+            self.loads += 1
+        # read inside the caller's transaction: forgotten again if that transaction rolls back
+        db.info.setdefault(_LOADED_KEY, set()).add(competition_id)
+
+    def reload(self, db: Session, competition_id: int) -> int:
+        """Re-read a loaded competition, applying every value that differs (marked dirty like any
+        update, so the next tick publishes the moves); returns the number of changed participants."""
+        if competition_id not in self._loaded:
+            return 0
+        rows = (db.query(Participant.id, Participant.user_id, Participant.portfolio_value)
+                .filter(Participant.competition_id == competition_id).all())
+        current = {pid: val for pid, _, val in self.store.window(competition_id, 0, self.store.size(competition_id) - 1)}
+        changed = 0
+        for r in rows:
+            value = Decimal(r.portfolio_value or 0)
+            if current.get(r.id) != value:
+                self.update(competition_id, r.id, r.user_id, value)
+                changed += 1
+        self._loaded_at[competition_id] = time.monotonic()
+        return changed
+
+    def reload_stale(self, session_factory: Callable | None = None) -> int:
+        """Reload in-process competitions older than ``leaderboard_reload_seconds`` (Redis is shared)."""
+        ttl = settings.leaderboard_reload_seconds
+        if not ttl or self.store.name != 'memory':
+            return 0
+        now = time.monotonic()
+        stale = [cid for cid in list(self._loaded) if now - self._loaded_at.get(cid, now) >= ttl]
+        if not stale:
+            return 0
+        if session_factory is None:
+            from app.database import SessionLocal
+            session_factory = SessionLocal
+        changed = 0
+        with session_factory() as db:
+            for cid in stale:
+                changed += self.reload(db, cid)
+        return changed
+
+    def is_loaded(self, competition_id: int) -> bool:
+        return competition_id in self._loaded
+
+    def queue_update(self, db: Session, competition_id: int, participant_id: int, user_id: int, portfolio_value):
+        """``update`` once ``db`` commits; dropped if it rolls back."""
+        db.info.setdefault(_PENDING_KEY, []).append((competition_id, participant_id, user_id, Decimal(portfolio_value or 0)))
+
+    def update(self, competition_id: int, participant_id: int, user_id: int, portfolio_value) -> Optional[int]:
+        """Record a participant's current value; returns the new 1-based rank (None if the competition
+        was never loaded here - the next ``ensure_loaded`` reads the committed value anyway)."""
+        if competition_id not in self._loaded:
+            return None
+        with self._lock:
+            old_pos, new_pos = self.store.set(competition_id, participant_id, user_id, Decimal(portfolio_value or 0))
+            dirty = self._dirty.setdefault(competition_id, _Dirty())
+            if old_pos is None:
+                # insertion shifts everyone below it
+                dirty.widen(new_pos, max(new_pos, self.store.size(competition_id) - 1))
+            else:
+                dirty.widen(min(old_pos, new_pos), max(old_pos, new_pos))
+            dirty.touched.add(participant_id)
+            self.updates += 1
+        return new_pos + 1
+
+    def rank(self, competition_id: int, participant_id: int) -> Optional[int]:
+        pos = self.store.position(competition_id, participant_id)
+        return None if pos is None else pos + 1
+
+    def top(self, competition_id: int, limit: int = 50) -> list[dict]:
+        rows = self.store.window(competition_id, 0, limit - 1) if limit > 0 else []
+        return [
+            {'participant_id': pid, 'user_id': uid, 'portfolio_value': str(val), 'rank': idx}
+            for idx, (pid, uid, val) in enumerate(rows, start=1)
+        ]
+
+    def reset(self, competition_id: int | None = None):
+        with self._lock:
+            ids = [competition_id] if competition_id is not None else list(self._loaded)
+            for cid in ids:
+                self.store.drop(cid)
+                self._loaded.discard(cid)
+                self._loaded_at.pop(cid, None)
+                self._dirty.pop(cid, None)
+                self._published.pop(cid, None)
+
+    # --- deltas ---
+    def collect_deltas(self) -> list[dict]:
+        """Drain dirty state into ``leaderboard_delta`` payloads (one per competition, split at ``max_updates``)."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            payloads: list[dict] = []
+            for cid, d in dirty.items():
+                if d.lo is None or cid not in self._loaded:
+                    continue
+                published = self._published.setdefault(cid, {})
+                updates = []
+                for offset, (pid, uid, val) in enumerate(self.store.window(cid, d.lo, d.hi)):
+                    rank = d.lo + offset + 1
+                    if published.get(pid) == rank and pid not in d.touched:
+                        continue
+                    published[pid] = rank
+                    updates.append({'participant_id': pid, 'user_id': uid, 'portfolio_value': str(val), 'rank': rank})
+                for i in range(0, len(updates), self.max_updates):
+                    payloads.append({
+                        'type': 'leaderboard_delta',
+                        'competition_id': cid,
+                        'updates': updates[i:i + self.max_updates],
+                    })
+            self.ticks += 1
+            self.deltas += len(payloads)
+            return payloads
+
+    def flush(self, publish: Callable[[dict], None] | None) -> int:
+        payloads = self.collect_deltas()
+        if publish:
+            for p in payloads:
+                publish(p)
+        return len(payloads)
+
+    def flush_if_idle(self, publish: Callable[[dict], None] | None) -> int:
+        """Publish immediately when no tick loop is running (tests, scripts, disabled ticker)."""
+        if self.ticking:
+            return 0
+        return self.flush(publish)
+
+    @property
+    def ticking(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def run(self, interval_ms: int | None = None):
+        from app.broadcast import broadcast_event
+        interval = max(1, interval_ms or settings.leaderboard_tick_ms) / 1000.0
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                # store calls block (Redis round trips under the lock); keep them off the event loop
+                await asyncio.to_thread(self.reload_stale)
+                for payload in await asyncio.to_thread(self.collect_deltas):
+                    await broadcast_event(payload)
+            except Exception:
+                logger.exception('[leaderboard] tick failed')
+
+    def start(self, interval_ms: int | None = None):
+        if self.ticking:
+            return self._task
+        self._task = asyncio.get_running_loop().create_task(self.run(interval_ms))
+        return self._task
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            'backend': self.store.name,
+            'competitions': len(self._loaded),
+            'updates': self.updates,
+            'loads': self.loads,
+            'ticks': self.ticks,
+            'deltas': self.deltas,
+            'pending': len(self._dirty),
+        }
+
+
+def _make_store():
+    if settings.leaderboard_backend == 'redis':
+        try:
+            from app.services.redis_rate_limit import get_client
+            client = get_client()
+            if client is not None:
+                return RedisLeaderboardStore(client, settings.leaderboard_redis_prefix)
+            logger.warning('[leaderboard] redis unavailable; using in-process ordering')
+        except Exception:
+            logger.exception('[leaderboard] redis store init failed; using in-process ordering')
+    return MemoryLeaderboardStore()
+
+
+leaderboard_service = LeaderboardService(_make_store())
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_updates(session: Session):
+    session.info.pop(_LOADED_KEY, None)
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    for competition_id, participant_id, user_id, value in pending:
+        leaderboard_service.update(competition_id, participant_id, user_id, value)
+    if not leaderboard_service.ticking:
+        from app.broadcast import get_sync_broadcast
+        leaderboard_service.flush(get_sync_broadcast())
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_updates(session: Session, previous_transaction):
+    # a rollback (possibly of a savepoint only) leaves it unclear which changes survive; reload the
+    # affected competitions from the table on next use
+    pending = session.info.pop(_PENDING_KEY, None) or []
+    loaded = session.info.pop(_LOADED_KEY, None) or set()
+    for cid in loaded | {p[0] for p in pending}:
+        leaderboard_service.reset(cid)
@@ -1,18 +1,117 @@
-import json
+import logging
+import threading
 from hashlib import sha256
-from typing import List, Dict, Any, Optional
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Iterator, Optional
+from uuid import uuid4
+from sqlalchemy import and_, func, or_, insert, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from app.models.database import AuditEvent, MerkleSnapshot, MerkleAccumulator
+from app.models.database import AuditEvent, MerkleSnapshot, MerkleAccumulator, MerkleNode
+from app.services.anchor_service import anchor_worker
 from app.services.blockchain_service import blockchain_service
+from app.services.audit_service import store_leaf_hashes
+from app.services.canonical_json import event_leaf_hash, event_leaf_obj, leaf_digest
+from app.services.db_lock import advisory_xact_lock, try_advisory_xact_lock
 from app.config import settings
 import base64
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import padding
 from cryptography.hazmat.primitives import serialization
 
+logger = logging.getLogger(__name__)
 
-def _hash_leaf(obj: Dict[str, Any]) -> bytes:
-    return sha256(json.dumps(obj, sort_keys=True, separators=(",", ":")).encode()).digest()
+SNAPSHOT_LOCK = 'merkle:snapshot'
+
+def _event_leaf(r: AuditEvent) -> bytes:
+    """Leaf hash recomputed from the row's content (stored rows carry it in ``leaf_hash``)."""
+    return leaf_digest(event_leaf_obj(r.id, r.event_type, r.entity_type, r.entity_id, r.user_id, r.payload))
+
+
+# columns hashed into a leaf; only needed for rows written before leaf_hash was stored
+_LEAF_COLUMNS = (AuditEvent.id, AuditEvent.event_type, AuditEvent.entity_type, AuditEvent.entity_id, AuditEvent.user_id, AuditEvent.payload)
+
+
+def _leaf_pairs(db: Session, rows) -> List[tuple[int, bytes]]:
+    missing = [r.id for r in rows if not r.leaf_hash]
+    filled: Dict[int, str] = {}
+    if missing:
+        for r in db.query(*_LEAF_COLUMNS).filter(AuditEvent.id.in_(missing)):
+            filled[r.id] = event_leaf_hash(r.id, r.event_type, r.entity_type, r.entity_id, r.user_id, r.payload)
+        store_leaf_hashes(db, filled)
+    return [(r.id, bytes.fromhex(r.leaf_hash or filled[r.id])) for r in rows]
+
+
+def read_leaves(db: Session, after_id: Optional[int], limit: int) -> List[tuple[int, bytes]]:
+    """Next ``limit`` (event_id, leaf) pairs in id order from the stored leaf hashes; payloads are only
+    read (and the hash filled in) for legacy rows that predate the column."""
+    q = db.query(AuditEvent.id, AuditEvent.leaf_hash).order_by(AuditEvent.id.asc())
+    if after_id is not None:
+        q = q.filter(AuditEvent.id > after_id)
+    return _leaf_pairs(db, q.limit(limit).all())
+
+
+def stream_leaves(db: Session, batch_size: int = 5000) -> Iterator[List[tuple[int, bytes]]]:
+    """Every (event_id, leaf) pair in id order, ``batch_size`` at a time, from one streamed query
+    (server-side cursor on Postgres) so memory stays constant however long the log is."""
+    result = db.execute(
+        select(AuditEvent.id, AuditEvent.leaf_hash).order_by(AuditEvent.id.asc()).execution_options(yield_per=batch_size)
+    )
+    for part in result.partitions():
+        yield _leaf_pairs(db, part)
+
+
+def _push_leaf(pending: Dict[int, bytes], idx: int, leaf: bytes):
+    """Fold leaf number ``idx`` into the frontier, merging every subtree it completes."""
+    cur, level = leaf, 0
+    while idx % 2 == 1:
+        cur = sha256(pending.pop(level) + cur).digest()
+        level += 1
+        idx //= 2
+    pending[level] = cur
+
+
+def _tree_height(size: int) -> int:
+    return (size - 1).bit_length() if size > 0 else 0
+
+
+def _node_keys(level: int, idx: int, size: int, out: set):
+    """Collect the stored (complete) nodes needed to evaluate node (level, idx) of a ``size``-leaf tree."""
+    start = idx << level
+    if start + (1 << level) <= size:
+        out.add((level, idx))
+        return
+    _node_keys(level - 1, 2 * idx, size, out)
+    if (2 * idx + 1) << (level - 1) < size:
+        _node_keys(level - 1, 2 * idx + 1, size, out)
+
+
+def _node_value(level: int, idx: int, size: int, nodes: dict, memo: dict) -> bytes:
+    """Hash of node (level, idx) for a tree of ``size`` leaves; the last node of an odd layer pairs with
+    itself, matching ``_build_merkle``. Only the right edge is partial, so this is O(log n) hashes."""
+    key = (level, idx)
+    if key in nodes:
+        return nodes[key]
+    if key in memo:
+        return memo[key]
+    left = _node_value(level - 1, 2 * idx, size, nodes, memo)
+    right = _node_value(level - 1, 2 * idx + 1, size, nodes, memo) if (2 * idx + 1) << (level - 1) < size else left
+    memo[key] = sha256(left + right).digest()
+    return memo[key]
+
+
+def _fold_peaks(peaks: List[tuple[int, bytes]]) -> bytes:
+    """Root of the padded tree from its frontier (one complete subtree per set bit, ascending level)."""
+    if not peaks:
+        return b"\x00" * 32
+    level, acc = peaks[0]
+    for peak_level, h in peaks[1:]:
+        while level < peak_level:
+            acc = sha256(acc + acc).digest()
+            level += 1
+        acc = sha256(h + acc).digest()
+        level += 1
+    return acc
 
 
 def _build_merkle(leaves: List[bytes]) -> bytes:
@@ -30,14 +129,19 @@ def _build_merkle(leaves: List[bytes]) -> bytes:
 
 
 class MerkleService:
-    """Service for incremental Merkle snapshot creation using an accumulator.
+    """Incremental Merkle snapshots over the audit log.
 
-    Accumulator: stores one hash per level representing combined hash of all
-    leaves processed so far at that level (similar to a binary prefix tree).
-    New leaves update the accumulator in O(log n). Snapshot root is computed
-    by folding non-empty level nodes from lowest to highest.
+    A single writer (in-process lock + Postgres advisory lock) appends new leaves to an in-memory
+    frontier (one complete subtree hash per level) while writing the level-indexed node table, then
+    persists the frontier to ``MerkleAccumulator`` once per snapshot. Roots fold the frontier in
+    O(log n); proofs read O(log n) stored nodes.
     """
 
+    def __init__(self):
+        self._lock = threading.RLock()
+        # (tree size, root, peaks by level) as of the last snapshot this process committed
+        self._frontier: Optional[tuple[int, str, Dict[int, bytes]]] = None
+
     def latest(self, db: Session) -> Optional[MerkleSnapshot]:
         return db.query(MerkleSnapshot).order_by(MerkleSnapshot.id.desc()).first()
 
@@ -60,87 +164,152 @@ class MerkleService:
         except Exception:
             return None
 
-    def _update_accumulator(self, db: Session, leaf: bytes):
-        curr = leaf
-        level = 0
-        max_retries = 3
-        retry_count = 0
-        
-        while True:
-            try:
-                node = db.query(MerkleAccumulator).filter(MerkleAccumulator.level == level).with_for_update().first()
-                if node is None:
-                    # Check one more time after acquiring lock to avoid race condition
-                    node = db.query(MerkleAccumulator).filter(MerkleAccumulator.level == level).first()
-                    if node is None:
-                        new_node = MerkleAccumulator(level=level, node_hash='0x'+curr.hex())
-                        db.add(new_node)
-                        db.flush()  # Flush to detect conflicts early
-                        break
-                    else:
-                        # Node was created by another transaction, continue with combine
-                        existing = bytes.fromhex(node.node_hash[2:])
-                        curr = sha256(existing + curr).digest()
-                        db.delete(node)
-                        db.flush()
-                        level += 1
-                        continue
-                else:
-                    existing = bytes.fromhex(node.node_hash[2:])
-                    # combine and clear this level (simulate carry)
-                    curr = sha256(existing + curr).digest()
-                    db.delete(node)
-                    db.flush()  # Ensure delete is processed before moving to next level
-                    level += 1
-                    continue
-            except Exception as e:
-                # Handle unique constraint violation
-                if 'unique constraint' in str(e).lower() or 'duplicate key' in str(e).lower():
-                    retry_count += 1
-                    if retry_count >= max_retries:
-                        # Skip this update if we can't resolve the conflict
-                        db.rollback()
-                        return
-                    # Rollback and retry
-                    db.rollback()
-                    level = 0
-                    curr = leaf
-                    continue
-                else:
-                    raise
-
     def _compute_root_from_accumulator(self, db: Session) -> str:
         levels = db.query(MerkleAccumulator).order_by(MerkleAccumulator.level.asc()).all()
-        hashes = []
-        for node in levels:
-            h = bytes.fromhex(node.node_hash[2:])
-            hashes.append(h)
-        if not hashes:
-            return '0x' + ('00'*32)
-        # fold from lowest to highest
-        root = hashes[0]
-        for h in hashes[1:]:
-            root = sha256(root + h).digest()
-        return '0x'+root.hex()
-
-    def snapshot_incremental(self, db: Session) -> Optional[MerkleSnapshot]:
+        peaks = [(node.level, bytes.fromhex(node.node_hash[2:])) for node in levels]
+        return '0x' + _fold_peaks(peaks).hex()
+
+    # --- level-indexed node table (MerkleNode) ---
+    def _indexed_size(self, db: Session) -> tuple[int, Optional[int]]:
+        row = (db.query(MerkleNode.idx, MerkleNode.event_id)
+               .filter(MerkleNode.level == 0).order_by(MerkleNode.idx.desc()).first())
+        return (row.idx + 1, row.event_id) if row else (0, None)
+
+    def _fetch_nodes(self, db: Session, keys: set, chunk: int = 500) -> dict:
+        out: dict = {}
+        ordered = sorted(keys)
+        for i in range(0, len(ordered), chunk):
+            conds = [and_(MerkleNode.level == level, MerkleNode.idx == idx) for level, idx in ordered[i:i + chunk]]
+            rows = db.query(MerkleNode.level, MerkleNode.idx, MerkleNode.node_hash).filter(or_(*conds)).all()
+            out.update({(r.level, r.idx): bytes.fromhex(r.node_hash[2:]) for r in rows})
+        return out
+
+    def _peaks_from_nodes(self, db: Session, size: int) -> Dict[int, bytes]:
+        # the frontier of a size-n tree is the stored complete node at each set bit of n
+        waiting = {(level, (size >> level) - 1) for level in range(size.bit_length()) if (size >> level) & 1}
+        found = self._fetch_nodes(db, waiting)
+        return {level: found[(level, idx)] for level, idx in waiting}
+
+    def _append_nodes(self, db: Session, start: int, leaves: List[tuple[int, bytes]], pending: Optional[Dict[int, bytes]] = None):
+        """Append leaves at positions start.. and every subtree they complete (amortized 2 rows per leaf).
+
+        ``pending`` is the frontier for ``start`` leaves (left siblings still waiting for a partner);
+        it is read from the node table when not supplied and is updated in place.
+        """
+        if pending is None:
+            pending = self._peaks_from_nodes(db, start)
+        rows = []
+        for offset, (event_id, leaf) in enumerate(leaves):
+            cur, level, idx = leaf, 0, start + offset
+            rows.append({'level': 0, 'idx': idx, 'node_hash': '0x' + leaf.hex(), 'event_id': event_id})
+            while idx % 2 == 1:
+                cur = sha256(pending.pop(level) + cur).digest()
+                level += 1
+                idx //= 2
+                rows.append({'level': level, 'idx': idx, 'node_hash': '0x' + cur.hex(), 'event_id': None})
+            pending[level] = cur
+        db.execute(insert(MerkleNode.__table__), rows)  # Core executemany (ORM bulk splits on None event_id)
+
+    def sync_nodes(self, db: Session, batch_size: int = 1000) -> int:
+        """Index audit events not yet in the node table (append-only, in id order). Returns leaves added."""
+        with self._lock:
+            return self._sync_nodes(db, batch_size)
+
+    def _sync_nodes(self, db: Session, batch_size: int, through: Optional[int] = None) -> int:
+        size, last_event_id = self._indexed_size(db)
+        added = 0
         try:
+            with db.begin_nested():
+                while through is None or last_event_id is None or last_event_id < through:
+                    batch = read_leaves(db, last_event_id, batch_size)
+                    if through is not None:
+                        batch = [b for b in batch if b[0] <= through]
+                    if not batch:
+                        break
+                    self._append_nodes(db, size + added, batch)
+                    added += len(batch)
+                    last_event_id = batch[-1][0]
+        except IntegrityError:
+            # another writer indexed the same positions first; its rows are identical
+            return 0
+        return added
+
+    def index_through(self, db: Session, audit_event_id: int, batch_size: int = 1000) -> int:
+        """Index events up to ``audit_event_id`` for a proof read ahead of the scheduler (which may be off).
+
+        Holds the snapshot advisory lock so on-demand indexing never interleaves with a snapshot, and
+        commits to publish the nodes and release it. Returns leaves added.
+        """
+        with self._lock:
+            try:
+                advisory_xact_lock(db, SNAPSHOT_LOCK)
+                added = self._sync_nodes(db, batch_size, through=audit_event_id)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+        return added
+
+    def _position(self, db: Session, audit_event_id: int) -> Optional[int]:
+        row = db.query(MerkleNode.idx).filter(MerkleNode.level == 0, MerkleNode.event_id == audit_event_id).first()
+        return row.idx if row else None
+
+    def root_at(self, db: Session, size: int) -> str:
+        """Root of the tree over the first ``size`` indexed events (reproduces any historical snapshot)."""
+        if size <= 0:
+            return '0x' + ('00' * 32)
+        height = _tree_height(size)
+        keys: set = set()
+        _node_keys(height, 0, size, keys)
+        return '0x' + _node_value(height, 0, size, self._fetch_nodes(db, keys), {}).hex()
+
+    def snapshot_size(self, db: Session, snap: MerkleSnapshot) -> int:
+        pos = self._position(db, snap.last_event_id)
+        return pos + 1 if pos is not None else snap.event_count
+
+    def _load_frontier(self, db: Session, size: int, last: Optional[MerkleSnapshot]) -> Dict[int, bytes]:
+        last_root = last.merkle_root if last else None
+        cached = self._frontier
+        if cached and cached[0] == size and cached[1] == last_root:
+            return dict(cached[2])
+        # checkpoint written with the last snapshot; stale if leaves were indexed since (scheduler sync)
+        peaks = {r.level: bytes.fromhex(r.node_hash[2:]) for r in db.query(MerkleAccumulator).all()}
+        if sum(1 << level for level in peaks) == size and (
+            last is None or last.event_count != size or '0x' + _fold_peaks(sorted(peaks.items())).hex() == last_root
+        ):
+            return peaks
+        return self._peaks_from_nodes(db, size)
+
+    def _checkpoint(self, db: Session, peaks: Dict[int, bytes]):
+        db.query(MerkleAccumulator).delete(synchronize_session=False)
+        if peaks:
+            db.execute(insert(MerkleAccumulator), [
+                {'level': level, 'node_hash': '0x' + h.hex()} for level, h in sorted(peaks.items())
+            ])
+
+    def snapshot_incremental(self, db: Session, batch_size: int = 2000) -> Optional[MerkleSnapshot]:
+        if not self._lock.acquire(blocking=False):
+            return None  # another thread of this process is already snapshotting
+        try:
+            if not try_advisory_xact_lock(db, SNAPSHOT_LOCK):
+                return None  # another worker holds the snapshot lock
             last = self.latest(db)
-            # Determine new events
-            q = db.query(AuditEvent).order_by(AuditEvent.id.asc())
-            if last:
-                events = q.filter(AuditEvent.id > last.last_event_id).all()
-            else:
-                events = q.all()
-            if not events:
+            size, cursor = self._indexed_size(db)
+            peaks = self._load_frontier(db, size, last)
+            # Append every event past the indexed tree (covers everything since the last snapshot)
+            while True:
+                batch = read_leaves(db, cursor, batch_size)
+                if not batch:
+                    break
+                self._append_nodes(db, size, batch, peaks)
+                size += len(batch)
+                cursor = batch[-1][0]
+            if cursor is None or (last and cursor <= last.last_event_id):
+                db.commit()  # keep any catch-up indexing, release the advisory lock
                 return None
-            for r in events:
-                leaf = _hash_leaf({"id": r.id, "t": r.event_type, "e": r.entity_type, "eid": r.entity_id, "u": r.user_id, "p": r.payload})
-                self._update_accumulator(db, leaf)
-            # root from accumulator
-            root = self._compute_root_from_accumulator(db)
-            total_events = q.count()
-            snap = MerkleSnapshot(last_event_id=events[-1].id, merkle_root=root, event_count=total_events)
+            root = '0x' + _fold_peaks(sorted(peaks.items())).hex()
+            self._checkpoint(db, peaks)
+            snap = MerkleSnapshot(last_event_id=cursor, merkle_root=root, event_count=size)
             # Sign
             sig = self._sign(root)
             if sig:
@@ -149,73 +318,224 @@ class MerkleService:
             db.add(snap)
             db.commit()
             db.refresh(snap)
-        except Exception as e:
+            self._frontier = (size, root, peaks)
+        except IntegrityError:
+            # another worker indexed the same positions concurrently; retry on the next tick
+            db.rollback()
+            self._frontier = None
+            logger.warning("[merkle] node table conflict during snapshot; will retry")
+            return None
+        except Exception:
             # Rollback on any error to clear invalid transaction state
             db.rollback()
+            self._frontier = None
             raise
-        # Attempt on-chain anchoring (async call simplified synchronously if possible)
+        finally:
+            self._lock.release()
+        # On-chain anchoring runs in the anchor worker; newer roots supersede this one while queued
         try:
             if blockchain_service.ensure_initialized():
-                # Since anchor_merkle_root is async, schedule simple loop run
-                import asyncio
-                async def _anchor():
-                    tx = await blockchain_service.anchor_merkle_root(root)
-                    if tx:
-                        snap.anchor_tx_hash = tx
-                        db.add(snap)
-                        db.commit()
-                try:
-                    loop = asyncio.get_running_loop()
-                    loop.create_task(_anchor())
-                except RuntimeError:
-                    # no running loop, run inline
-                    asyncio.run(_anchor())
+                anchor_worker.submit(snap.id, root)
         except Exception:
-            pass
+            logger.exception("[merkle] queueing snapshot %s for anchoring failed", snap.id)
         return snap
 
-    def compute_proof_path(self, db: Session, audit_event_id: int) -> dict:
-        events = db.query(AuditEvent).order_by(AuditEvent.id.asc()).all()
-        if not events:
-            return {"error": "no events"}
-        leaves = [
-            _hash_leaf(
-                {
-                    "id": r.id,
-                    "t": r.event_type,
-                    "e": r.entity_type,
-                    "eid": r.entity_id,
-                    "u": r.user_id,
-                    "p": r.payload,
-                }
-            )
-            for r in events
-        ]
-        # index lookup
-        index_map = {r.id: i for i, r in enumerate(events)}
-        if audit_event_id not in index_map:
-            return {"error": "event not found"}
-        idx = index_map[audit_event_id]
+    def recompute(self, db: Session, batch_size: int = 5000, progress=None) -> dict:
+        """Root over every audit event from one streamed pass, independent of the node table.
+
+        Memory is one frontier hash per tree level plus one batch; ``progress(leaves_done)`` is called
+        after each batch.
+        """
+        pending: Dict[int, bytes] = {}
+        size = 0
+        last_event_id = 0
+        for batch in stream_leaves(db, batch_size):
+            for _, leaf in batch:
+                _push_leaf(pending, size, leaf)
+                size += 1
+            last_event_id = batch[-1][0]
+            if progress:
+                progress(size)
+        return {"merkle_root": "0x" + _fold_peaks(sorted(pending.items())).hex(), "event_count": size, "last_event_id": last_event_id}
+
+    def compute_proof_path(self, db: Session, audit_event_id: int, tree_size: Optional[int] = None) -> dict:
+        """Inclusion proof from O(log n) stored nodes. ``tree_size`` pins the proof to a historical
+        snapshot (see ``snapshot_size``); default is every indexed event. An event the scheduler has not
+        indexed yet is indexed on demand (``index_through``); ``{"error": "event not indexed yet"}`` is
+        left only for an event that still has no position after that."""
+        pos = self._position(db, audit_event_id)
+        if pos is None:
+            if db.query(AuditEvent.id).filter(AuditEvent.id == audit_event_id).first() is None:
+                return {"error": "event not found"}
+            self.index_through(db, audit_event_id)
+            pos = self._position(db, audit_event_id)
+            if pos is None:
+                return {"error": "event not indexed yet"}
+        size = tree_size if tree_size is not None else self._indexed_size(db)[0]
+        if pos >= size:
+            return {"error": "event not in snapshot"}
+        height = _tree_height(size)
+        keys: set = set()
+        for level in range(height):
+            sib = (pos >> level) ^ 1
+            _node_keys(level, sib if (sib << level) < size else pos >> level, size, keys)
+        _node_keys(height, 0, size, keys)
+        nodes = self._fetch_nodes(db, keys)
+        memo: dict = {}
         path: list[str] = []
-        # Build layers retaining order to compute sibling path
-        layer = leaves
-        while len(layer) > 1:
-            is_right = idx % 2 == 1
-            sibling_index = idx - 1 if is_right else idx + 1
-            if sibling_index >= len(layer):
-                sibling_index = idx  # duplicate if no sibling
-            sibling = layer[sibling_index]
-            path.append("0x" + sibling.hex())
-            # Next layer index
-            idx = idx // 2
-            nxt: list[bytes] = []
-            for i in range(0, len(layer), 2):
-                left = layer[i]
-                right = layer[i + 1] if i + 1 < len(layer) else left
-                nxt.append(sha256(left + right).digest())
-            layer = nxt
-        root = "0x" + layer[0].hex()
-        return {"event_id": audit_event_id, "merkle_root": root, "path": path, "position": index_map[audit_event_id]}
+        for level in range(height):
+            sib = (pos >> level) ^ 1
+            if (sib << level) >= size:
+                sib = pos >> level  # duplicate if no sibling
+            path.append("0x" + _node_value(level, sib, size, nodes, memo).hex())
+        root = "0x" + _node_value(height, 0, size, nodes, memo).hex()
+        return {"event_id": audit_event_id, "merkle_root": root, "path": path, "position": pos, "tree_size": size}
+
+    def compute_multi_proof(self, db: Session, audit_event_ids: List[int], tree_size: Optional[int] = None) -> dict:
+        """One compact proof for many events against a single root.
+
+        ``nodes`` lists each sibling hash the verifier cannot derive from the supplied leaves or from
+        hashes it already computed, once, as ``[level, idx, hash]`` sorted by level then idx. Verify by
+        hashing the leaves into a ``{(0, position): hash}`` map, then combining level by level: a missing
+        sibling comes from ``nodes``, and a node at the end of an odd layer pairs with itself.
+        """
+        ids = list(dict.fromkeys(audit_event_ids))
+        positions = self._positions(db, ids)
+        unindexed = [i for i in ids if i not in positions]
+        if unindexed and db.query(AuditEvent.id).filter(AuditEvent.id.in_(unindexed)).first() is not None:
+            # index existing events the scheduler has not reached; unknown ids stay in ``missing``
+            self.index_through(db, max(unindexed))
+            positions = self._positions(db, ids)
+        size = tree_size if tree_size is not None else self._indexed_size(db)[0]
+        missing = [i for i in ids if i not in positions or positions[i] >= size]
+        known = {positions[i] for i in ids if i in positions and positions[i] < size}
+        height = _tree_height(size)
+        wanted: list[tuple[int, int]] = []
+        level_known = set(known)
+        for level in range(height):
+            nxt = set()
+            for idx in level_known:
+                sib = idx ^ 1
+                if sib not in level_known and (sib << level) < size:
+                    wanted.append((level, sib))
+                nxt.add(idx >> 1)
+            level_known = nxt
+        keys: set = set()
+        for level, idx in set(wanted):
+            _node_keys(level, idx, size, keys)
+        if size:
+            _node_keys(height, 0, size, keys)
+        nodes = self._fetch_nodes(db, keys)
+        memo: dict = {}
+        root = "0x" + (_node_value(height, 0, size, nodes, memo).hex() if size else "00" * 32)
+        return {
+            "merkle_root": root,
+            "tree_size": size,
+            "positions": {eid: positions[eid] for eid in ids if eid not in missing},
+            "nodes": [[level, idx, "0x" + _node_value(level, idx, size, nodes, memo).hex()] for level, idx in sorted(set(wanted))],
+            "missing": missing,
+        }
+
+    def _positions(self, db: Session, audit_event_ids: List[int], chunk: int = 1000) -> Dict[int, int]:
+        out: Dict[int, int] = {}
+        for i in range(0, len(audit_event_ids), chunk):
+            rows = (db.query(MerkleNode.event_id, MerkleNode.idx)
+                    .filter(MerkleNode.level == 0, MerkleNode.event_id.in_(audit_event_ids[i:i + chunk])).all())
+            out.update({r.event_id: r.idx for r in rows})
+        return out
+
+
+def verify_multi_proof(leaves: Dict[int, bytes], nodes: List[list], tree_size: int, root: str) -> bool:
+    """Reference verifier for ``compute_multi_proof`` output (``leaves`` maps position -> leaf hash)."""
+    if not leaves or tree_size <= 0:
+        return False
+    provided = {(level, idx): bytes.fromhex(h[2:]) for level, idx, h in nodes}
+    layer = dict(leaves)
+    for level in range(_tree_height(tree_size)):
+        nxt: Dict[int, bytes] = {}
+        for idx in sorted(layer):
+            parent = idx >> 1
+            if parent in nxt:
+                continue
+            left_idx, right_idx = parent * 2, parent * 2 + 1
+            left = layer.get(left_idx) or provided.get((level, left_idx))
+            if (right_idx << level) >= tree_size:
+                right = left
+            else:
+                right = layer.get(right_idx) or provided.get((level, right_idx))
+            if left is None or right is None:
+                return False
+            nxt[parent] = sha256(left + right).digest()
+        layer = nxt
+    return len(layer) == 1 and "0x" + layer[0].hex() == root
 
 
 merkle_service = MerkleService()
+
+
+class RecomputeJobs:
+    """Full Merkle recomputes run on a background thread; callers poll a job handle.
+
+    One job runs at a time (starting while one is queued or running returns that job). The last
+    ``keep`` jobs stay queryable.
+    """
+
+    def __init__(self, keep: int = 20):
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, dict] = {}
+        self.keep = keep
+
+    def get(self, job_id: str) -> Optional[dict]:
+        job = self._jobs.get(job_id)
+        return dict(job) if job else None
+
+    def create(self) -> tuple[dict, bool]:
+        """(job, created): the active job if there is one, else a new queued job."""
+        with self._lock:
+            for job in self._jobs.values():
+                if job["status"] in ("queued", "running"):
+                    return job, False
+            job = {"id": uuid4().hex, "status": "queued", "processed": 0, "total": None,
+                   "started_at": None, "finished_at": None, "result": None, "error": None}
+            self._jobs[job["id"]] = job
+            while len(self._jobs) > self.keep:
+                self._jobs.pop(next(iter(self._jobs)))
+            return job, True
+
+    def start(self, session_factory=None) -> dict:
+        job, created = self.create()
+        if created:
+            if session_factory is None:
+                from app.database import SessionLocal as session_factory
+            threading.Thread(target=self._run_with_session, args=(job, session_factory), name="merkle-recompute", daemon=True).start()
+        return dict(job)
+
+    def _run_with_session(self, job: dict, session_factory):
+        with session_factory() as db:
+            self.run(job, db)
+
+    def run(self, job: dict, db: Session):
+        """Recompute, then persist (and sign) the result as a snapshot."""
+        job["status"] = "running"
+        job["started_at"] = datetime.now(timezone.utc).isoformat()
+        try:
+            job["total"] = db.query(func.count(AuditEvent.id)).scalar() or 0
+            res = merkle_service.recompute(db, progress=lambda n: job.__setitem__("processed", n))
+            snap = MerkleSnapshot(last_event_id=res["last_event_id"], merkle_root=res["merkle_root"], event_count=res["event_count"])
+            sig = merkle_service._sign(res["merkle_root"])
+            if sig:
+                snap.signature = sig
+            db.add(snap)
+            db.commit()
+            db.refresh(snap)
+            job["result"] = {**res, "snapshot_id": snap.id}
+            job["status"] = "done"
+        except Exception as e:
+            logger.exception("[merkle] recompute job %s failed", job["id"])
+            job["error"] = str(e)
+            job["status"] = "failed"
+        finally:
+            job["finished_at"] = datetime.now(timezone.utc).isoformat()
+
+
+recompute_jobs = RecomputeJobs()
@@ -16,18 +16,21 @@ def invalidate_leaderboard_cache(competition_id: int):
     _LEADERBOARD_CACHE.pop(competition_id, None)
 
 def get_ws_latency_snapshot():
-    samples = list(getattr(_bc, '_ws_latency_samples', []))
-    if not samples:
+    """Summary of end-to-end websocket delivery latency (all event types), estimated from buckets."""
+    hist = _bc.get_latency_histograms()['delivery'].combined()
+    if not hist.total:
         return {'count': 0, 'p50': 0, 'p95': 0, 'avg': 0}
-    samples_sorted = sorted(samples)
-    n = len(samples_sorted)
-    def pct(p: float):
-        if n == 0:
-            return 0
-        idx = int(p * (n-1))
-        return samples_sorted[idx]
-    avg = sum(samples_sorted)/n
-    return {'count': n, 'p50': pct(0.50), 'p95': pct(0.95), 'avg': avg}
+    snap = hist.snapshot()
+    return {'count': snap['count'], 'p50': snap['p50'], 'p95': snap['p95'], 'avg': snap['avg']}
+
+def get_ws_latency_exposition() -> list[str]:
+    """Prometheus histogram lines for websocket delivery / ack round-trip / fan-out latency."""
+    hists = _bc.get_latency_histograms()
+    lines = hists['delivery'].prometheus_lines('ws_delivery_latency_seconds', 'Event creation to completed socket send')
+    lines += hists['ack_rtt'].prometheus_lines('ws_ack_rtt_seconds', 'Event creation to client acknowledgement (PING with seq)')
+    lines.append('# TYPE ws_fanout_enqueue_seconds histogram')
+    lines += hists['fanout_enqueue'].prometheus_lines('ws_fanout_enqueue_seconds')
+    return lines
 
 def _compute_returns(values: list[tuple[datetime, Decimal]]):
     returns: list[float] = []
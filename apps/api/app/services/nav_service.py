@@ -3,8 +3,9 @@ from datetime import datetime, timezone, timedelta
 from decimal import Decimal
 from typing import Optional
 from app.database import SessionLocal
-from app.models.database import DomainETF as DomainETFModel, DomainETFPosition as DomainETFPositionModel, Domain as DomainModel, Valuation as ValuationModel, DomainETFFeeEvent, DomainETFNavHistory
+from app.models.database import DomainETF as DomainETFModel, DomainETFPosition as DomainETFPositionModel, Domain as DomainModel, DomainETFFeeEvent, DomainETFNavHistory
 from app.services.audit_service import record_audit_event
+from app.services.latest_valuations import get_latest_values
 
 logger = logging.getLogger(__name__)
 
@@ -18,20 +19,16 @@ class NavService:
         total = Decimal(0)
         if not positions:
             return total
+        names = [p.domain_name for p in positions]
+        values = get_latest_values(session, names)
+        missing = [n for n in names if n not in values]
+        floors = dict(
+            session.query(DomainModel.name, DomainModel.last_floor_price).filter(DomainModel.name.in_(missing))
+        ) if missing else {}
         for p in positions:
-            val = (
-                session.query(ValuationModel.value)
-                .filter(ValuationModel.domain_name == p.domain_name)
-                .order_by(ValuationModel.created_at.desc())
-                .limit(1)
-                .scalar()
-            )
+            val = values.get(p.domain_name)
             if val is None:
-                val = (
-                    session.query(DomainModel.last_floor_price)
-                    .filter(DomainModel.name == p.domain_name)
-                    .scalar()
-                ) or Decimal(0)
+                val = floors.get(p.domain_name) or Decimal(0)
             weight_pct = Decimal(p.weight_bps) / Decimal(10000)
             total += (val or Decimal(0)) * weight_pct
         return total
@@ -0,0 +1,147 @@
+"""Leader-elected Merkle snapshot scheduling.
+
+Every API process calls ``snapshot_scheduler.tick`` from its background scheduler thread, but only the
+holder of the ``merkle:snapshot`` lease (``scheduler_leases``) snapshots; the others just retry the lease.
+The leader renews once a third of ``scheduler_lease_ttl_seconds`` has passed and stops snapshotting as
+soon as a renewal fails, so a stalled leader is replaced after at most one ttl. Cadence is fleet-wide:
+a new leader waits out ``merkle_snapshot_interval_seconds`` from the newest snapshot row instead of
+snapshotting on takeover. Between snapshots the leader indexes new audit events into ``merkle_nodes``
+on every tick, so proof reads rarely have to index on demand.
+"""
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.database import MerkleSnapshot
+from app.services.db_lock import acquire_lease, release_lease
+from app.services.merkle_service import merkle_service
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_LEASE = 'merkle:snapshot'
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _aware(ts: Optional[datetime]) -> Optional[datetime]:
+    # SQLite hands DateTime(timezone=True) back naive; values are stored as UTC
+    if ts is not None and ts.tzinfo is None:
+        return ts.replace(tzinfo=timezone.utc)
+    return ts
+
+
+class SnapshotScheduler:
+    def __init__(self, holder: Optional[str] = None, clock: Callable[[], datetime] = _utcnow):
+        self.holder = holder or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.clock = clock
+        self.is_leader = False
+        self._lease_until: Optional[datetime] = None
+        self._renew_at: Optional[datetime] = None
+        self._next_snapshot_at: Optional[datetime] = None
+        # counters
+        self.acquired = 0
+        self.renewals = 0
+        self.lost = 0
+        self.snapshots = 0
+        self.indexed = 0
+        self.errors = 0
+
+    def _lead(self, db: Session, now: datetime) -> bool:
+        ttl = settings.scheduler_lease_ttl_seconds
+        if self.is_leader and now < self._renew_at:
+            return True
+        try:
+            won = acquire_lease(db, SNAPSHOT_LEASE, self.holder, ttl, now=now)
+        except Exception:
+            self.errors += 1
+            logger.exception("[scheduler] lease %s renewal failed", SNAPSHOT_LEASE)
+            db.rollback()
+            # keep leading only while the lease we already hold is certainly live
+            won = self.is_leader and now < self._lease_until - timedelta(seconds=ttl / 3)
+            if won:
+                return True
+        if won:
+            if self.is_leader:
+                self.renewals += 1
+            else:
+                self.acquired += 1
+                self._next_snapshot_at = None  # re-read the fleet-wide cadence
+                logger.info("[scheduler] %s took lease %s", self.holder, SNAPSHOT_LEASE)
+            self._lease_until = now + timedelta(seconds=ttl)
+            self._renew_at = now + timedelta(seconds=ttl / 3)
+        elif self.is_leader:
+            self.lost += 1
+            logger.warning("[scheduler] %s lost lease %s", self.holder, SNAPSHOT_LEASE)
+        self.is_leader = won
+        return won
+
+    def _due(self, db: Session, now: datetime) -> bool:
+        if self._next_snapshot_at is None:
+            last = db.query(MerkleSnapshot.created_at).order_by(MerkleSnapshot.id.desc()).limit(1).scalar()
+            last = _aware(last)
+            self._next_snapshot_at = (last + timedelta(seconds=settings.merkle_snapshot_interval_seconds)) if last else now
+        return now >= self._next_snapshot_at
+
+    def tick(self, db: Session) -> Optional[MerkleSnapshot]:
+        """Renew/acquire the lease and, when leading, take one incremental snapshot if due (else index
+        new audit events)."""
+        now = self.clock()
+        if not self._lead(db, now):
+            return None
+        if not self._due(db, now):
+            self._index(db)
+            return None
+        try:
+            snap = merkle_service.snapshot_incremental(db)
+        except Exception:
+            self.errors += 1
+            logger.exception("[scheduler] merkle snapshot failed")
+            snap = None
+        # no new events (or a conflict) also waits a full interval before the next attempt
+        self._next_snapshot_at = now + timedelta(seconds=settings.merkle_snapshot_interval_seconds)
+        if snap:
+            self.snapshots += 1
+            logger.info("[merkle] new snapshot root=%s events=%s", snap.merkle_root, snap.event_count)
+        return snap
+
+    def _index(self, db: Session):
+        try:
+            added = merkle_service.sync_nodes(db)
+            db.commit()
+        except Exception:
+            self.errors += 1
+            logger.exception("[scheduler] merkle node indexing failed")
+            db.rollback()
+            return
+        self.indexed += added
+
+    def release(self, db: Session):
+        if not self.is_leader:
+            return
+        try:
+            release_lease(db, SNAPSHOT_LEASE, self.holder)
+        except Exception:
+            logger.exception("[scheduler] releasing lease %s failed", SNAPSHOT_LEASE)
+        self.is_leader = False
+
+    def stats(self) -> dict:
+        return {
+            'is_leader': int(self.is_leader),
+            'acquired': self.acquired,
+            'renewals': self.renewals,
+            'lost': self.lost,
+            'snapshots': self.snapshots,
+            'indexed': self.indexed,
+            'errors': self.errors,
+        }
+
+
+snapshot_scheduler = SnapshotScheduler()
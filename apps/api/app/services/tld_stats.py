@@ -0,0 +1,90 @@
+"""Materialized per-TLD domain counts (``tld_stats``) for the valuation scarcity factor.
+
+``count_flush`` turns every Domain insert, delete or TLD change in a flush into a count delta and
+upserts it on the flushing connection; ``recount`` recomputes the table on a connection after bulk
+DELETE/UPDATE statements the flush never sees. Both are wired to session events in
+``app.models.database``, so the counts commit or roll back with the domain rows no matter which code
+path wrote them. Readers get the counts for just the TLDs they need instead of scanning ``domains``;
+``rebuild`` recomputes and commits.
+"""
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import func, insert, inspect, select
+from sqlalchemy.orm import Session
+
+from app.models.database import Domain, TldStat
+
+
+def _upsert(dialect: str):
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    stmt = insert(TldStat)
+    return stmt.on_conflict_do_update(index_elements=[TldStat.tld], set_={'domain_count': TldStat.domain_count + stmt.excluded.domain_count})
+
+
+def apply_deltas(conn, deltas: Dict[str, int]):
+    deltas = {t: d for t, d in deltas.items() if d}
+    if not deltas:
+        return
+    stmt = _upsert(conn.dialect.name)
+    if stmt is not None:
+        conn.execute(stmt, [{'tld': t, 'domain_count': d} for t, d in deltas.items()])
+        return
+    for tld, delta in deltas.items():  # other dialects: update, insert when missing
+        res = conn.execute(TldStat.__table__.update().where(TldStat.tld == tld).values(domain_count=TldStat.domain_count + delta))
+        if not res.rowcount:
+            conn.execute(TldStat.__table__.insert().values(tld=tld, domain_count=delta))
+
+
+def tld_counts(db: Session, tlds: Optional[Iterable[str]] = None) -> Dict[str, int]:
+    """Domain count per TLD (only ``tlds`` when given); TLDs without domains are omitted."""
+    q = db.query(TldStat.tld, TldStat.domain_count).filter(TldStat.domain_count > 0)
+    if tlds is not None:
+        wanted = {t for t in tlds if t}
+        if not wanted:
+            return {}
+        q = q.filter(TldStat.tld.in_(wanted))
+    return {tld: n for tld, n in q}
+
+
+def recount(conn):
+    """Recompute ``tld_stats`` from ``domains`` on ``conn`` (inside the caller's transaction)."""
+    conn.execute(TldStat.__table__.delete())
+    counts = select(Domain.tld, func.count(Domain.id)).where(Domain.tld.isnot(None), Domain.tld != '').group_by(Domain.tld)
+    conn.execute(insert(TldStat.__table__).from_select(['tld', 'domain_count'], counts))
+
+
+def rebuild(db: Session) -> int:
+    """Recompute ``tld_stats`` from ``domains`` (repair / backfill) and commit; returns the number of TLDs."""
+    recount(db.connection())
+    db.commit()
+    return db.query(func.count(TldStat.tld)).scalar()
+
+
+def count_flush(session: Session):
+    """Upsert the count deltas of the Domain rows ``session`` just flushed."""
+    deltas: Dict[str, int] = {}
+
+    def bump(tld, n):
+        if tld:
+            deltas[tld] = deltas.get(tld, 0) + n
+    for obj in session.new:
+        if isinstance(obj, Domain):
+            bump(obj.__dict__.get('tld'), 1)
+    for obj in session.deleted:
+        if isinstance(obj, Domain):
+            bump(obj.__dict__.get('tld'), -1)
+    for obj in session.dirty:
+        if isinstance(obj, Domain):
+            hist = inspect(obj).attrs.tld.history
+            if hist.has_changes():
+                for old in hist.deleted:
+                    bump(old, -1)
+                for new in hist.added:
+                    bump(new, 1)
+    if deltas:
+        apply_deltas(session.connection(), deltas)
@@ -0,0 +1,196 @@
+"""Per-domain rolling trade signals for valuation, updated as trades commit.
+
+Each loaded domain keeps the trades inside the VWAP lookback (running sum/count, evicted by time) and
+its latest ``RECENT_TRADES`` trades with their prices in a sorted list (streaming median). A session
+listener applies every committed ``Trade`` (market buys, chain ingest, Doma poll) to domains already
+loaded, so a valuation reads current signals without scanning the trade table. Domains are seeded
+lazily, a whole batch at a time, and reseeded after ``valuation_trade_state_ttl_seconds`` to pick up
+trades committed by other processes. Entries are keyed by trade id, so a trade seen both by a seed
+query and the listener counts once.
+"""
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sortedcontainers import SortedList
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.database import Trade
+
+RECENT_TRADES = 25  # trades behind last_sale_median
+_PENDING_KEY = 'trade_state_pending'
+_CHUNK = 1000
+
+
+def _utc(ts: Optional[datetime]) -> datetime:
+    if ts is None:
+        return datetime.now(timezone.utc)  # server default: stamped at insert
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts.astimezone(timezone.utc)
+
+
+class _DomainTrades:
+    __slots__ = ('window', 'window_ids', 'total', 'recent', 'recent_ids', 'recent_prices', 'last_id', 'loaded_at')
+
+    def __init__(self, loaded_at: float):
+        self.window = SortedList()  # (ts, trade_id, price) inside the lookback
+        self.window_ids = set()
+        self.total = Decimal(0)
+        self.recent = SortedList()  # (ts, trade_id, price), newest RECENT_TRADES
+        self.recent_ids = set()
+        self.recent_prices = SortedList()
+        self.last_id = 0  # newest trade id seen (valuation input fingerprint)
+        self.loaded_at = loaded_at
+
+    def add(self, ts: datetime, trade_id: int, price: Decimal, cutoff: datetime):
+        # dedup on the id alone: a listener-applied trade may carry a stand-in timestamp
+        key = (ts, trade_id, price)
+        self.last_id = max(self.last_id, trade_id)
+        if ts >= cutoff and trade_id not in self.window_ids:
+            self.window.add(key)
+            self.window_ids.add(trade_id)
+            self.total += price
+        if trade_id not in self.recent_ids:
+            self.recent.add(key)
+            self.recent_ids.add(trade_id)
+            self.recent_prices.add(price)
+            if len(self.recent) > RECENT_TRADES:
+                _, old_id, old_price = self.recent.pop(0)
+                self.recent_ids.discard(old_id)
+                self.recent_prices.remove(old_price)
+
+    def evict(self, cutoff: datetime):
+        while self.window and self.window[0][0] < cutoff:
+            _, old_id, old_price = self.window.pop(0)
+            self.window_ids.discard(old_id)
+            self.total -= old_price
+
+
+class TradeState:
+    def __init__(self, clock=time.monotonic):
+        self._lock = threading.Lock()
+        self._domains: Dict[str, _DomainTrades] = {}
+        self._lookback: Optional[int] = None
+        self.clock = clock
+        # counters
+        self.loads = 0
+        self.applied = 0
+        self.reads = 0
+
+    def reset(self):
+        with self._lock:
+            self._domains.clear()
+            self._lookback = None
+
+    def _cutoff(self, now: datetime) -> datetime:
+        return now - timedelta(minutes=settings.valuation_trade_lookback_minutes)
+
+    def _cold(self, names: Iterable[str]) -> List[str]:
+        ttl = settings.valuation_trade_state_ttl_seconds
+        now = self.clock()
+        with self._lock:
+            if self._lookback != settings.valuation_trade_lookback_minutes:
+                # a longer window needs trades the loaded state already dropped
+                self._domains.clear()
+                self._lookback = settings.valuation_trade_lookback_minutes
+            return [n for n in dict.fromkeys(names)
+                    if n not in self._domains or (ttl and now - self._domains[n].loaded_at >= ttl)]
+
+    def ensure_loaded(self, db: Session, names: Iterable[str]):
+        """Seed every cold/stale domain in ``names`` with two set-based queries per chunk."""
+        from app.services.valuation_service import _latest_per_domain
+        cold = self._cold(names)
+        if not cold:
+            return
+        now = datetime.now(timezone.utc)
+        cutoff = self._cutoff(now)
+        for i in range(0, len(cold), _CHUNK):
+            chunk = cold[i:i + _CHUNK]
+            fresh = {n: _DomainTrades(self.clock()) for n in chunk}
+            rows = db.query(Trade.domain_token_id, Trade.id, Trade.timestamp, Trade.price).filter(
+                Trade.domain_token_id.in_(chunk), Trade.timestamp >= cutoff).all()
+            rows += _latest_per_domain(db, Trade.domain_token_id, (Trade.id, Trade.timestamp, Trade.price), chunk,
+                                       (Trade.timestamp.desc(), Trade.id.desc()), RECENT_TRADES)
+            for dom, trade_id, ts, price in rows:
+                fresh[dom].add(_utc(ts), trade_id, Decimal(str(price)), cutoff)
+            with self._lock:
+                self._domains.update(fresh)
+                self.loads += len(chunk)
+
+    def rebuild(self, db: Session) -> int:
+        """Load every domain that traded inside the lookback (startup warm-up); returns the count."""
+        cutoff = self._cutoff(datetime.now(timezone.utc))
+        names = [n for (n,) in db.query(Trade.domain_token_id).filter(Trade.timestamp >= cutoff).distinct()]
+        self.reset()
+        self.ensure_loaded(db, names)
+        return len(names)
+
+    def apply(self, trades: Iterable[Tuple[str, int, Optional[datetime], Decimal]]):
+        """Apply committed trades (domain, id, timestamp, price) to domains already loaded."""
+        cutoff = self._cutoff(datetime.now(timezone.utc))
+        with self._lock:
+            for dom, trade_id, ts, price in trades:
+                state = self._domains.get(dom)
+                if state is not None:
+                    state.add(_utc(ts), trade_id, Decimal(str(price)), cutoff)
+                    self.applied += 1
+
+    def invalidate(self, names: Iterable[str]):
+        with self._lock:
+            for n in names:
+                self._domains.pop(n, None)
+
+    def signals(self, name: str) -> Tuple[List[Decimal], Optional[Decimal]]:
+        """(window sum and count as ``[total, count]``, last_sale_median) for a loaded domain."""
+        cutoff = self._cutoff(datetime.now(timezone.utc))
+        with self._lock:
+            self.reads += 1
+            state = self._domains.get(name)
+            if state is None:
+                return [Decimal(0), 0], None
+            state.evict(cutoff)
+            prices = state.recent_prices
+            median = prices[len(prices) // 2] if prices else None
+            return [state.total, len(state.window)], median
+
+    def last_trade_id(self, name: str) -> int:
+        with self._lock:
+            state = self._domains.get(name)
+            return state.last_id if state is not None else 0
+
+    def stats(self) -> dict:
+        return {'domains': len(self._domains), 'loads': self.loads, 'applied': self.applied, 'reads': self.reads}
+
+
+trade_state = TradeState()
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_trades(session: Session, flush_context):
+    pending = None
+    for obj in session.new:
+        if isinstance(obj, Trade) and obj.id is not None:
+            if pending is None:
+                pending = session.info.setdefault(_PENDING_KEY, [])
+            # read loaded values only: server-side defaults are not fetched here
+            d = obj.__dict__
+            pending.append((d.get('domain_token_id'), obj.id, d.get('timestamp'), d.get('price')))
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_trades(session: Session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        trade_state.apply(pending)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_trades(session: Session, previous_transaction):
+    # a rollback (possibly of a savepoint only) leaves it unclear which flushed trades survive;
+    # drop those domains so the next read reseeds them from the table
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        trade_state.invalidate({p[0] for p in pending})
@@ -0,0 +1,108 @@
+"""Vectorized valuation blend over column arrays (one entry per domain).
+
+Mirrors the per-domain Decimal blend in ``ValuationService.value_domains``: decay/freshness terms, the
+weighted blend of present signals, the top-bid soft floor, the staleness fallback and the dispute clamp.
+Inputs are float columns with NaN for a missing signal; values become ``Decimal`` only at the output
+boundary (``to_decimal``). NumPy is a requirement; the Python loop below is only a guard for an
+environment where it failed to install.
+"""
+import math
+from decimal import Decimal
+from typing import Any, Dict, Sequence
+
+try:  # listed in requirements.txt; the loop fallback only guards a broken install
+    import numpy as np
+except ImportError:  # pragma: no cover - fallback path
+    np = None
+
+NAN = float('nan')
+# primary source tiers, in fallback order (index stored in the ``primary`` output column)
+SOURCES = ('trade_vwap', 'orderbook_mid', 'floor', 'time_decay_anchor')
+INPUT_COLUMNS = ('trade_vwap', 'trade_count', 'floor', 'orderbook_mid', 'top_bid', 'last_sale_median', 'prev_value', 'age_seconds', 'disputed')
+LAST_SALE_WEIGHT = 0.35  # fraction of the trade weight given to last_sale_median
+TOP_BID_FLOOR = 0.70  # values below this share of the top bid are pulled halfway up to it
+STALE_SECONDS = 3600
+BASELINE = 100.0
+
+
+def blend(cols: Dict[str, Sequence[Any]], *, w_trade: float, w_floor: float, w_orderbook: float, w_decay: float,
+          decay_lambda: float, freshness_lambda: float, min_trades: int) -> Dict[str, Any]:
+    """Final value, decayed anchor, decay, freshness and primary source for every row of ``cols``.
+
+    Returns columns ``value`` (rounded to cents), ``decayed_prev``, ``decay``, ``freshness``, ``primary``
+    (index into ``SOURCES``) and ``primary_price``: numpy arrays, or lists on the fallback path.
+    """
+    args = (w_trade, w_floor, w_orderbook, w_decay, decay_lambda, freshness_lambda, min_trades)
+    if np is not None:
+        return _blend_numpy(cols, *args)
+    return _blend_python(cols, *args)
+
+
+def _blend_numpy(cols, w_trade, w_floor, w_orderbook, w_decay, decay_lambda, freshness_lambda, min_trades):
+    c = {k: np.asarray(cols[k], dtype=np.float64) for k in INPUT_COLUMNS}
+    age = c['age_seconds']
+    decay = np.exp(-decay_lambda * age)
+    freshness = np.exp(-freshness_lambda * age)
+    decayed_prev = c['prev_value'] * decay + BASELINE * (1 - decay)
+    num = decayed_prev * w_decay
+    den = np.full(age.shape, w_decay)
+    for key, w in (('trade_vwap', w_trade), ('floor', w_floor), ('orderbook_mid', w_orderbook), ('last_sale_median', w_trade * LAST_SALE_WEIGHT)):
+        present = ~np.isnan(c[key])
+        num = num + np.where(present, np.nan_to_num(c[key]) * w, 0.0)
+        den = den + np.where(present, w, 0.0)
+    value = np.round(num / np.where(den == 0, 1.0, den), 2)
+    top_bid = np.nan_to_num(c['top_bid'])
+    lift = (top_bid > 0) & (value < top_bid * TOP_BID_FLOOR)
+    value = np.where(lift, np.round(value * 0.5 + top_bid * TOP_BID_FLOOR * 0.5, 2), value)
+    has_vwap = ~np.isnan(c['trade_vwap'])
+    has_mid = ~np.isnan(c['orderbook_mid'])
+    has_floor = ~np.isnan(c['floor'])
+    stale = (age > STALE_SECONDS) & ~has_vwap & ~has_mid & ~has_floor
+    value = np.where(stale, np.round(decayed_prev, 2), value)
+    value = np.where(c['disputed'] > 0, np.round(c['prev_value'], 2), value)
+    vwap_primary = has_vwap & (c['trade_count'] >= min_trades)
+    primary = np.select([vwap_primary, has_mid, has_floor], [0, 1, 2], default=3)
+    primary_price = np.select([vwap_primary, has_mid, has_floor], [c['trade_vwap'], c['orderbook_mid'], c['floor']], default=decayed_prev)
+    return {'value': value, 'decayed_prev': decayed_prev, 'decay': decay, 'freshness': freshness, 'primary': primary, 'primary_price': primary_price}
+
+
+def _blend_python(cols, w_trade, w_floor, w_orderbook, w_decay, decay_lambda, freshness_lambda, min_trades):
+    out = {k: [] for k in ('value', 'decayed_prev', 'decay', 'freshness', 'primary', 'primary_price')}
+    signals = (('trade_vwap', w_trade), ('floor', w_floor), ('orderbook_mid', w_orderbook), ('last_sale_median', w_trade * LAST_SALE_WEIGHT))
+    for i in range(len(cols['age_seconds'])):
+        age = float(cols['age_seconds'][i])
+        prev = float(cols['prev_value'][i])
+        decay = math.exp(-decay_lambda * age)
+        decayed_prev = prev * decay + BASELINE * (1 - decay)
+        num, den = decayed_prev * w_decay, w_decay
+        for key, w in signals:
+            v = float(cols[key][i])
+            if not math.isnan(v):
+                num += v * w
+                den += w
+        value = round(num / (den or 1.0), 2)
+        top_bid = float(cols['top_bid'][i])
+        if top_bid > 0 and value < top_bid * TOP_BID_FLOOR:
+            value = round(value * 0.5 + top_bid * TOP_BID_FLOOR * 0.5, 2)
+        vwap, mid, floor = (float(cols[k][i]) for k in ('trade_vwap', 'orderbook_mid', 'floor'))
+        if age > STALE_SECONDS and math.isnan(vwap) and math.isnan(mid) and math.isnan(floor):
+            value = round(decayed_prev, 2)
+        if cols['disputed'][i]:
+            value = round(prev, 2)
+        if not math.isnan(vwap) and cols['trade_count'][i] >= min_trades:
+            primary, primary_price = 0, vwap
+        elif not math.isnan(mid):
+            primary, primary_price = 1, mid
+        elif not math.isnan(floor):
+            primary, primary_price = 2, floor
+        else:
+            primary, primary_price = 3, decayed_prev
+        for k, v in (('value', value), ('decayed_prev', decayed_prev), ('decay', decay), ('freshness', math.exp(-freshness_lambda * age)),
+                     ('primary', primary), ('primary_price', primary_price)):
+            out[k].append(v)
+    return out
+
+
+def to_decimal(x: Any, places: int = 2) -> Decimal:
+    """Quantized Decimal for one kernel output value."""
+    return Decimal(format(float(x), f'.{places}f'))
@@ -1,12 +1,73 @@
 from __future__ import annotations
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, Iterable, Tuple, Optional
 from decimal import Decimal
 from sqlalchemy.orm import Session
 from datetime import datetime, timezone
 from app.config import settings
-from app.models.database import Valuation, Domain, Trade, OrderbookSnapshot, DomainValuationDispute
+from app.models.database import Valuation, Domain, OrderbookSnapshot, DomainValuationDispute
 from app.services.external_oracle_service import external_oracle_service
+from app.services.trade_state import trade_state
+from app.services import latest_valuations, tld_stats
+from sqlalchemy import func, select
+from collections import OrderedDict
+import copy
 import math
+import threading
+import time
+
+_PREFETCH_CHUNK = 1000  # names per IN (...) list when prefetching inputs
+_ORDERBOOK_DEPTH = 120  # latest snapshots per domain for mid / top bid
+
+
+def _latest_per_domain(db: Session, domain_col, columns, names: List[str], order_by, limit: int):
+    """(domain, *columns) rows of the latest ``limit`` rows per domain in ``names`` (one windowed query)."""
+    rn = func.row_number().over(partition_by=domain_col, order_by=order_by).label('rn')
+    sub = select(domain_col, *columns, rn).where(domain_col.in_(names)).subquery()
+    return db.execute(select(*[sub.c[c.key] for c in (domain_col, *columns)]).where(sub.c.rn <= limit)).all()
+
+class ValuationCache:
+    """Latest valuation result per domain, reused while its input fingerprint is unchanged.
+
+    The fingerprint covers every input of the blend except the previous valuation (the cached result
+    is that valuation) and the clock: within ``valuation_cache_ttl_seconds`` decay drift is ignored.
+    """
+
+    def __init__(self, max_entries: int = 50000):
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[tuple, float, Dict[str, Any]]]" = OrderedDict()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name: str, fingerprint: tuple) -> Optional[Dict[str, Any]]:
+        ttl = settings.valuation_cache_ttl_seconds
+        with self._lock:
+            entry = self._entries.get(name) if ttl > 0 else None
+            if entry is not None and entry[0] == fingerprint and time.monotonic() - entry[1] < ttl:
+                self._entries.move_to_end(name)
+                self.hits += 1
+                return copy.deepcopy(entry[2])  # callers may mutate their result (factors included)
+            self.misses += 1
+            return None
+
+    def put(self, name: str, fingerprint: tuple, result: Dict[str, Any]):
+        if settings.valuation_cache_ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._entries[name] = (fingerprint, time.monotonic(), copy.deepcopy(result))
+            self._entries.move_to_end(name)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def evict(self, names: Iterable[str]):
+        with self._lock:
+            for name in names:
+                self._entries.pop(name, None)
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+
 
 class ValuationService:
     """Valuation Engine v1.1 (expanded w/ fallback tiers & dispute awareness)
@@ -33,6 +94,15 @@ class ValuationService:
         self.model_version = settings.valuation_model_version
         self.total_valuations = 0  # number of individual domain valuation records created
         self.total_batches = 0
+        self.cache = ValuationCache()
+
+    def _fingerprint(self, name: str, signals: Dict[str, Any], floor: Optional[Decimal], tld_count: Optional[int]) -> tuple:
+        return (
+            self.model_version, trade_state.last_trade_id(name), signals['book_last_id'], signals['dispute_votes'],
+            str(floor) if floor is not None else None, tld_count, settings.valuation_use_ensemble,
+            settings.valuation_weight_trade, settings.valuation_weight_floor, settings.valuation_weight_orderbook,
+            settings.valuation_weight_time_decay, settings.valuation_dispute_vote_threshold,
+        )
     def _name_quality(self, name: str) -> Decimal:
         core = name.split('.')[0]
         length = len(core)
@@ -54,29 +124,22 @@ class ValuationService:
         val = 1 / math.log(count + 10)
         return Decimal(min(max(val, 0.1), 2))
 
-    def _trade_vwap(self, db: Session, domain: str) -> Tuple[Decimal | None, int]:
-        from datetime import timedelta
-        cutoff = datetime.now(timezone.utc) - timedelta(minutes=settings.valuation_trade_lookback_minutes)
-        q = db.query(Trade).filter(Trade.domain_token_id==domain, Trade.timestamp >= cutoff)
-        trades = q.all()
-        if not trades or len(trades) < settings.valuation_min_samples_trade:
+    def _trade_vwap(self, total: Decimal, count: int) -> Tuple[Decimal | None, int]:
+        """Mean trade price over the lookback window from its running sum and count."""
+        if not count or count < settings.valuation_min_samples_trade:
             return None, 0
-        total = Decimal(0); vol = Decimal(0)
-        for t in trades:
-            total += Decimal(str(t.price))
-            vol += Decimal(1)
-        return (total / vol if vol else None, len(trades))
+        return (total / Decimal(count), count)
 
-    def _orderbook_mid(self, db: Session, domain: str) -> tuple[Decimal | None, Decimal | None, Decimal | None]:
-        """Return (mid, top_bid, last_sale_median) for richer pricing context.
+    def _orderbook_mid(self, book: List[Tuple[str, Any]]) -> tuple[Decimal | None, Decimal | None]:
+        """Return (mid, top_bid) for richer pricing context.
 
         mid: median(bid_prices) + median(ask_prices) / 2 if both sides exist.
         top_bid: highest observed bid in recent snapshots.
-        last_sale_median: median of recent trade prices (captures executed clearing level resilience).
+        ``book`` holds (side, price) of the latest snapshots. last_sale_median (median of recent trade
+        prices) comes from ``trade_state`` alongside the VWAP window.
         """
-        snaps = db.query(OrderbookSnapshot).filter(OrderbookSnapshot.domain_name==domain).order_by(OrderbookSnapshot.collected_at.desc()).limit(120).all()
-        bids = [Decimal(str(s.price)) for s in snaps if s.side == 'BUY']
-        asks = [Decimal(str(s.price)) for s in snaps if s.side == 'SELL']
+        bids = [Decimal(str(p)) for side, p in book if side == 'BUY']
+        asks = [Decimal(str(p)) for side, p in book if side == 'SELL']
         top_bid: Decimal | None = max(bids) if bids else None
         if not bids or not asks:
             mid = None
@@ -84,14 +147,37 @@ class ValuationService:
             bid_med = sorted(bids)[len(bids)//2]
             ask_med = sorted(asks)[len(asks)//2]
             mid = (bid_med + ask_med) / 2
-        # derive last sale median from recent trades (not strictly tied to VWAP window)
-        recent_trades = db.query(Trade).filter(Trade.domain_token_id==domain).order_by(Trade.timestamp.desc()).limit(25).all()
-        trade_prices = [Decimal(str(t.price)) for t in recent_trades]
-        last_sale_median: Decimal | None = None
-        if trade_prices:
-            tp_sorted = sorted(trade_prices)
-            last_sale_median = tp_sorted[len(tp_sorted)//2]
-        return mid, top_bid, last_sale_median
+        return mid, top_bid
+
+    def _prefetch_inputs(self, db: Session, names: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Load every per-domain input for ``names`` with three set-based queries per chunk of names.
+
+        The latest orderbook snapshots use ROW_NUMBER() OVER (PARTITION BY domain ...) instead of one
+        LIMIT query per domain; the previous valuation is a primary-key read of ``domain_latest_valuations``.
+        Trade signals are read from ``trade_state``, which seeds domains it has not loaded yet (two more
+        queries per chunk).
+        """
+        inputs: Dict[str, Dict[str, Any]] = {
+            n: {'book': [], 'book_last_id': 0, 'prev': None, 'dispute_votes': None} for n in names
+        }
+        unique = list(inputs)
+        trade_state.ensure_loaded(db, unique)
+        for i in range(0, len(unique), _PREFETCH_CHUNK):
+            chunk = unique[i:i + _PREFETCH_CHUNK]
+            for dom, snap_id, side, price in _latest_per_domain(
+                    db, OrderbookSnapshot.domain_name, (OrderbookSnapshot.id, OrderbookSnapshot.side, OrderbookSnapshot.price), chunk,
+                    (OrderbookSnapshot.collected_at.desc(), OrderbookSnapshot.id.desc()), _ORDERBOOK_DEPTH):
+                inputs[dom]['book'].append((side, price))
+                inputs[dom]['book_last_id'] = max(inputs[dom]['book_last_id'], snap_id)
+            for dom, row in latest_valuations.get_latest(db, chunk).items():
+                inputs[dom]['prev'] = (row.value, row.created_at)
+            disputes = (db.query(DomainValuationDispute.domain_name, DomainValuationDispute.votes)
+                        .filter(DomainValuationDispute.domain_name.in_(chunk), DomainValuationDispute.status=='OPEN')
+                        .order_by(DomainValuationDispute.id.asc()))
+            for dom, votes in disputes:
+                if inputs[dom]['dispute_votes'] is None:
+                    inputs[dom]['dispute_votes'] = votes or 0
+        return inputs
 
     def _select_primary_source(self, trade_vwap: Optional[Decimal], trade_count: int, orderbook_mid: Optional[Decimal], floor: Optional[Decimal], decayed_prev: Decimal) -> Tuple[str, list[str], Decimal]:
         chain: list[str] = []
@@ -219,39 +305,54 @@ class ValuationService:
         results: List[Dict[str, Any]] = []
         # Preload existing; we will auto-create placeholder rows for missing domains
         normalized_inputs = [d.lower() for d in domains_input]
-        existing_domain_rows = db.query(Domain).filter(Domain.name.in_(normalized_inputs)).all()
-        existing_names = {row.name for row in existing_domain_rows}
+        domain_rows: Dict[str, Domain] = {}
+        for i in range(0, len(normalized_inputs), _PREFETCH_CHUNK):
+            for row in db.query(Domain).filter(Domain.name.in_(normalized_inputs[i:i + _PREFETCH_CHUNK])):
+                domain_rows[row.name] = row
+        placeholders = set()
+        for name_l in normalized_inputs:
+            if name_l not in domain_rows:
+                tld_part = name_l.split('.')[-1] if '.' in name_l else None
+                domain_rows[name_l] = Domain(name=name_l, tld=tld_part)
+                db.add(domain_rows[name_l])
+                placeholders.add(name_l)
+        if placeholders:
+            db.flush()
+        inputs = self._prefetch_inputs(db, normalized_inputs)
 
         def _to_utc(dt: datetime) -> datetime:
             return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
 
-        for name in domains_input:
-            name_l = name.lower()
-            placeholder_created = False
-            if name_l not in existing_names:
-                tld_part = name_l.split('.')[-1] if '.' in name_l else None
-                new_dom = Domain(name=name_l, tld=tld_part)
-                db.add(new_dom); db.flush()
-                existing_names.add(name_l)
-                placeholder_created = True
+        for name_l in normalized_inputs:
+            placeholder_created = name_l in placeholders
+            placeholders.discard(name_l)  # a repeated name reports the placeholder once
+            signals = inputs[name_l]
             tld = name_l.split('.')[-1] if '.' in name_l else None
             floor = floors.get(name_l)
+            fingerprint = self._fingerprint(name_l, signals, floor, tld_counts.get(tld) if tld else None)
+            cached = self.cache.get(name_l, fingerprint)
+            if cached is not None:
+                # inputs unchanged since the last valuation: reuse it, no new row
+                domain_rows[name_l].last_estimated_value = Decimal(cached['value'])
+                results.append(dict(cached, placeholder_created=placeholder_created, cached=True))
+                continue
             scarcity = self._scarcity_factor(tld, tld_counts)
             quality = self._name_quality(name_l)
-            trade_vwap, trade_count = self._trade_vwap(db, name_l)
-            orderbook_mid, top_bid, last_sale_median = self._orderbook_mid(db, name_l)
-            prev = db.query(Valuation).filter(Valuation.domain_name==name_l).order_by(Valuation.created_at.desc()).first()
+            (window_total, window_count), last_sale_median = trade_state.signals(name_l)
+            trade_vwap, trade_count = self._trade_vwap(window_total, window_count)
+            orderbook_mid, top_bid = self._orderbook_mid(signals['book'])
+            prev = signals['prev']
             baseline = Decimal(100)
-            prev_val = Decimal(str(prev.value)) if prev else baseline
-            if prev and prev.created_at:
-                prev_created_utc = _to_utc(prev.created_at)
+            prev_val = Decimal(str(prev[0])) if prev else baseline
+            if prev and prev[1]:
+                prev_created_utc = _to_utc(prev[1])
                 age_seconds = (datetime.now(timezone.utc) - prev_created_utc).total_seconds()
             else:
                 age_seconds = 0
             decay_factor = Decimal(math.exp(-settings.valuation_decay_lambda * age_seconds)) if age_seconds else Decimal(1)
             decayed_prev = prev_val * decay_factor + baseline * (1 - decay_factor)
-            dispute = db.query(DomainValuationDispute).filter(DomainValuationDispute.domain_name==name_l, DomainValuationDispute.status=='OPEN').first()
-            dispute_votes = dispute.votes if dispute else 0
+            dispute = signals['dispute_votes'] is not None
+            dispute_votes = signals['dispute_votes'] or 0
             dispute_active = bool(dispute and dispute_votes >= settings.valuation_dispute_vote_threshold)
             wt_trade = Decimal(str(settings.valuation_weight_trade))
             wt_floor = Decimal(str(settings.valuation_weight_floor))
@@ -320,20 +421,125 @@ class ValuationService:
                 }
             )
             db.add(valuation)
-            domain = db.query(Domain).filter(Domain.name==name_l).first()
-            if domain:
-                domain.last_estimated_value = final_value
-            results.append({
+            signals['prev'] = (final_value, None)  # a repeated name blends against this valuation
+            domain_rows[name_l].last_estimated_value = final_value
+            result = {
                 'domain': name_l,
                 'value': str(final_value),
                 'model_version': self.model_version,
                 'factors': valuation.factors,
                 'chosen_source': chosen_source_override or valuation.factors.get('primary_source'),
                 'placeholder_created': placeholder_created
-            })
+            }
+            self.cache.put(name_l, fingerprint, result)
+            results.append(result)
             self.total_valuations += 1
         self.total_batches += 1
         db.commit()
         return results
 
+    def revalue_all(self, db: Session, names: Optional[List[str]] = None, chunk_size: int = 5000) -> Dict[str, Any]:
+        """Revalue every domain (or ``names``) through the vectorized kernel, committing per chunk.
+
+        Inputs come from the set-based prefetch, the blend runs once per chunk over column arrays
+        (``valuation_kernel``), and Valuation rows / ``last_estimated_value`` are written in bulk.
+        The ensemble layer, when enabled, is still applied per row.
+        """
+        import time as _time
+        from sqlalchemy import insert, update
+        from app.services import valuation_kernel as vk
+        tld_counts = tld_stats.tld_counts(db)
+        weights = {
+            'w_trade': settings.valuation_weight_trade, 'w_floor': settings.valuation_weight_floor,
+            'w_orderbook': settings.valuation_weight_orderbook, 'w_decay': settings.valuation_weight_time_decay,
+        }
+        weight_strs = {'trade': str(Decimal(str(weights['w_trade']))), 'floor': str(Decimal(str(weights['w_floor']))),
+                       'orderbook': str(Decimal(str(weights['w_orderbook']))), 'time_decay': str(Decimal(str(weights['w_decay'])))}
+        total = 0
+        chunks = 0
+        kernel_seconds = 0.0
+        last_id = 0
+        while True:
+            q = db.query(Domain.id, Domain.name, Domain.tld, Domain.last_floor_price).order_by(Domain.id.asc())
+            if names is not None:
+                q = q.filter(Domain.name.in_([n.lower() for n in names]))
+            rows = q.filter(Domain.id > last_id).limit(chunk_size).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            inputs = self._prefetch_inputs(db, [r.name for r in rows])
+            now = datetime.now(timezone.utc)
+            cols: Dict[str, list] = {k: [] for k in vk.INPUT_COLUMNS}
+            extras = []
+            for r in rows:
+                sig = inputs[r.name]
+                (window_total, window_count), last_sale = trade_state.signals(r.name)
+                trade_vwap, trade_count = self._trade_vwap(window_total, window_count)
+                mid, top_bid = self._orderbook_mid(sig['book'])
+                prev = sig['prev']
+                age = 0.0
+                if prev and prev[1]:
+                    created = prev[1] if prev[1].tzinfo else prev[1].replace(tzinfo=timezone.utc)
+                    age = (now - created).total_seconds()
+                votes = sig['dispute_votes']
+                for key, v in (('trade_vwap', trade_vwap), ('floor', r.last_floor_price), ('orderbook_mid', mid), ('top_bid', top_bid), ('last_sale_median', last_sale)):
+                    cols[key].append(vk.NAN if v is None else float(v))
+                cols['trade_count'].append(trade_count)
+                cols['prev_value'].append(float(prev[0]) if prev else vk.BASELINE)
+                cols['age_seconds'].append(age)
+                cols['disputed'].append(1 if votes is not None and votes >= settings.valuation_dispute_vote_threshold else 0)
+                extras.append((trade_vwap, trade_count, mid, top_bid, last_sale, votes))
+            started = _time.perf_counter()
+            out = vk.blend(cols, decay_lambda=settings.valuation_decay_lambda, freshness_lambda=settings.valuation_freshness_lambda,
+                           min_trades=settings.valuation_min_samples_trade, **weights)
+            kernel_seconds += _time.perf_counter() - started
+            valuations = []
+            domain_updates = []
+            for i, r in enumerate(rows):
+                trade_vwap, trade_count, mid, top_bid, last_sale, votes = extras[i]
+                final_value = vk.to_decimal(out['value'][i])
+                primary_price = vk.to_decimal(out['primary_price'][i])
+                factors = {
+                    'trade_vwap': str(trade_vwap) if trade_vwap is not None else None,
+                    'trade_count': trade_count,
+                    'floor_price': str(r.last_floor_price) if r.last_floor_price is not None else None,
+                    'orderbook_mid': str(mid) if mid is not None else None,
+                    'top_bid': str(top_bid) if top_bid is not None else None,
+                    'last_sale_median': str(last_sale) if last_sale is not None else None,
+                    'time_decay_anchor': str(vk.to_decimal(out['decayed_prev'][i])),
+                    'weights': weight_strs,
+                    'scarcity': str(self._scarcity_factor(r.tld, tld_counts)),
+                    'quality': str(self._name_quality(r.name)),
+                    'decay_factor': str(vk.to_decimal(out['decay'][i], 4)),
+                    'freshness_score': str(vk.to_decimal(out['freshness'][i], 4)),
+                    'primary_source': vk.SOURCES[int(out['primary'][i])],
+                    'fallback_chain': list(vk.SOURCES[:int(out['primary'][i])]),
+                    'primary_price': str(primary_price),
+                    'ensemble': {'enabled': False},
+                    'ensemble_chosen_source': None,
+                    'disputed': bool(cols['disputed'][i]),
+                    'dispute_votes': votes or 0,
+                }
+                if settings.valuation_use_ensemble:
+                    ensemble_value, chosen, meta = self._ensemble_blend(final_value, {'trade_vwap': factors['trade_vwap'], 'primary_price': str(primary_price)})
+                    if meta.get('enabled'):
+                        final_value = ensemble_value
+                        factors['ensemble'] = meta
+                        factors['ensemble_chosen_source'] = chosen
+                valuations.append({'domain_name': r.name, 'model_version': self.model_version, 'value': final_value, 'factors': factors})
+                domain_updates.append({'id': r.id, 'last_estimated_value': final_value})
+            inserted = db.execute(insert(Valuation).returning(Valuation.id, Valuation.domain_name, Valuation.value, Valuation.factors,
+                                                              Valuation.created_at), valuations)
+            latest_valuations.record(db.connection(), [
+                {'domain_name': n, 'valuation_id': i, 'model_version': self.model_version, 'value': v, 'factors': f, 'created_at': c}
+                for i, n, v, f, c in inserted])
+            db.execute(update(Domain), domain_updates)
+            db.commit()
+            self.cache.evict(r.name for r in rows)  # cached results predate these valuations
+            total += len(rows)
+            chunks += 1
+        self.total_valuations += total
+        self.total_batches += 1
+        return {'domains': total, 'chunks': chunks, 'kernel_seconds': round(kernel_seconds, 6), 'vectorized': vk.np is not None}
+
 valuation_service = ValuationService()
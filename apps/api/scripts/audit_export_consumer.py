@@ -3,29 +3,69 @@
 
 Usage:
   python scripts/audit_export_consumer.py --base http://localhost:8000 --token <JWT> [--after 100] [--verify]
+  python scripts/audit_export_consumer.py --token <JWT> --out exports/ --workers 8 --compression zstd [--format parquet]
 
 Features:
-  * Resumes from --after cursor (exclusive)
-  * Streams JSONL from /settlement/audit-export/stream
-  * Optional integrity_ok assertion
+  * Resumes from --after cursor (exclusive), optionally stops at --to (inclusive)
+  * Streams JSONL (or Arrow IPC / Parquet with --format) from /settlement/audit-export/stream
+  * --compression gzip|zstd: compressed on the wire, decoded here incrementally (zstd needs zstandard)
+  * --workers N with --out DIR: splits the id range (from /settlement/audit-export/bounds) into N
+    contiguous ranges fetched in parallel; each range is saved as received (still compressed)
+  * Optional integrity_ok assertion (JSONL); each range is verified server-side from its own cursor
 """
-import argparse, sys, json, time, os
+import argparse, sys, json, time, os, zlib
+from concurrent.futures import ThreadPoolExecutor
 import requests
 
-def consume(base: str, token: str, after: int | None, verify_integrity: bool):
-    session = requests.Session()
-    params = {}
+EXTENSIONS = {'jsonl': 'jsonl', 'arrow': 'arrows', 'parquet': 'parquet'}
+
+
+def _decoder(encoding: str | None):
+    """Incremental decompressor for a Content-Encoding (returns a bytes -> bytes callable)."""
+    if encoding == 'gzip':
+        d = zlib.decompressobj(31)
+        return d.decompress
+    if encoding == 'zstd':
+        import zstandard
+        return zstandard.ZstdDecompressor().decompressobj().decompress
+    return lambda chunk: chunk
+
+
+def _request(session, base, token, after, to, verify_integrity, fmt, compression):
+    params = {'format': fmt}
     if after is not None:
         params['after_id'] = after
+    if to is not None:
+        params['to_id'] = to
     if verify_integrity:
         params['verify_integrity'] = 'true'
+    if compression:
+        params['compression'] = compression
     url = base.rstrip('/') + '/api/v1/settlement/audit-export/stream'
-    headers = { 'Authorization': f'Bearer {token}' }
-    with session.get(url, params=params, headers=headers, stream=True, timeout=60) as r:
-        r.raise_for_status()
+    headers = {'Authorization': f'Bearer {token}', 'Accept-Encoding': compression or 'identity'}
+    r = session.get(url, params=params, headers=headers, stream=True, timeout=60)
+    r.raise_for_status()
+    return r
+
+
+def _iter_lines(r):
+    # decode ourselves (requests only understands some encodings) and split on newlines
+    decode = _decoder(r.headers.get('Content-Encoding'))
+    buf = b''
+    for chunk in r.raw.stream(1 << 16, decode_content=False):
+        buf += decode(chunk)
+        *lines, buf = buf.split(b'\n')
+        yield from lines
+    if buf:
+        yield buf
+
+
+def consume(base: str, token: str, after: int | None, verify_integrity: bool, to: int | None = None, compression: str | None = None):
+    session = requests.Session()
+    with _request(session, base, token, after, to, verify_integrity, 'jsonl', compression) as r:
         last_id = after
         line_count = 0
-        for line in r.iter_lines(decode_unicode=True):
+        for line in _iter_lines(r):
             if not line:
                 continue
             try:
@@ -43,14 +83,70 @@ def consume(base: str, token: str, after: int | None, verify_integrity: bool):
         return last_id, line_count
 
 
+def fetch_range(base: str, token: str, after: int, to: int, out_dir: str, fmt: str, compression: str | None, verify_integrity: bool) -> dict:
+    """Save (after, to] to a file as received; for JSONL + --verify also decode and check each line."""
+    suffix = {'gzip': '.gz', 'zstd': '.zst'}.get(compression, '')
+    path = os.path.join(out_dir, f"audit_{after + 1}_{to}.{EXTENSIONS[fmt]}{suffix}")
+    check = verify_integrity and fmt == 'jsonl'
+    decode = _decoder(compression) if check else None
+    rows, bad, size, buf = 0, [], 0, b''
+    with requests.Session() as session, _request(session, base, token, after, to, verify_integrity, fmt, compression) as r, open(path, 'wb') as fh:
+        for chunk in r.raw.stream(1 << 16, decode_content=False):
+            fh.write(chunk)
+            size += len(chunk)
+            if check:
+                buf += decode(chunk)
+                *lines, buf = buf.split(b'\n')
+                for line in lines:
+                    if line:
+                        rows += 1
+                        obj = json.loads(line)
+                        if obj.get('integrity_ok') is False:
+                            bad.append(obj['id'])
+    return {'path': path, 'bytes': size, 'rows': rows, 'bad': bad}
+
+
+def export_parallel(base: str, token: str, after: int | None, to: int | None, workers: int, out_dir: str, fmt: str, compression: str | None, verify_integrity: bool) -> int:
+    r = requests.get(base.rstrip('/') + '/api/v1/settlement/audit-export/bounds', headers={'Authorization': f'Bearer {token}'}, timeout=30)
+    r.raise_for_status()
+    bounds = r.json()
+    if bounds['max_id'] is None:
+        print('No audit events to export')
+        return 0
+    lo = after if after is not None else bounds['min_id'] - 1
+    hi = to if to is not None else bounds['max_id']
+    step = max(1, -(-(hi - lo) // workers))
+    ranges = [(a, min(a + step, hi)) for a in range(lo, hi, step)]
+    os.makedirs(out_dir, exist_ok=True)
+    started = time.time()
+    failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for res in pool.map(lambda rg: fetch_range(base, token, rg[0], rg[1], out_dir, fmt, compression, verify_integrity), ranges):
+            print(f"{res['path']}: {res['bytes']} bytes" + (f", {res['rows']} rows" if res['rows'] else ''))
+            if res['bad']:
+                failed += 1
+                print('Integrity MISMATCH at ids', res['bad'][:10], file=sys.stderr)
+    print(f"\nExported ids ({lo}, {hi}] in {len(ranges)} ranges, {time.time() - started:.1f}s")
+    return 1 if failed else 0
+
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument('--base', default='http://localhost:8000')
     ap.add_argument('--token', required=True)
     ap.add_argument('--after', type=int, default=None)
+    ap.add_argument('--to', type=int, default=None)
     ap.add_argument('--verify', action='store_true')
+    ap.add_argument('--format', choices=sorted(EXTENSIONS), default='jsonl')
+    ap.add_argument('--compression', choices=['gzip', 'zstd'], default=None)
+    ap.add_argument('--workers', type=int, default=1)
+    ap.add_argument('--out', default=None, help='directory for range files (required for --workers > 1 or non-JSONL formats)')
     args = ap.parse_args()
-    last, count = consume(args.base, args.token, args.after, args.verify)
+    if args.out:
+        sys.exit(export_parallel(args.base, args.token, args.after, args.to, max(1, args.workers), args.out, args.format, args.compression, args.verify))
+    if args.workers > 1 or args.format != 'jsonl':
+        ap.error('--out is required with --workers > 1 or --format arrow/parquet')
+    last, count = consume(args.base, args.token, args.after, args.verify, args.to, args.compression)
     print(f"\nCompleted batch: {count} lines (last_id={last})")
 
 if __name__ == '__main__':
@@ -45,6 +45,27 @@ def override_get_db(db_session):
     app.dependency_overrides.pop(get_db, None)
 
 
+@pytest.fixture(autouse=True)
+def _reset_leaderboards():
+    # Leaderboards are loaded once per competition and outlive the per-test transaction rollback
+    from app.services.leaderboard_service import leaderboard_service
+    leaderboard_service.reset()
+    yield
+    leaderboard_service.reset()
+
+
+@pytest.fixture(autouse=True)
+def _reset_trade_state():
+    # Rolling trade signals and cached valuations outlive the per-test transaction rollback
+    from app.services.trade_state import trade_state
+    from app.services.valuation_service import valuation_service
+    trade_state.reset()
+    valuation_service.cache.reset()
+    yield
+    trade_state.reset()
+    valuation_service.cache.reset()
+
+
 @pytest.fixture()
 def auth_address():
     return "0xabc1234567890000000000000000000000000001"
@@ -0,0 +1,151 @@
+import asyncio
+from datetime import datetime, timezone
+
+from app.config import settings
+from app.models.database import MerkleSnapshot
+from app.services.anchor_service import AnchorWorker
+from app.services.snapshot_scheduler import SnapshotScheduler
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class _FakeChain:
+    def __init__(self):
+        self.sent = []  # (root, nonce)
+        self.fail = 0
+        self.confirmations = {}
+
+    def ensure_initialized(self):
+        return True
+
+    async def get_pending_nonce(self, address):
+        return 7
+
+    async def get_confirmations(self, tx_hash):
+        return self.confirmations.get(tx_hash)
+
+    async def anchor_merkle_root(self, root, nonce=None):
+        if self.fail:
+            self.fail -= 1
+            raise RuntimeError('rpc down')
+        self.sent.append((root, nonce))
+        return f'0xtx{len(self.sent)}'
+
+
+class _Shared:
+    # session factory handing out the test session; `with` must not close it
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        return self.db
+
+    def __exit__(self, *exc):
+        return False
+
+
+def _worker(db_session, chain, clock, is_leader=lambda: True):
+    return AnchorWorker(session_factory=lambda: _Shared(db_session), chain=chain, clock=clock, is_leader=is_leader)
+
+
+def _snap(db, n):
+    snap = MerkleSnapshot(last_event_id=n, merkle_root=f'0xroot{n}', event_count=n)
+    db.add(snap)
+    db.commit()
+    return snap
+
+
+def test_coalesces_roots_and_writes_tx_hash(db_session, monkeypatch):
+    monkeypatch.setattr(settings, 'anchor_interval_seconds', 60)
+    monkeypatch.setattr(settings, 'anchor_sender_address', '0x0000000000000000000000000000000000000001')
+    chain, clock = _FakeChain(), _Clock()
+    worker = _worker(db_session, chain, clock)
+    snaps = [_snap(db_session, n) for n in (1, 2, 3)]
+    for s in snaps:
+        worker.submit(s.id, s.merkle_root)
+    assert asyncio.run(worker.tick()) == '0xtx1'
+    # only the newest root is anchored; the two it supersedes are skipped
+    assert chain.sent == [('0xroot3', 7)] and worker.superseded == 2
+    db_session.expire_all()
+    assert db_session.get(MerkleSnapshot, snaps[2].id).anchor_tx_hash == '0xtx1'
+    assert db_session.get(MerkleSnapshot, snaps[0].id).anchor_tx_hash is None
+    # rate limited until the interval passes; nonces come from the local counter
+    s4 = _snap(db_session, 4)
+    worker.submit(s4.id, s4.merkle_root)
+    assert asyncio.run(worker.tick()) is None
+    clock.now += 60
+    assert asyncio.run(worker.tick()) == '0xtx2'
+    assert chain.sent[-1] == ('0xroot4', 8)
+
+
+def test_backoff_retries_and_recovers_unanchored_snapshot(db_session, monkeypatch):
+    monkeypatch.setattr(settings, 'anchor_backoff_base_seconds', 2.0)
+    monkeypatch.setattr(settings, 'anchor_sender_address', None)
+    chain, clock = _FakeChain(), _Clock()
+    chain.fail = 2
+    snap = _snap(db_session, 5)
+    worker = _worker(db_session, chain, clock)  # nothing submitted: picked up from the table
+    assert asyncio.run(worker.tick()) is None
+    clock.now += 1
+    assert asyncio.run(worker.tick()) is None and chain.fail == 1  # still backing off (2s)
+    clock.now += 1
+    assert asyncio.run(worker.tick()) is None  # second failure, now 4s
+    clock.now += 4
+    assert asyncio.run(worker.tick()) == '0xtx1'
+    assert chain.sent == [('0xroot5', None)] and worker.failures == 2
+    db_session.expire_all()
+    assert db_session.get(MerkleSnapshot, snap.id).anchor_tx_hash == '0xtx1'
+
+
+def test_unconfirmed_tx_requeued_with_same_nonce(db_session, monkeypatch):
+    monkeypatch.setattr(settings, 'anchor_confirmations', 2)
+    monkeypatch.setattr(settings, 'anchor_confirm_timeout_seconds', 100)
+    monkeypatch.setattr(settings, 'anchor_interval_seconds', 0)
+    monkeypatch.setattr(settings, 'anchor_sender_address', '0x0000000000000000000000000000000000000001')
+    chain, clock = _FakeChain(), _Clock()
+    worker = _worker(db_session, chain, clock)
+    worker._recovered = True
+    worker.submit(1, '0xa')
+    assert asyncio.run(worker.tick()) == '0xtx1'
+    worker.submit(2, '0xb')
+    chain.confirmations['0xtx1'] = 1
+    assert asyncio.run(worker.tick()) is None  # waits for the second confirmation
+    clock.now += 100
+    assert asyncio.run(worker.tick()) is None  # timed out; 0xb is newer so 0xa is dropped
+    clock.now += 2
+    assert asyncio.run(worker.tick()) == '0xtx2'
+    assert chain.sent == [('0xa', 7), ('0xb', 7)]
+    chain.confirmations['0xtx2'] = 2
+    assert asyncio.run(worker.tick()) is None and worker.confirmed == 1
+    assert worker.stats()['inflight'] == 0
+
+
+def test_only_snapshot_lease_holder_anchors(db_session, monkeypatch):
+    monkeypatch.setattr(settings, 'anchor_interval_seconds', 60)
+    monkeypatch.setattr(settings, 'anchor_sender_address', '0x0000000000000000000000000000000000000001')
+    monkeypatch.setattr(settings, 'scheduler_lease_ttl_seconds', 30)
+    now = datetime.now(timezone.utc)
+    sched_a, sched_b = SnapshotScheduler('a', clock=lambda: now), SnapshotScheduler('b', clock=lambda: now)
+    sched_a.tick(db_session)
+    sched_b.tick(db_session)
+    assert sched_a.is_leader and not sched_b.is_leader
+    snap = _snap(db_session, 9)  # unanchored, e.g. left over by a fleet restart
+    chain, clock = _FakeChain(), _Clock()
+    leader = _worker(db_session, chain, clock, is_leader=lambda: sched_a.is_leader)
+    follower = _worker(db_session, chain, clock, is_leader=lambda: sched_b.is_leader)
+    follower.submit(snap.id, snap.merkle_root)
+    assert asyncio.run(follower.tick()) is None and follower.stats()['pending'] == 0
+    assert asyncio.run(leader.tick()) == '0xtx1'
+    assert asyncio.run(follower.tick()) is None
+    # one transaction from the shared sender, not one per replica
+    assert chain.sent == [('0xroot9', 7)]
+    # losing the lease forgets the local nonce; the next holder re-reads it from the chain
+    sched_a.release(db_session)
+    assert asyncio.run(leader.tick()) is None and leader._nonce is None
+
@@ -0,0 +1,103 @@
+import json
+from hashlib import sha256
+
+from sqlalchemy import event
+
+from app.models.database import AuditEvent
+from app.services.audit_service import record_audit_event, record_audit_events_bulk
+
+
+def _recompute_ok(rows) -> bool:
+    prev = ''
+    for r in rows:
+        canonical = json.dumps({'event_type': r.event_type, 'entity_type': r.entity_type, 'entity_id': r.entity_id,
+                                'user_id': r.user_id, 'payload': r.payload}, sort_keys=True, separators=(',', ':'))
+        if sha256((prev + canonical).encode()).hexdigest() != r.integrity_hash:
+            return False
+        prev = r.integrity_hash
+    return True
+
+
+def test_head_cached_per_transaction_and_bulk_interleaves(db_session):
+    head_reads = []
+
+    def _count(conn, cursor, statement, params, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and 'audit_events' in statement and 'ORDER BY audit_events.id DESC' in statement:
+            head_reads.append(statement)
+
+    bind = db_session.get_bind()
+    event.listen(bind, 'before_cursor_execute', _count)
+    try:
+        # several unflushed single events chain off each other, not off the same stale head
+        for i in range(3):
+            record_audit_event(db_session, event_type='A', entity_type='T', entity_id=i, payload={'i': i})
+        hashes = record_audit_events_bulk(db_session, [
+            {'event_type': 'B', 'entity_type': 'T', 'entity_id': i, 'payload': {'i': i}} for i in range(5)
+        ])
+        record_audit_event(db_session, event_type='C', entity_type='T', payload={'tail': True})
+        db_session.commit()
+        assert len(head_reads) == 1
+        # next transaction re-reads the (committed) head once, then continues the chain
+        record_audit_event(db_session, event_type='D', entity_type='T', payload=None)
+        db_session.commit()
+        assert len(head_reads) == 2
+    finally:
+        event.remove(bind, 'before_cursor_execute', _count)
+    rows = db_session.query(AuditEvent).order_by(AuditEvent.id.asc()).all()
+    assert [r.event_type for r in rows] == ['A'] * 3 + ['B'] * 5 + ['C', 'D']
+    assert [r.integrity_hash for r in rows[3:8]] == hashes
+    assert _recompute_ok(rows)
+
+
+def test_rollback_drops_cached_head(db_session):
+    record_audit_event(db_session, event_type='KEEP', entity_type='T', payload={'n': 1})
+    db_session.commit()
+    nested = db_session.begin_nested()
+    record_audit_event(db_session, event_type='DISCARD', entity_type='T', payload={'n': 2})
+    db_session.flush()
+    nested.rollback()
+    record_audit_event(db_session, event_type='KEEP', entity_type='T', payload={'n': 3})
+    db_session.commit()
+    rows = db_session.query(AuditEvent).order_by(AuditEvent.id.asc()).all()
+    assert [r.event_type for r in rows] == ['KEEP', 'KEEP']
+    assert _recompute_ok(rows)
+    assert record_audit_events_bulk(db_session, []) == []
+
+
+def test_leaf_hash_stored_at_insert_and_backfilled(db_session):
+    from app.services.merkle_service import merkle_service, _event_leaf
+    record_audit_event(db_session, event_type='A', entity_type='T', entity_id=1, payload={'amt': '1.5', 'name': 'café'})
+    record_audit_events_bulk(db_session, [{'event_type': 'B', 'entity_type': 'T', 'payload': {'x': 0.1, 'n': [1, 2]}}])
+    db_session.add(AuditEvent(event_type='C', entity_type='T', payload={'direct': True}))
+    db_session.commit()
+    # a row written before the column existed
+    db_session.add(AuditEvent(event_type='LEGACY', entity_type='T', payload={'old': 1}))
+    db_session.flush()
+    db_session.query(AuditEvent).filter(AuditEvent.event_type == 'LEGACY').update({'leaf_hash': None})
+    db_session.commit()
+    db_session.expire_all()
+    rows = db_session.query(AuditEvent).order_by(AuditEvent.id.asc()).all()
+    assert [r.leaf_hash is None for r in rows] == [False, False, False, True]
+    assert all(bytes.fromhex(r.leaf_hash) == _event_leaf(r) for r in rows[:3])
+    snap = merkle_service.snapshot_incremental(db_session)
+    assert snap.event_count == 4
+    legacy = db_session.query(AuditEvent).filter(AuditEvent.event_type == 'LEGACY').one()
+    db_session.refresh(legacy)
+    assert bytes.fromhex(legacy.leaf_hash) == _event_leaf(legacy)
+
+
+def test_canonical_encoder_matches_stdlib():
+    from app.services.canonical_json import canonical_dumps
+    samples = [
+        {'b': 1, 'a': [True, None, 'x:1.5']},
+        {'amount': '100.25', 'nested': {'z': 2 ** 40, 'y': -7}},
+        {'f': 1e16, 'g': 9.5e-05, 'h': -0.0},
+        {'u': 'café  ', 'ctl': '\x00\x1f\x7f'},
+        {'big': 2 ** 70},
+        {1: 'int key'},
+        [0.1, 'tail'],
+        1.5,
+        'plain',
+    ]
+    for obj in samples:
+        assert canonical_dumps(obj) == json.dumps(obj, sort_keys=True, separators=(',', ':')).encode()
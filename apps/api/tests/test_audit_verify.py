@@ -0,0 +1,63 @@
+import json
+
+from app.models.database import AuditEvent, AuditChainCheckpoint
+from app.services.audit_service import record_audit_event
+from app.services.audit_verify_service import AuditChainVerifier, chain_hash, verify_segment
+
+
+def _seed(db, start, n):
+    for i in range(start, start + n):
+        record_audit_event(db, event_type='V', entity_type='T', entity_id=i, payload={'i': i})
+    db.commit()
+    return db.query(AuditEvent).order_by(AuditEvent.id.asc()).all()
+
+
+def test_checkpoints_resume_and_segments(db_session):
+    events = _seed(db_session, 0, 10)
+    verifier = AuditChainVerifier()
+    assert verifier.run_once(db_session, batch_size=3, interval=4) == 10
+    cps = db_session.query(AuditChainCheckpoint).order_by(AuditChainCheckpoint.event_id.asc()).all()
+    assert [(c.event_id, c.event_count) for c in cps] == [(events[3].id, 4), (events[7].id, 8)]
+    assert all(c.integrity_hash == events[c.event_count - 1].integrity_hash for c in cps)
+    # the next pass resumes after the last verified event instead of re-walking since the checkpoint
+    assert verifier.run_once(db_session, interval=4) == 0
+    events = _seed(db_session, 10, 3)
+    assert verifier.run_once(db_session, interval=4) == 3
+    assert db_session.query(AuditChainCheckpoint).count() == 3  # at the 12th event
+    # a cursored range seeds from the nearest checkpoint
+    assert verifier.seed(db_session, events[5].id) == (events[5].integrity_hash, True)
+    segments = verifier.segments(db_session)
+    assert len(segments) == 4 and segments[-1][2] is None
+    assert all(verify_segment(db_session, *seg, batch_size=2)['ok'] for seg in segments)
+
+
+def test_rechained_rewrite_caught_at_checkpoint(db_session):
+    events = _seed(db_session, 0, 8)
+    verifier = AuditChainVerifier()
+    verifier.run_once(db_session, interval=6)
+    # rewrite event 2 and re-chain every later hash: each link still checks out locally
+    events[2].payload = {'i': 'forged'}
+    prev = events[1].integrity_hash
+    for ev in events[2:]:
+        ev.integrity_hash = chain_hash(prev, ev)
+        prev = ev.integrity_hash
+    db_session.commit()
+    first, tail = verifier.segments(db_session)
+    result = verify_segment(db_session, *first)
+    assert not result['ok'] and result['bad_event_ids'] == [events[5].id]
+    assert verify_segment(db_session, *tail)['ok'] is False  # starts from the checkpointed hash
+
+
+def test_cursored_stream_export_verifies_first_row(db_session, client, auth_token, monkeypatch):
+    from app import config as cfg
+    monkeypatch.setattr(cfg.settings, 'admin_wallets', ['0xabc1234567890000000000000000000000000001'])
+    events = _seed(db_session, 0, 9)
+    AuditChainVerifier().run_once(db_session, interval=3)
+    headers = {'Authorization': f'Bearer {auth_token}'}
+    r = client.get(f'/api/v1/settlement/audit-export/stream?verify_integrity=true&after_id={events[4].id}', headers=headers)
+    assert r.status_code == 200
+    rows = [json.loads(ln) for ln in r.content.decode().split('\n') if ln.strip()]
+    assert [o['id'] for o in rows] == [e.id for e in events[5:]]
+    assert all(o['integrity_ok'] is True for o in rows)
+    r = client.get(f'/api/v1/settlement/audit-export?verify_integrity=true&after_id={events[6].id}', headers=headers)
+    assert r.headers['X-Integrity-OK'] == 'true'
@@ -0,0 +1,84 @@
+from decimal import Decimal
+
+from app.models.database import Domain, DomainETF, DomainETFPosition, DomainLatestValuation, User, Valuation
+from app.services import latest_valuations
+from app.services.nav_service import nav_service
+from app.services.valuation_service import valuation_service
+
+from tests.test_trade_state import _selects
+
+
+def _valuation(db, name, value):
+    db.add(Valuation(domain_name=name, model_version='t', value=Decimal(value), factors={}))
+
+
+def test_projection_follows_newest_valuation(db_session):
+    for name in ('lv1.eth', 'lv2.eth', 'lv3.eth'):
+        db_session.add(Domain(name=name, tld='eth'))
+    db_session.flush()
+    _valuation(db_session, 'lv1.eth', '10')
+    _valuation(db_session, 'lv1.eth', '11')  # same flush: the higher id wins
+    _valuation(db_session, 'lv2.eth', '20')
+    db_session.commit()
+    assert latest_valuations.get_latest_values(db_session, ['LV1.eth', 'lv2.eth', 'lv3.eth']) == {
+        'lv1.eth': Decimal('11'), 'lv2.eth': Decimal('20')}
+    # rolled back with the valuation it belongs to
+    sp = db_session.begin_nested()
+    _valuation(db_session, 'lv2.eth', '99')
+    db_session.flush()
+    sp.rollback()
+    assert latest_valuations.get_latest_values(db_session, ['lv2.eth']) == {'lv2.eth': Decimal('20')}
+    # both write paths keep it current
+    res = valuation_service.value_domains(db_session, ['lv3.eth'], {})
+    assert latest_valuations.get_latest_values(db_session, ['lv3.eth']) == {'lv3.eth': Decimal(res[0]['value'])}
+    valuation_service.revalue_all(db_session, names=['lv1.eth'])
+    newest = db_session.query(Valuation).filter(Valuation.domain_name == 'lv1.eth').order_by(Valuation.id.desc()).first()
+    row = db_session.get(DomainLatestValuation, 'lv1.eth')
+    assert row.valuation_id == newest.id and Decimal(str(row.value)) == Decimal(str(newest.value))
+    # rebuild reproduces the listener-maintained rows
+    before = latest_valuations.get_latest_values(db_session, ['lv1.eth', 'lv2.eth', 'lv3.eth'])
+    assert latest_valuations.rebuild(db_session) >= 3
+    db_session.expire_all()
+    assert latest_valuations.get_latest_values(db_session, ['lv1.eth', 'lv2.eth', 'lv3.eth']) == before
+
+
+def test_nav_reads_values_in_one_query(db_session):
+    user = User(wallet_address='0xlatestnav0000000000000000000000000000001')
+    db_session.add(user)
+    db_session.flush()
+    etf = DomainETF(owner_user_id=user.id, name='Latest', symbol='LAT', total_shares=Decimal(0))
+    db_session.add(etf)
+    db_session.flush()
+    for i in range(200):
+        name = f'nav{i}.eth'
+        db_session.add(Domain(name=name, tld='eth', last_floor_price=Decimal(7)))
+        db_session.add(DomainETFPosition(etf_id=etf.id, domain_name=name, weight_bps=50))
+    db_session.flush()
+    for i in range(150):
+        _valuation(db_session, f'nav{i}.eth', '10')
+    db_session.commit()
+    db_session.refresh(etf)
+    nav, selects = _selects(db_session, lambda: nav_service._compute_nav(db_session, etf))
+    # 150 valued at 10, 50 fall back to the floor of 7, each weighted 0.5%
+    assert nav == Decimal('9.25')
+    # positions, latest values, floors for the unvalued remainder
+    assert len(selects) == 3
+    assert not any('FROM valuations' in s for s in selects)
+
+
+def test_prefetch_and_latest_endpoint_read_projection(db_session, client):
+    db_session.add(Domain(name='lvp.eth', tld='eth'))
+    db_session.flush()
+    _valuation(db_session, 'lvp.eth', '40')
+    db_session.commit()
+    _valuation(db_session, 'lvp.eth', '42')
+    db_session.commit()
+    inputs, selects = _selects(db_session, lambda: valuation_service._prefetch_inputs(db_session, ['lvp.eth']))
+    assert inputs['lvp.eth']['prev'][0] == Decimal('42')
+    assert not any('FROM valuations' in s for s in selects)
+    (latest,), selects = _selects(db_session, lambda: client.get('/api/v1/valuation/latest', params={'domain': 'LVP.eth', 'limit': 1}).json()['valuations'])
+    assert Decimal(latest['value']) == Decimal('42') and latest['factors'] == {}
+    assert not any('FROM valuations' in s for s in selects)
+    # the default still returns the history (up to 50 rows)
+    history = client.get('/api/v1/valuation/latest', params={'domain': 'lvp.eth'}).json()['valuations']
+    assert sorted(Decimal(v['value']) for v in history) == [Decimal('40'), Decimal('42')]
@@ -0,0 +1,179 @@
+from decimal import Decimal
+
+from app.models.database import User, Participant
+from app.services.leaderboard_service import LeaderboardService, MemoryLeaderboardStore, RedisLeaderboardStore
+
+
+def _seed(db, comp_id: int, n: int):
+    parts = []
+    for i in range(n):
+        u = User(wallet_address=f'0x{comp_id:04x}{i:036x}')
+        db.add(u); db.flush()
+        # values descend with i so participant i starts at rank i+1
+        p = Participant(user_id=u.id, competition_id=comp_id, portfolio_value=Decimal(1000 - i))
+        db.add(p); db.flush()
+        parts.append(p)
+    return parts
+
+
+def test_ranks_beyond_top_50_and_single_load(db_session):
+    parts = _seed(db_session, 901, 80)
+    lb = LeaderboardService(MemoryLeaderboardStore())
+    lb.ensure_loaded(db_session, 901)
+    lb.ensure_loaded(db_session, 901)
+    assert lb.loads == 1
+    assert lb.rank(901, parts[0].id) == 1
+    assert lb.rank(901, parts[75].id) == 76
+    # value change reorders without touching the database
+    assert lb.update(901, parts[75].id, parts[75].user_id, Decimal('999.5')) == 2
+    assert lb.rank(901, parts[1].id) == 3
+    assert [row['participant_id'] for row in lb.top(901, 3)] == [parts[0].id, parts[75].id, parts[1].id]
+
+
+def test_tick_emits_every_moved_rank_once(db_session):
+    parts = _seed(db_session, 902, 10)
+    lb = LeaderboardService(MemoryLeaderboardStore())
+    lb.ensure_loaded(db_session, 902)
+    # nothing changed yet -> nothing to publish
+    assert lb.collect_deltas() == []
+    # last place jumps to 3rd, then 3rd (now the jumper) is bumped again within the same tick
+    lb.update(902, parts[9].id, parts[9].user_id, Decimal('998.5'))
+    lb.update(902, parts[9].id, parts[9].user_id, Decimal('997.5'))
+    deltas = lb.collect_deltas()
+    assert len(deltas) == 1 and deltas[0]['competition_id'] == 902
+    ranks = {u['participant_id']: u['rank'] for u in deltas[0]['updates']}
+    # jumper now 4th; old 4th..9th each slid down one; top 3 untouched
+    assert ranks[parts[9].id] == 4
+    assert {pid: r for pid, r in ranks.items() if pid != parts[9].id} == {parts[i].id: i + 2 for i in range(3, 9)}
+    assert parts[0].id not in ranks and parts[2].id not in ranks
+    assert lb.collect_deltas() == []
+    # the trading participant is reported even when its rank is unchanged
+    lb.update(902, parts[0].id, parts[0].user_id, Decimal('1001'))
+    (delta,) = lb.collect_deltas()
+    assert [(u['participant_id'], u['rank'], u['portfolio_value']) for u in delta['updates']] == [(parts[0].id, 1, '1001')]
+
+
+def test_large_shift_is_split_and_idle_flush_publishes(db_session):
+    parts = _seed(db_session, 903, 12)
+    lb = LeaderboardService(MemoryLeaderboardStore(), max_updates=5)
+    lb.ensure_loaded(db_session, 903)
+    # unloaded competitions are ignored (the next load reads committed values)
+    assert lb.update(904, 1, 1, 5) is None
+    lb.update(903, parts[11].id, parts[11].user_id, Decimal('5000'))
+    sent = []
+    assert lb.flush_if_idle(sent.append) == 3
+    assert [len(p['updates']) for p in sent] == [5, 5, 2]
+    assert sorted(u['rank'] for p in sent for u in p['updates']) == list(range(1, 13))
+
+
+def test_queued_updates_apply_on_commit_only(db_session):
+    from app.services.leaderboard_service import leaderboard_service as lbs
+    parts = _seed(db_session, 905, 3)
+    db_session.commit()
+    lbs.ensure_loaded(db_session, 905)
+    db_session.commit()
+    parts[2].portfolio_value = Decimal('2000')
+    lbs.queue_update(db_session, 905, parts[2].id, parts[2].user_id, Decimal('2000'))
+    assert lbs.rank(905, parts[2].id) == 3  # not before the commit
+    db_session.commit()
+    assert lbs.rank(905, parts[2].id) == 1
+    # a rolled back change never reaches the ordering; the competition reloads from the table
+    sp = db_session.begin_nested()
+    parts[1].portfolio_value = Decimal('3000')
+    db_session.flush()
+    lbs.queue_update(db_session, 905, parts[1].id, parts[1].user_id, Decimal('3000'))
+    sp.rollback()
+    assert not lbs.is_loaded(905)
+    lbs.ensure_loaded(db_session, 905)
+    assert lbs.rank(905, parts[1].id) == 3
+
+
+def test_reload_picks_up_values_written_elsewhere(db_session):
+    parts = _seed(db_session, 906, 3)
+    lb = LeaderboardService(MemoryLeaderboardStore())
+    lb.ensure_loaded(db_session, 906)
+    lb.collect_deltas()
+    # another worker moved last place to the top
+    parts[2].portfolio_value = Decimal('5000')
+    db_session.flush()
+    assert lb.reload(db_session, 906) == 1
+    assert lb.rank(906, parts[2].id) == 1
+    (delta,) = lb.collect_deltas()
+    assert {u['participant_id']: u['rank'] for u in delta['updates']} == {parts[2].id: 1, parts[0].id: 2, parts[1].id: 3}
+
+
+def _ranking(lb, cid):
+    return [(r['participant_id'], r['user_id'], Decimal(r['portfolio_value']), r['rank']) for r in lb.top(cid, 100)]
+
+
+class _FakeZRedis:
+    """Just enough of a sync redis client for the ZSET store (ties ordered by member, like Redis)."""
+    def __init__(self):
+        self.zsets: dict[str, dict[str, float]] = {}
+
+    def _ordered(self, key):
+        return sorted(self.zsets.get(key, {}).items(), key=lambda kv: (kv[1], kv[0]), reverse=True)
+
+    def delete(self, key):
+        return int(self.zsets.pop(key, None) is not None)
+
+    def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    def zrevrank(self, key, member):
+        members = [m for m, _ in self._ordered(key)]
+        return members.index(member) if member in members else None
+
+    def zrevrange(self, key, lo, hi, withscores=False):
+        return self._ordered(key)[lo:hi + 1]
+
+    def zcard(self, key):
+        return len(self.zsets.get(key, {}))
+
+    def zscan_iter(self, key, match=None):
+        import fnmatch
+        return iter([(m, s) for m, s in self.zsets.get(key, {}).items() if match is None or fnmatch.fnmatchcase(m, match)])
+
+    def pipeline(self, transaction=True):
+        client = self
+
+        class _Pipe:
+            def __init__(self):
+                self.calls = []
+
+            def __getattr__(self, name):
+                return lambda *a, **kw: self.calls.append((name, a, kw))
+
+            def execute(self):
+                return [getattr(client, n)(*a, **kw) for n, a, kw in self.calls]
+        return _Pipe()
+
+
+def test_redis_store_matches_memory_store(db_session):
+    parts = _seed(db_session, 907, 12)
+    for p in parts[3:6]:  # a three-way tie
+        p.portfolio_value = Decimal(500)
+    db_session.flush()
+    redis = _FakeZRedis()
+    mem = LeaderboardService(MemoryLeaderboardStore())
+    red = LeaderboardService(RedisLeaderboardStore(redis, 'lbt'))
+    for lb in (mem, red):
+        lb.ensure_loaded(db_session, 907)
+    # ties rank by participant id in both stores
+    assert _ranking(red, 907) == _ranking(mem, 907)
+    # another worker's load replaces the ZSET: a participant gone from the table leaves the ranking
+    redis.zadd('lbt:907', {'999999999999:1': 5000.0})
+    other = LeaderboardService(RedisLeaderboardStore(redis, 'lbt'))
+    other.ensure_loaded(db_session, 907)
+    assert _ranking(red, 907) == _ranking(mem, 907) and red.store.size(907) == 12
+    # a participant joining through the other worker is found in the ZSET, not the local cache
+    u = User(wallet_address='0x' + 'e' * 40)
+    db_session.add(u); db_session.flush()
+    newcomer = Participant(user_id=u.id, competition_id=907, portfolio_value=Decimal(2000))
+    db_session.add(newcomer); db_session.flush()
+    other.update(907, newcomer.id, u.id, Decimal(2000))
+    assert red.rank(907, newcomer.id) == 1
+    # dropping local state leaves the shared ZSET for the other workers
+    red.reset(907)
+    assert other.rank(907, newcomer.id) == 1
+
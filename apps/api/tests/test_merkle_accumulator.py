@@ -51,3 +51,84 @@ def test_full_recompute_matches_accumulator(db_session):
         return layer[0]
     full_root = '0x'+build(leaves).hex()
     assert snap2.merkle_root == full_root
+
+def test_checkpoint_once_per_snapshot_and_resume(db_session):
+    from app.services.merkle_service import MerkleService, _build_merkle, _event_leaf
+    svc = MerkleService()
+    for i in range(11):
+        db_session.add(AuditEvent(event_type='C', entity_type='Z', entity_id=None, user_id=None, payload={'i': i}))
+    db_session.commit()
+    snap = svc.snapshot_incremental(db_session)
+    # frontier for 11 leaves = one peak per set bit (8 + 2 + 1)
+    assert sorted(r.level for r in db_session.query(MerkleAccumulator).all()) == [0, 1, 3]
+    assert svc.snapshot_incremental(db_session) is None  # nothing new
+    for i in range(11, 20):
+        db_session.add(AuditEvent(event_type='C', entity_type='Z', entity_id=None, user_id=None, payload={'i': i}))
+    db_session.commit()
+    # a fresh process resumes from the persisted checkpoint instead of the (empty) in-memory frontier
+    snap2 = MerkleService().snapshot_incremental(db_session)
+    events = db_session.query(AuditEvent).order_by(AuditEvent.id.asc()).all()
+    assert snap2.merkle_root == '0x' + _build_merkle([_event_leaf(e) for e in events]).hex()
+    assert snap2.event_count == 20 and snap2.last_event_id == events[-1].id
+    assert sorted(r.level for r in db_session.query(MerkleAccumulator).all()) == [2, 4]
+    assert snap.merkle_root != snap2.merkle_root
+
+def test_stale_checkpoint_falls_back_to_node_table(db_session):
+    from app.services.merkle_service import MerkleService, _build_merkle, _event_leaf
+    for i in range(6):
+        db_session.add(AuditEvent(event_type='S', entity_type='Z', entity_id=None, user_id=None, payload={'i': i}))
+    db_session.commit()
+    MerkleService().snapshot_incremental(db_session)
+    for i in range(6, 9):
+        db_session.add(AuditEvent(event_type='S', entity_type='Z', entity_id=None, user_id=None, payload={'i': i}))
+    db_session.commit()
+    # scheduler indexing between snapshots leaves the checkpoint behind
+    merkle_service.sync_nodes(db_session)
+    db_session.commit()
+    last = db_session.query(AuditEvent).order_by(AuditEvent.id.desc()).first()
+    assert merkle_service.compute_proof_path(db_session, last.id)['tree_size'] == 9
+    snap = MerkleService().snapshot_incremental(db_session)
+    events = db_session.query(AuditEvent).order_by(AuditEvent.id.asc()).all()
+    assert snap.merkle_root == '0x' + _build_merkle([_event_leaf(e) for e in events]).hex()
+
+
+def test_streamed_recompute_matches_full_tree(db_session):
+    from app.services.merkle_service import _build_merkle, _event_leaf
+    seen = []
+    assert merkle_service.recompute(db_session)['event_count'] == 0
+    for n in (1, 2, 7, 19):
+        for i in range(n):
+            db_session.add(AuditEvent(event_type='S', entity_type='Z', entity_id=None, user_id=None, payload={'n': n, 'i': i}))
+        db_session.commit()
+        events = db_session.query(AuditEvent).order_by(AuditEvent.id.asc()).all()
+        res = merkle_service.recompute(db_session, batch_size=4, progress=seen.append)
+        assert res == {'merkle_root': '0x' + _build_merkle([_event_leaf(e) for e in events]).hex(),
+                       'event_count': len(events), 'last_event_id': events[-1].id}
+    assert seen[-1] == 29 and seen[-2] == 28  # reported per batch
+
+
+def test_recompute_endpoint_returns_job_handle(db_session, client, auth_token, monkeypatch):
+    from app import config as cfg
+    from app.services import merkle_service as ms
+
+    class _InlineThread:
+        def __init__(self, target, args=(), **_):
+            self._run = lambda: target(*args)
+
+        def start(self):
+            self._run()
+
+    monkeypatch.setattr(cfg.settings, 'admin_wallets', ['0xabc1234567890000000000000000000000000001'])
+    monkeypatch.setattr(ms.threading, 'Thread', _InlineThread)
+    monkeypatch.setattr(ms.recompute_jobs, '_run_with_session', lambda job, factory: ms.recompute_jobs.run(job, db_session))
+    for i in range(5):
+        db_session.add(AuditEvent(event_type='J', entity_type='Z', entity_id=None, user_id=None, payload={'i': i}))
+    db_session.commit()
+    headers = {'Authorization': f'Bearer {auth_token}'}
+    r = client.post('/api/v1/settlement/merkle/recompute', headers=headers)
+    assert r.status_code == 202
+    job_id = r.json()['id']
+    job = client.get(f'/api/v1/settlement/merkle/recompute/{job_id}', headers=headers).json()
+    assert job['status'] == 'done' and job['processed'] == job['total'] == 5
+    assert job['result']['merkle_root'] == merkle_service.latest(db_session).merkle_root
+    assert client.get('/api/v1/settlement/merkle/recompute/nope', headers=headers).status_code == 404
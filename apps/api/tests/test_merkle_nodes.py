@@ -0,0 +1,111 @@
+from hashlib import sha256
+
+from app.services.merkle_service import merkle_service, _build_merkle, _event_leaf
+from app.models.database import AuditEvent, MerkleNode
+
+
+def _verify(leaf: bytes, path: list[str], position: int, root: str) -> bool:
+    # same walk as the web client's verifyInclusion
+    cur, idx = leaf, position
+    for sib_hex in path:
+        sib = bytes.fromhex(sib_hex[2:])
+        cur = sha256(cur + sib).digest() if idx % 2 == 0 else sha256(sib + cur).digest()
+        idx //= 2
+    return '0x' + cur.hex() == root
+
+
+def _add_events(db, start, n):
+    for i in range(start, start + n):
+        db.add(AuditEvent(event_type='N', entity_type='X', entity_id=None, user_id=None, payload={'i': i}))
+    db.commit()
+
+
+def test_node_table_proofs_match_full_tree(db_session):
+    _add_events(db_session, 0, 13)
+    snap = merkle_service.snapshot_incremental(db_session)
+    events = db_session.query(AuditEvent).order_by(AuditEvent.id.asc()).all()
+    leaves = [_event_leaf(e) for e in events]
+    full_root = '0x' + _build_merkle(leaves).hex()
+    assert snap.merkle_root == full_root
+    # complete subtrees only: 13 leaves + 6 + 3 + 1
+    assert db_session.query(MerkleNode).count() == 23
+    for pos, ev in enumerate(events):
+        proof = merkle_service.compute_proof_path(db_session, ev.id)
+        assert proof['position'] == pos and proof['merkle_root'] == full_root
+        assert _verify(leaves[pos], proof['path'], pos, full_root)
+
+
+def test_historical_snapshot_roots_and_proofs_reproducible(db_session):
+    _add_events(db_session, 0, 5)
+    snap1 = merkle_service.snapshot_incremental(db_session)
+    _add_events(db_session, 5, 6)
+    snap2 = merkle_service.snapshot_incremental(db_session)
+    assert snap1.merkle_root != snap2.merkle_root
+    size1 = merkle_service.snapshot_size(db_session, snap1)
+    assert size1 == 5
+    assert merkle_service.root_at(db_session, size1) == snap1.merkle_root
+    assert merkle_service.root_at(db_session, merkle_service.snapshot_size(db_session, snap2)) == snap2.merkle_root
+    events = db_session.query(AuditEvent).order_by(AuditEvent.id.asc()).all()
+    old = merkle_service.compute_proof_path(db_session, events[4].id, tree_size=size1)
+    assert old['merkle_root'] == snap1.merkle_root
+    assert _verify(_event_leaf(events[4]), old['path'], old['position'], snap1.merkle_root)
+    assert merkle_service.compute_proof_path(db_session, events[7].id, tree_size=size1) == {'error': 'event not in snapshot'}
+    # the accumulator frontier folds to the same root
+    assert merkle_service._compute_root_from_accumulator(db_session) == snap2.merkle_root
+
+
+def test_unindexed_event_indexed_on_demand(db_session, client, monkeypatch):
+    from app.config import settings
+    monkeypatch.setattr(settings, 'enable_merkle_service', False)  # no scheduler tick indexes anything
+    _add_events(db_session, 0, 3)
+    events = db_session.query(AuditEvent).order_by(AuditEvent.id.asc()).all()
+    assert db_session.query(MerkleNode).filter(MerkleNode.level == 0).count() == 0
+    # a proof read indexes only up to the event it needs
+    proof = merkle_service.compute_proof_path(db_session, events[1].id)
+    assert proof['position'] == 1 and proof['tree_size'] == 2
+    assert db_session.query(MerkleNode).filter(MerkleNode.level == 0).count() == 2
+    r = client.get(f'/api/v1/settlement/audit-events/{events[2].id}/merkle-proof')
+    assert r.status_code == 200 and r.json()['position'] == 2 and r.json()['tree_size'] == 3
+    _add_events(db_session, 3, 2)
+    newest = db_session.query(AuditEvent).order_by(AuditEvent.id.desc()).first()
+    mp = merkle_service.compute_multi_proof(db_session, [events[0].id, newest.id, newest.id + 999])
+    assert mp['missing'] == [newest.id + 999] and mp['tree_size'] == 5
+    assert merkle_service.compute_proof_path(db_session, newest.id + 999) == {'error': 'event not found'}
+
+
+def test_multi_proof_dedupes_siblings_and_verifies(db_session):
+    from app.services.merkle_service import verify_multi_proof
+    _add_events(db_session, 0, 21)
+    snap = merkle_service.snapshot_incremental(db_session)
+    events = db_session.query(AuditEvent).order_by(AuditEvent.id.asc()).all()
+    chosen = [events[i] for i in (0, 1, 2, 3, 9, 20)]
+    mp = merkle_service.compute_multi_proof(db_session, [e.id for e in chosen])
+    assert mp['merkle_root'] == snap.merkle_root and mp['missing'] == []
+    leaves = {mp['positions'][e.id]: _event_leaf(e) for e in chosen}
+    assert verify_multi_proof(leaves, mp['nodes'], mp['tree_size'], mp['merkle_root'])
+    # fewer hashes than six independent paths (6 * 5) and no (level, idx) twice
+    keys = [(lvl, idx) for lvl, idx, _ in mp['nodes']]
+    assert len(keys) == len(set(keys)) and len(keys) < 12
+    tampered = dict(leaves)
+    tampered[0] = _event_leaf(events[5])
+    assert not verify_multi_proof(tampered, mp['nodes'], mp['tree_size'], mp['merkle_root'])
+
+
+def test_multiproof_endpoint_range(client, db_session):
+    from app.services.merkle_service import verify_multi_proof
+    _add_events(db_session, 0, 9)
+    snap = merkle_service.snapshot_incremental(db_session)
+    _add_events(db_session, 9, 2)
+    events = db_session.query(AuditEvent).order_by(AuditEvent.id.asc()).all()
+    r = client.post('/api/v1/settlement/audit-events/merkle-multiproof', json={'from_id': events[2].id, 'to_id': events[10].id, 'snapshot_id': snap.id})
+    assert r.status_code == 200
+    body = r.json()
+    assert body['merkle_root'] == snap.merkle_root and body['tree_size'] == 9
+    assert body['snapshot']['id'] == snap.id
+    # the two events after the snapshot cannot be proven against it
+    assert body['missing'] == [events[9].id, events[10].id]
+    by_id = {e.id: e for e in events}
+    leaves = {lf['position']: _event_leaf(by_id[lf['event_id']]) for lf in body['leaves']}
+    assert len(leaves) == 7
+    assert verify_multi_proof(leaves, body['nodes'], body['tree_size'], body['merkle_root'])
+    assert client.post('/api/v1/settlement/audit-events/merkle-multiproof', json={}).status_code == 400
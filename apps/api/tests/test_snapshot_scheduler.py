@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta, timezone
+
+from app.config import settings
+from app.models.database import MerkleSnapshot, SchedulerLease
+from app.services.audit_service import record_audit_event
+from app.services.snapshot_scheduler import SNAPSHOT_LEASE, SnapshotScheduler
+
+
+class _Clock:
+    def __init__(self):
+        self.now = datetime.now(timezone.utc)
+
+    def __call__(self):
+        return self.now
+
+
+def _events(db, n):
+    for i in range(n):
+        record_audit_event(db, event_type='S', entity_type='T', entity_id=i, payload={'i': i})
+    db.commit()
+
+
+def test_single_leader_snapshots_and_failover(db_session, monkeypatch):
+    monkeypatch.setattr(settings, 'scheduler_lease_ttl_seconds', 30)
+    monkeypatch.setattr(settings, 'merkle_snapshot_interval_seconds', 300)
+    clock = _Clock()
+    a, b = SnapshotScheduler('a', clock=clock), SnapshotScheduler('b', clock=clock)
+    _events(db_session, 3)
+    assert a.tick(db_session) is not None
+    assert b.tick(db_session) is None and not b.is_leader
+    assert db_session.query(MerkleSnapshot).count() == 1
+    # the leader renews within the ttl and stays on the fleet-wide cadence
+    _events(db_session, 2)
+    clock.now += timedelta(seconds=20)
+    assert a.tick(db_session) is None and a.renewals == 1
+    assert a.indexed == 2  # not due: the new events are indexed for proofs instead
+    assert b.tick(db_session) is None and b.indexed == 0
+    # a leader that stops ticking is replaced after its lease expires
+    clock.now += timedelta(seconds=31)
+    assert b.tick(db_session) is None and b.is_leader  # not due yet: the last snapshot is recent
+    assert a.tick(db_session) is None and not a.is_leader and a.lost == 1
+    clock.now += timedelta(seconds=300)
+    snap = b.tick(db_session)
+    assert snap is not None and snap.event_count == 5
+    assert db_session.get(SchedulerLease, SNAPSHOT_LEASE).holder == 'b'
+    # releasing hands the lease over immediately
+    b.release(db_session)
+    assert a.tick(db_session) is None and a.is_leader
+    assert (a.stats()['acquired'], b.stats()['snapshots']) == (2, 1)
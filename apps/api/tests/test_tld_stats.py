@@ -0,0 +1,42 @@
+from app.models.database import Domain, TldStat
+from app.services import tld_stats
+
+
+def test_counts_follow_domain_writes(db_session):
+    for name in ('a.ts1', 'b.ts1', 'c.ts2', 'nodot'):
+        db_session.add(Domain(name=name, tld=name.split('.')[-1] if '.' in name else None))
+    db_session.commit()
+    assert tld_stats.tld_counts(db_session, ['ts1', 'ts2', 'ts3']) == {'ts1': 2, 'ts2': 1}
+    # a TLD change moves the count; a delete releases it
+    dom = db_session.query(Domain).filter(Domain.name == 'b.ts1').one()
+    dom.tld = 'ts2'
+    db_session.delete(db_session.query(Domain).filter(Domain.name == 'a.ts1').one())
+    db_session.commit()
+    assert tld_stats.tld_counts(db_session, ['ts1', 'ts2']) == {'ts2': 2}
+    # rebuild agrees with the incrementally maintained counts
+    before = {t.tld: t.domain_count for t in db_session.query(TldStat).filter(TldStat.domain_count > 0)}
+    tld_stats.rebuild(db_session)
+    assert tld_stats.tld_counts(db_session) == before
+
+
+def test_batch_scarcity_reads_stats(db_session, client):
+    for i in range(3):
+        db_session.add(Domain(name=f'sc{i}.rare', tld='rare'))
+    db_session.commit()
+    r = client.post('/api/v1/valuation/batch', json={'domains': ['sc0.rare']})
+    assert r.status_code == 200
+    import math
+    from decimal import Decimal
+    assert r.json()['results'][0]['factors']['scarcity'] == str(Decimal(min(max(1 / math.log(3 + 10), 0.1), 2)))
+
+
+def test_bulk_statements_keep_counts(db_session):
+    from sqlalchemy import delete, update
+    for name in ('a.bk1', 'b.bk1', 'c.bk1', 'd.bk2'):
+        db_session.add(Domain(name=name, tld=name.split('.')[-1]))
+    db_session.commit()
+    db_session.query(Domain).filter(Domain.name == 'a.bk1').delete(synchronize_session=False)
+    db_session.execute(delete(Domain).where(Domain.name == 'd.bk2'))
+    db_session.execute(update(Domain).where(Domain.name == 'b.bk1').values(tld='bk3'))
+    db_session.commit()
+    assert tld_stats.tld_counts(db_session, ['bk1', 'bk2', 'bk3']) == {'bk1': 1, 'bk3': 1}
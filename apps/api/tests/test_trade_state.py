@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from sqlalchemy import event
+
+from app.config import settings
+from app.models.database import Domain, Trade
+from app.services.trade_state import trade_state
+from app.services.valuation_service import valuation_service
+
+from tests.test_valuation_prefetch import _participant
+
+
+def _trade(db, part, name, price, ts, tag):
+    db.add(Trade(participant_id=part.id, domain_token_address='0x' + '0' * 40, domain_token_id=name, trade_type='BUY',
+                 price=Decimal(price), tx_hash=f'0xts-{tag}', timestamp=ts))
+
+
+def _selects(db, fn):
+    statements = []
+    conn = db.connection()
+    listener = lambda *args: statements.append(args[2])
+    event.listen(conn, 'before_cursor_execute', listener)
+    try:
+        result = fn()
+    finally:
+        event.remove(conn, 'before_cursor_execute', listener)
+    return result, [s for s in statements if s.lstrip().upper().startswith('SELECT')]
+
+
+def test_committed_trades_update_loaded_state(db_session, monkeypatch):
+    monkeypatch.setattr(settings, 'valuation_trade_lookback_minutes', 60)
+    part = _participant(db_session)
+    now = datetime.now(timezone.utc)
+    # 30 trades: the oldest 6 fall outside the lookback window but 24 of them still inside the last 25
+    for i in range(30):
+        _trade(db_session, part, 'ts.test', 100 + i, now - timedelta(minutes=90 - 3 * i), i)
+    db_session.commit()
+    trade_state.ensure_loaded(db_session, ['ts.test'])
+    (total, count), median = trade_state.signals('ts.test')
+    window = [100 + i for i in range(30) if 90 - 3 * i < 60]
+    assert count == len(window) and total == sum(window)
+    assert median == Decimal(100 + 5 + 12)  # newest 25 are 105..129
+    # a new trade is applied on commit, without re-reading the table
+    _trade(db_session, part, 'ts.test', 500, now, 'new')
+    db_session.commit()
+    ((total, count), median), selects = _selects(db_session, lambda: trade_state.signals('ts.test'))
+    assert selects == [] and count == len(window) + 1 and total == sum(window) + 500
+    assert median == Decimal(118)
+    # rolled-back trades drop the domain so the next read reseeds it
+    savepoint = db_session.begin_nested()
+    _trade(db_session, part, 'ts.test', 900, now, 'rolled-back')
+    db_session.flush()
+    savepoint.rollback()
+    assert trade_state.signals('ts.test') == ([Decimal(0), 0], None)
+    trade_state.ensure_loaded(db_session, ['ts.test'])
+    assert trade_state.signals('ts.test')[0][1] == len(window) + 1
+
+
+def test_warm_state_skips_trade_queries(db_session, monkeypatch):
+    monkeypatch.setattr(settings, 'valuation_use_ensemble', False)
+    part = _participant(db_session)
+    now = datetime.now(timezone.utc)
+    db_session.add(Domain(name='warm.test', tld='test'))
+    for i, price in enumerate((90, 110, 130)):
+        _trade(db_session, part, 'warm.test', price, now - timedelta(minutes=i), f'w{i}')
+    db_session.commit()
+    assert trade_state.rebuild(db_session) == 1
+    results, selects = _selects(db_session, lambda: valuation_service.value_domains(db_session, ['warm.test'], {'floors': {}, 'tld_counts': {}}))
+    assert len(selects) == 4  # domains, orderbook, previous valuation, disputes
+    factors = results[0]['factors']
+    assert factors['trade_count'] == 3 and Decimal(factors['trade_vwap']) == Decimal(110)
+    assert Decimal(factors['last_sale_median']) == Decimal(110)
+
+
+def test_trade_seen_twice_counts_once(db_session, monkeypatch):
+    monkeypatch.setattr(settings, 'valuation_trade_lookback_minutes', 60)
+    part = _participant(db_session)
+    _trade(db_session, part, 'dup.test', 100, None, 'dup')  # server-default timestamp
+    db_session.commit()
+    trade = db_session.query(Trade).filter(Trade.domain_token_id == 'dup.test').one()
+    trade_state.ensure_loaded(db_session, ['dup.test'])
+    # the listener's copy carries a stand-in timestamp; keyed by id it is still the same trade
+    trade_state.apply([('dup.test', trade.id, datetime.now(timezone.utc) + timedelta(seconds=5), Decimal(100))])
+    (total, count), median = trade_state.signals('dup.test')
+    assert (total, count, median) == (Decimal(100), 1, Decimal(100))
@@ -0,0 +1,54 @@
+from decimal import Decimal
+
+from app.config import settings
+from app.models.database import OrderbookSnapshot, Trade, Valuation
+from app.services.valuation_service import valuation_service
+
+from tests.test_valuation_prefetch import _participant
+
+
+def _count(db, name):
+    return db.query(Valuation).filter(Valuation.domain_name == name).count()
+
+
+def test_unchanged_inputs_reuse_valuation(db_session):
+    first = valuation_service.value_domains(db_session, ['cache.eth'], {})
+    hits = valuation_service.cache.hits
+    again = valuation_service.value_domains(db_session, ['cache.eth'], {})
+    assert again[0]['cached'] is True and again[0]['value'] == first[0]['value']
+    assert valuation_service.cache.hits == hits + 1
+    assert _count(db_session, 'cache.eth') == 1
+
+
+def test_new_inputs_miss(db_session, monkeypatch):
+    part = _participant(db_session)
+    valuation_service.value_domains(db_session, ['moved.eth'], {})
+    db_session.add(Trade(participant_id=part.id, domain_token_address='0x' + '0' * 40, domain_token_id='moved.eth',
+                         trade_type='BUY', price=Decimal('250'), tx_hash='0xcache'))
+    db_session.commit()
+    misses = valuation_service.cache.misses
+    after_trade = valuation_service.value_domains(db_session, ['moved.eth'], {})
+    assert 'cached' not in after_trade[0] and valuation_service.cache.misses == misses + 1
+    db_session.add(OrderbookSnapshot(domain_name='moved.eth', side='BUY', price=Decimal('240'), size=Decimal('1')))
+    db_session.commit()
+    assert 'cached' not in valuation_service.value_domains(db_session, ['moved.eth'], {})[0]
+    # weights are part of the fingerprint; a disabled cache always recomputes
+    monkeypatch.setattr(settings, 'valuation_weight_floor', 0.5)
+    assert 'cached' not in valuation_service.value_domains(db_session, ['moved.eth'], {})[0]
+    monkeypatch.setattr(settings, 'valuation_cache_ttl_seconds', 0)
+    assert 'cached' not in valuation_service.value_domains(db_session, ['moved.eth'], {})[0]
+    assert _count(db_session, 'moved.eth') == 5
+
+
+def test_revalue_all_evicts_and_cached_results_are_copies(db_session):
+    first = valuation_service.value_domains(db_session, ['bulk.eth'], {})
+    first[0]['factors']['quality'] = 'tampered'
+    again = valuation_service.value_domains(db_session, ['bulk.eth'], {})
+    assert again[0]['cached'] is True and again[0]['factors']['quality'] != 'tampered'
+    again[0]['factors']['quality'] = 'tampered'
+    assert valuation_service.value_domains(db_session, ['bulk.eth'], {})[0]['factors']['quality'] != 'tampered'
+    valuation_service.revalue_all(db_session, names=['bulk.eth'])
+    # the bulk revalue wrote a newer valuation: the next batch recomputes instead of serving the old one
+    after = valuation_service.value_domains(db_session, ['bulk.eth'], {})
+    assert 'cached' not in after[0]
+    assert _count(db_session, 'bulk.eth') == 3
@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+
+from app.config import settings
+from app.models.database import Domain, DomainValuationDispute, OrderbookSnapshot, Valuation
+from app.services import valuation_kernel
+from app.services.valuation_service import valuation_service
+
+from tests.test_valuation_prefetch import _participant
+
+
+def _seed_twin(db, prefix, i, part, now):
+    from app.models.database import Trade
+    name = f'{prefix}{i}.test'
+    db.add(Domain(name=name, tld='test', last_floor_price=Decimal(80 + i) if i % 3 == 0 else None))
+    if i % 2 == 0:
+        for side, price in (('BUY', 60 + i), ('SELL', 140 + 2 * i)):
+            db.add(OrderbookSnapshot(domain_name=name, side=side, price=Decimal(price), size=Decimal(1)))
+    if i % 4 == 1:
+        db.add(OrderbookSnapshot(domain_name=name, side='BUY', price=Decimal(400), size=Decimal(1)))  # soft floor lift
+    for k in range(i % 5):
+        db.add(Trade(participant_id=part.id, domain_token_address='0x' + '0' * 40, domain_token_id=name, trade_type='BUY',
+                     price=Decimal('97.5') + k * 3 + i, tx_hash=f'0x{prefix}{i}-{k}', timestamp=now - timedelta(minutes=k)))
+    if i % 3 != 2:
+        db.add(Valuation(domain_name=name, model_version='v0', value=Decimal(120 + i), created_at=now - timedelta(hours=i)))
+    if i == 7:
+        db.add(DomainValuationDispute(domain_name=name, status='OPEN', votes=settings.valuation_dispute_vote_threshold))
+    return name
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def kernel_path(request, monkeypatch):
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(valuation_kernel, 'np', None)
+    return request.param
+
+
+def test_revalue_all_matches_per_domain_blend(db_session, monkeypatch, kernel_path):
+    monkeypatch.setattr(settings, 'valuation_use_ensemble', False)
+    part = _participant(db_session)
+    now = datetime.now(timezone.utc)
+    pairs = [(_seed_twin(db_session, 'ka', i, part, now), _seed_twin(db_session, 'kb', i, part, now)) for i in range(24)]
+    db_session.commit()
+    floors = {d.name: Decimal(str(d.last_floor_price)) for d in db_session.query(Domain).filter(Domain.last_floor_price.isnot(None))}
+    expected = {r['domain']: r for r in valuation_service.value_domains(db_session, [a for a, _ in pairs], {'floors': floors, 'tld_counts': {}})}
+    summary = valuation_service.revalue_all(db_session, names=[b for _, b in pairs], chunk_size=10)
+    assert summary['domains'] == 24 and summary['chunks'] == 3
+    for a, b in pairs:
+        got = db_session.query(Valuation).filter(Valuation.domain_name == b).order_by(Valuation.id.desc()).first()
+        assert abs(Decimal(str(got.value)) - Decimal(expected[a]['value'])) <= Decimal('0.01'), (a, got.value, expected[a]['value'])
+        for key in ('primary_source', 'fallback_chain', 'disputed', 'trade_count', 'top_bid'):
+            assert got.factors[key] == expected[a]['factors'][key], (a, key)
+        # both runs read the clock, so the decay term may differ in the last place
+        assert abs(Decimal(got.factors['decay_factor']) - Decimal(expected[a]['factors']['decay_factor'])) <= Decimal('0.0001')
+        assert db_session.query(Domain.last_estimated_value).filter(Domain.name == b).scalar() == got.value
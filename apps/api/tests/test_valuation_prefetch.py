@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from sqlalchemy import event
+
+from app.models.database import (Competition, Domain, DomainValuationDispute, OrderbookSnapshot, Participant, Trade,
+                                 User, Valuation)
+from app.services.valuation_service import valuation_service
+
+
+def _participant(db):
+    now = datetime.now(timezone.utc)
+    u = User(wallet_address='0xprefetch00000000000000000000000000001')
+    db.add(u); db.flush()
+    comp = Competition(contract_address='0xcomp0000000000000000000000000000000099', chain_id=1, name='P', description='x', start_time=now, end_time=now + timedelta(hours=1))
+    db.add(comp); db.flush()
+    p = Participant(user_id=u.id, competition_id=comp.id, portfolio_value=Decimal('0'))
+    db.add(p); db.flush()
+    return p
+
+
+def test_batch_inputs_prefetched_per_set(db_session, monkeypatch):
+    from app.config import settings
+    monkeypatch.setattr(settings, 'valuation_use_ensemble', False)
+    monkeypatch.setattr(settings, 'valuation_min_samples_trade', 1)
+    part = _participant(db_session)
+    now = datetime.now(timezone.utc)
+    names = [f'pf{i}.test' for i in range(30)]
+    for i, name in enumerate(names):
+        db_session.add(Domain(name=name, tld='test'))
+        for side, price in (('BUY', 90 + i), ('BUY', 95 + i), ('SELL', 120 + i)):
+            db_session.add(OrderbookSnapshot(domain_name=name, side=side, price=Decimal(price), size=Decimal(1)))
+        for k, price in enumerate((100, 110, 130)):
+            db_session.add(Trade(participant_id=part.id, domain_token_address='0x' + '0' * 40, domain_token_id=name, trade_type='BUY',
+                                 price=Decimal(price + i), tx_hash=f'0x{i}-{k}', timestamp=now - timedelta(seconds=k)))
+    db_session.add(Valuation(domain_name=names[0], model_version='v0', value=Decimal('200'), created_at=now - timedelta(days=1)))
+    db_session.add(Valuation(domain_name=names[0], model_version='v0', value=Decimal('150'), created_at=now))
+    db_session.add(DomainValuationDispute(domain_name=names[1], status='OPEN', votes=settings.valuation_dispute_vote_threshold))
+    db_session.commit()
+
+    statements = []
+    conn = db_session.connection()
+    listener = lambda *args: statements.append(args[2])
+    event.listen(conn, 'before_cursor_execute', listener)
+    try:
+        results = valuation_service.value_domains(db_session, names + ['fresh.test'], {'floors': {}, 'tld_counts': {}})
+    finally:
+        event.remove(conn, 'before_cursor_execute', listener)
+    selects = [s for s in statements if s.lstrip().upper().startswith('SELECT')]
+    assert len(selects) == 6  # domains, window trades, orderbook, recent trades, previous valuation, disputes
+    by_name = {r['domain']: r for r in results}
+    f = by_name['pf3.test']['factors']
+    assert f['trade_count'] == 3 and round(Decimal(f['trade_vwap']), 2) == Decimal('116.33')
+    assert Decimal(f['orderbook_mid']) == Decimal('110.5') and Decimal(f['top_bid']) == Decimal('98')
+    assert Decimal(f['last_sale_median']) == Decimal('113')
+    assert Decimal(by_name['pf0.test']['factors']['time_decay_anchor']) == Decimal('150.00')
+    assert by_name['pf1.test']['factors']['disputed'] is True and by_name['pf1.test']['value'] == '100.00'
+    assert by_name['fresh.test']['placeholder_created'] and not by_name['pf0.test']['placeholder_created']
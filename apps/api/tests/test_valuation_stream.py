@@ -0,0 +1,64 @@
+import json
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.models.database import Domain, Valuation
+from app.routers import valuation as valuation_router
+from app.services.valuation_service import valuation_service
+
+
+@pytest.fixture()
+def chunk_sessions(db_session, monkeypatch):
+    # each chunk session joins the test connection through a savepoint, so its commit/rollback
+    # stays inside the per-test transaction
+    opened = []
+
+    def factory():
+        s = Session(bind=db_session.connection(), autoflush=False, join_transaction_mode='create_savepoint')
+        s.info['commits'] = 0
+        event.listen(s, 'after_commit', lambda session: session.info.__setitem__('commits', session.info['commits'] + 1))
+        opened.append(s)
+        return s
+    monkeypatch.setattr(valuation_router, '_chunk_session', factory)
+    return opened
+
+
+def _lines(resp):
+    return [json.loads(line) for line in resp.text.splitlines() if line]
+
+
+def test_stream_values_and_commits_per_chunk(client, db_session, chunk_sessions):
+    db_session.add(Domain(name='st0.eth', tld='eth'))
+    db_session.commit()
+    names = [f'st{i}.eth' for i in range(5)]
+    r = client.post('/api/v1/valuation/batch/stream?chunk_size=2', json={'domains': names})
+    assert r.status_code == 200 and r.headers['content-type'].startswith('application/x-ndjson')
+    rows = _lines(r)
+    assert [row['domain'] for row in rows] == names
+    assert [row['placeholder_created'] for row in rows] == [False, True, True, True, True]
+    assert all(row['factors']['primary_source'] for row in rows)
+    # one session per chunk, each committed once and closed
+    assert [s.info['commits'] for s in chunk_sessions] == [1, 1, 1]
+    assert all(not s.in_transaction() for s in chunk_sessions)
+    assert db_session.query(Valuation).filter(Valuation.domain_name.in_(names)).count() == 5
+
+
+def test_stream_stops_at_failed_chunk(client, db_session, chunk_sessions, monkeypatch):
+    real = valuation_service.value_domains
+
+    def flaky(db, names, context):
+        if 'bad.eth' in names:
+            db.add(Domain(name='bad.eth', tld='eth'))
+            db.flush()
+            raise RuntimeError('boom')
+        return real(db, names, context)
+    monkeypatch.setattr(valuation_service, 'value_domains', flaky)
+    r = client.post('/api/v1/valuation/batch/stream?chunk_size=2', json={'domains': ['ok1.eth', 'ok2.eth', 'bad.eth', 'ok3.eth']})
+    rows = _lines(r)
+    assert [row.get('domain') for row in rows[:2]] == ['ok1.eth', 'ok2.eth']
+    assert rows[2] == {'error': 'boom', 'offset': 2} and len(rows) == 3
+    # the chunk before the failure stays committed; the failed one is rolled back
+    assert db_session.query(Valuation).filter(Valuation.domain_name.in_(['ok1.eth', 'ok2.eth'])).count() == 2
+    assert db_session.query(Domain).filter(Domain.name == 'bad.eth').count() == 0
@@ -0,0 +1,364 @@
+import asyncio, json
+import pytest
+
+from app import broadcast as bc
+
+
+class _FakeWS:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.sent: list[str] = []
+        self.closed_code = None
+
+    async def send_text(self, data: str):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.sent.append(data)
+
+    async def close(self, code: int = 1000):
+        self.closed_code = code
+
+
+@pytest.fixture(autouse=True)
+def _no_deferred_sync_events():
+    # Events published by other tests' sync code (with no loop bound) would otherwise be
+    # flushed onto these sockets as soon as one registers.
+    bc.get_sync_bridge()._pending.clear()
+    yield
+
+
+async def _drain():
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_slow_consumer_does_not_block_fast_one():
+    fast, slow = _FakeWS(), _FakeWS(delay=10)
+    bc.register_connection(fast)
+    bc.register_connection(slow, max_queue=2, overflow_policy='drop_oldest')
+    try:
+        await bc.broadcast_event({'type': 'trade', 'domain': 'd0.dom'})
+        await _drain()
+        for i in range(1, 5):
+            await bc.broadcast_event({'type': 'trade', 'domain': f'd{i}.dom'})
+        await _drain()
+        assert len(fast.sent) == 5
+        slow_conn = bc.get_connection(slow)
+        assert slow_conn is not None
+        # first frame is in flight on the writer, the queue keeps the newest two
+        assert slow_conn.depth == 2
+        assert slow_conn.dropped == 2
+        queued = [json.loads(f)['domain'] for _, f, _, _ in slow_conn.queue]
+        assert queued == ['d3.dom', 'd4.dom']
+    finally:
+        bc.unregister_connection(fast)
+        bc.unregister_connection(slow)
+
+
+@pytest.mark.asyncio
+async def test_coalesce_policy_replaces_same_key():
+    ws = _FakeWS(delay=10)
+    conn = bc.register_connection(ws, max_queue=2, overflow_policy='coalesce')
+    try:
+        await bc.broadcast_event({'type': 'trade', 'domain': 'x.dom'})  # picked up by the writer
+        await _drain()
+        await bc.broadcast_event({'type': 'valuation_update', 'domain': 'a.dom', 'value': '1'})
+        await bc.broadcast_event({'type': 'valuation_update', 'domain': 'b.dom', 'value': '1'})
+        await bc.broadcast_event({'type': 'valuation_update', 'domain': 'a.dom', 'value': '2'})
+        frames = [json.loads(f) for _, f, _, _ in conn.queue]
+        assert [(f['domain'], f['value']) for f in frames] == [('b.dom', '1'), ('a.dom', '2')]
+        assert conn.coalesced == 1 and conn.dropped == 0
+    finally:
+        bc.unregister_connection(ws)
+
+
+@pytest.mark.asyncio
+async def test_disconnect_policy_closes_slow_consumer():
+    ws = _FakeWS(delay=0.01)
+    conn = bc.register_connection(ws, max_queue=1, overflow_policy='disconnect')
+    for i in range(4):
+        await bc.broadcast_event({'type': 'trade', 'domain': f'd{i}.dom'})
+    await asyncio.sleep(0.05)
+    assert conn.closed
+    assert ws.closed_code == bc.SLOW_CONSUMER_CLOSE_CODE
+    assert bc.get_connection(ws) is None
+    assert ws not in bc.websocket_connections
+
+
+@pytest.mark.asyncio
+async def test_indexed_routing_honors_filters_and_scopes():
+    everything, trades_only, comp1, comp1_trades = _FakeWS(), _FakeWS(), _FakeWS(), _FakeWS()
+    for ws in (everything, trades_only, comp1, comp1_trades):
+        bc.register_connection(ws)
+    bc.set_connection_filter(trades_only, ['trade'])
+    bc.set_connection_scope(comp1, ['1'])
+    bc.set_connection_filter(comp1_trades, ['trade'])
+    bc.set_connection_scope(comp1_trades, ['1'])
+    try:
+        await bc.broadcast_event({'type': 'trade', 'domain': 'a.dom'})
+        await bc.broadcast_event({'type': 'leaderboard_delta', 'competition_id': 1, 'user_id': 5})
+        await bc.broadcast_event({'type': 'trade', 'domain': 'b.dom', 'competition_id': 2})
+        await _drain()
+        def types(ws):
+            return [(json.loads(f)['type'], json.loads(f).get('competition_id')) for f in ws.sent]
+        assert types(everything) == [('trade', None), ('leaderboard_delta', 1), ('trade', 2)]
+        assert types(trades_only) == [('trade', None), ('trade', 2)]
+        assert types(comp1) == [('trade', None), ('leaderboard_delta', 1)]
+        assert types(comp1_trades) == [('trade', None)]
+        # Clearing the scope moves the socket back to the wildcard set
+        bc.set_connection_scope(comp1, None)
+        assert id(comp1) in bc._any_comp and '1' in bc._subs_by_comp
+    finally:
+        for ws in (everything, trades_only, comp1, comp1_trades):
+            bc.unregister_connection(ws)
+    assert not bc._subs_by_type and not bc._subs_by_comp
+
+
+@pytest.mark.asyncio
+async def test_replay_since_returns_missed_frames_or_resync():
+    await bc.broadcast_event({'type': 'trade', 'domain': 'r0.dom'})
+    mark = bc.current_seq()
+    await bc.broadcast_event({'type': 'trade', 'domain': 'r1.dom'})
+    await bc.broadcast_event({'type': 'nav_update'})
+    await bc.broadcast_event({'type': 'trade', 'domain': 'r2.dom'})
+    ws = _FakeWS()
+    conn = bc.register_connection(ws)
+    bc.set_connection_filter(ws, ['trade'])
+    try:
+        assert bc.replay_since(conn, mark) == 2
+        await _drain()
+        assert [json.loads(f)['domain'] for f in ws.sent] == ['r1.dom', 'r2.dom']
+        # frames are replayed verbatim (same seq as originally broadcast)
+        assert json.loads(ws.sent[-1])['seq'] == bc.current_seq()
+        # a sequence from the future (e.g. before a server restart) forces a resync
+        assert bc.replay_since(conn, bc.current_seq() + 100) == -1
+        await _drain()
+        assert json.loads(ws.sent[-1])['type'] == 'resync_required'
+    finally:
+        bc.unregister_connection(ws)
+
+
+def test_replay_log_gap_detection():
+    log = bc.ReplayLog(3)
+    for seq in range(10, 15):
+        log.append(seq, 'trade', None, None, f'{{"seq": {seq}}}')
+    assert len(log) == 3 and log.oldest_seq == 12
+    assert [e[0] for e in log.since(11)] == [12, 13, 14]
+    assert log.since(10) is None
+
+
+class _FakePubSub:
+    def __init__(self, redis):
+        self.redis = redis
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    async def subscribe(self, channel):
+        self.redis.subscribers.setdefault(channel, []).append(self)
+
+    async def unsubscribe(self, channel):
+        self.redis.subscribers.get(channel, []).remove(self)
+
+    async def get_message(self, ignore_subscribe_messages=False, timeout=0.0):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class _FakeRedis:
+    """Just enough of redis.asyncio for the broadcast bus (INCR + PUBLISH/SUBSCRIBE)."""
+    def __init__(self):
+        self.counters: dict[str, int] = {}
+        self.subscribers: dict[str, list[_FakePubSub]] = {}
+
+    async def incr(self, key):
+        self.counters[key] = self.counters.get(key, 0) + 1
+        return self.counters[key]
+
+    async def publish(self, channel, message):
+        for sub in self.subscribers.get(channel, []):
+            sub.queue.put_nowait({'type': 'message', 'channel': channel, 'data': message})
+        return len(self.subscribers.get(channel, []))
+
+    def pubsub(self):
+        return _FakePubSub(self)
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_shares_sequence_and_frames_across_workers():
+    fake = _FakeRedis()
+    fake.counters['ws:test:seq'] = 1000  # another worker already published
+    local = bc.RedisBroadcastBackend(client=fake, channel='ws:test', worker_id='w-local')
+    remote = bc.RedisBroadcastBackend(client=fake, channel='ws:test', worker_id='w-remote')
+    previous = bc.get_broadcast_backend()
+    bc.set_broadcast_backend(local)
+    await local.start()
+    ws = _FakeWS()
+    bc.register_connection(ws)
+    try:
+        await bc.broadcast_event({'type': 'trade', 'domain': 'local.dom'})
+        # a "remote" worker publishes with the next global sequence; only the bus delivers it here
+        seq = await remote.next_seq()
+        await remote.publish(json.dumps({'type': 'trade', 'domain': 'remote.dom', 'seq': seq}))
+        await asyncio.sleep(0.05)
+        frames = [json.loads(f) for f in ws.sent]
+        assert [(f['domain'], f['seq']) for f in frames] == [('local.dom', 1001), ('remote.dom', 1002)]
+        assert local.published == 1 and local.received == 1  # own frame not delivered twice
+        assert bc.current_seq() == 1002
+    finally:
+        bc.unregister_connection(ws)
+        await local.stop()
+        bc.set_broadcast_backend(previous)
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_drops_event_when_sequence_unavailable():
+    class _DownRedis(_FakeRedis):
+        async def incr(self, key):
+            raise ConnectionError('redis down')
+    down = _DownRedis()
+    backend = bc.RedisBroadcastBackend(client=down, channel='ws:down', worker_id='w-down')
+    previous = bc.get_broadcast_backend()
+    bc.set_broadcast_backend(backend)
+    ws = _FakeWS()
+    bc.register_connection(ws)
+    before_seq, before_unsequenced = bc.current_seq(), bc.get_connection_stats()['unsequenced']
+    try:
+        # no locally guessed seq: it could collide with one another worker got from INCR
+        assert await bc.broadcast_event({'type': 'trade', 'domain': 'down.dom'}) is False
+        await asyncio.sleep(0.01)
+        assert ws.sent == [] and backend.published == 0 and backend.errors == 1
+        assert bc.current_seq() == before_seq
+        assert bc.get_connection_stats()['unsequenced'] == before_unsequenced + 1
+    finally:
+        bc.unregister_connection(ws)
+        bc.set_broadcast_backend(previous)
+
+
+@pytest.mark.asyncio
+async def test_batching_sends_one_frame_and_keeps_latest_valuation_per_domain():
+    ws = _FakeWS()
+    conn = bc.register_connection(ws)
+    conn.set_batching(20)
+    bc.set_connection_filter(ws, ['valuation_update', 'trade'])
+    try:
+        for i in range(50):
+            await bc.broadcast_event({'type': 'valuation_update', 'domain': f'd{i % 10}.dom', 'value': str(i)})
+        await bc.broadcast_event({'type': 'trade', 'domain': 'd1.dom'})
+        await asyncio.sleep(0.06)
+        assert len(ws.sent) == 1
+        frame = json.loads(ws.sent[0])
+        assert frame['type'] == 'batch' and frame['count'] == 11
+        latest = {e['domain']: e['value'] for e in frame['events'] if e['type'] == 'valuation_update'}
+        assert latest == {f'd{i}.dom': str(40 + i) for i in range(10)}
+        assert frame['events'][-1]['type'] == 'trade'
+        assert conn.coalesced == 40 and conn.batches == 1
+    finally:
+        bc.unregister_connection(ws)
+
+
+@pytest.mark.asyncio
+async def test_sync_bridge_publishes_from_worker_threads():
+    import threading
+    ws = _FakeWS()
+    bc.register_connection(ws)
+    bc.set_connection_filter(ws, ['risk_flag'])
+    bridge = bc.SyncBroadcastBridge(capacity=1000, batch_size=16)
+    bridge.bind_loop(asyncio.get_running_loop())
+    try:
+        def produce(n):
+            for i in range(50):
+                bridge.publish({'type': 'risk_flag', 'trade_id': n * 100 + i, 'flag_type': 'SELF_CROSS'})
+        threads = [threading.Thread(target=produce, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        await asyncio.sleep(0.1)
+        assert bridge.published == 200 and bridge.dropped == 0
+        assert sorted(json.loads(f)['trade_id'] for f in ws.sent) == sorted(n * 100 + i for n in range(4) for i in range(50))
+    finally:
+        bc.unregister_connection(ws)
+
+
+def test_sync_bridge_defers_without_loop_and_bounds_capacity():
+    bridge = bc.SyncBroadcastBridge(capacity=3)
+    for i in range(5):
+        bridge.publish({'type': 'nav_update', 'i': i})
+    stats = bridge.stats()
+    assert stats['deferred'] == 5 and stats['dropped'] == 2 and stats['pending'] == 3
+
+
+@pytest.mark.asyncio
+async def test_delivery_latency_histogram_and_client_ack():
+    from app.services.metrics_service import get_ws_latency_exposition
+    ws = _FakeWS(delay=0.004)
+    bc.register_connection(ws)
+    delivery = bc.get_latency_histograms()['delivery']
+    before = delivery.series['hist_probe'].total if 'hist_probe' in delivery.series else 0
+    try:
+        await bc.broadcast_event({'type': 'hist_probe'})
+        await asyncio.sleep(0.03)
+        hist = delivery.series['hist_probe']
+        assert hist.total == before + 1
+        assert hist.sum >= 0.004  # includes the time spent in send_text
+        seq = json.loads(ws.sent[-1])['seq']
+        rtt = bc.record_client_ack(seq)
+        assert rtt is not None and rtt >= 0.004
+        assert bc.record_client_ack(-5) is None
+        text = "\n".join(get_ws_latency_exposition())
+        assert 'ws_delivery_latency_seconds_bucket{type="hist_probe",le="+Inf"}' in text
+        assert 'ws_ack_rtt_seconds_count{type="hist_probe"}' in text
+    finally:
+        bc.unregister_connection(ws)
+
+
+def test_log_histogram_quantiles_are_bucket_bounded():
+    from app.services.latency_histogram import LogHistogram
+    h = LogHistogram()
+    for _ in range(90):
+        h.observe(0.001)
+    for _ in range(10):
+        h.observe(0.5)
+    assert 0.0005 <= h.quantile(0.5) <= 0.001
+    assert 0.256 <= h.quantile(0.99) <= 0.512
+    assert len(h.counts) == len(h.bounds) + 1
+
+
+def test_labelled_histogram_escapes_label_values():
+    from app.services.latency_histogram import LabelledHistogram
+    h = LabelledHistogram('type')
+    h.observe('we"ird\\type\nx', 0.001)
+    lines = h.prometheus_lines('probe_seconds')
+    assert all('\n' not in line for line in lines)
+    assert 'probe_seconds_count{type="we\\"ird\\\\type\\nx"} 1' in lines
+
+
+@pytest.mark.asyncio
+async def test_sync_bridge_drain_picks_up_payloads_published_mid_drain():
+    import threading
+
+    class _Bridge(bc.SyncBroadcastBridge):
+        def __init__(self, *a, **kw):
+            super().__init__(*a, **kw)
+            self.seen = []
+
+        async def _publish_one(self, payload):
+            self.seen.append(payload['n'])
+            if payload['n'] == 0:  # a worker thread publishes while this drain is running
+                t = threading.Thread(target=self.publish, args=({'n': 1},))
+                t.start()
+                t.join()
+    bridge = _Bridge(capacity=10, batch_size=1)
+    bridge.publish({'n': 0})  # deferred until a loop is bound
+    bridge.bind_loop(asyncio.get_running_loop())
+    await asyncio.sleep(0.05)
+    # the running drain owns the mid-drain payload; no second, overlapping drain is scheduled
+    assert bridge.seen == [0, 1] and bridge.drains == 1
+    assert not bridge._drain_scheduled and not bridge._pending
+    # once the drain went idle the next off-loop publish requests a new one
+    await asyncio.to_thread(bridge.publish, {'n': 2})
+    await asyncio.sleep(0.05)
+    assert bridge.seen == [0, 1, 2] and bridge.drains == 2
+
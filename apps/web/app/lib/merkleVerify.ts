@@ -47,6 +47,51 @@ export async function verifyProofBundle(bundle: ProofBundle): Promise<boolean> {
   return verifyInclusion(bundle.leaf, bundle.path, bundle.position, bundle.merkle_root);
 }
 
+export interface MultiProofBundle {
+  merkle_root: string;
+  tree_size: number;
+  nodes: [number, number, string][]; // [level, idx, hash] siblings not derivable from the leaves
+  leaves: { event_id: number; position: number; leaf: any }[];
+}
+
+// Verify many leaves against one root: hash leaves, then fold level by level, taking missing
+// siblings from `nodes`; the last node of an odd layer pairs with itself.
+export async function verifyMultiProof(bundle: MultiProofBundle): Promise<boolean> {
+  if (!bundle.leaves.length || bundle.tree_size <= 0) return false;
+  async function sha256(buf: Uint8Array): Promise<Uint8Array> {
+    if (typeof window !== 'undefined' && (window as any).crypto?.subtle) {
+      return new Uint8Array(await (window as any).crypto.subtle.digest('SHA-256', buf));
+    }
+    const nodeCrypto = require('crypto');
+    return new Uint8Array(nodeCrypto.createHash('sha256').update(buf).digest());
+  }
+  const fromHex = (h: string) => new Uint8Array(Buffer.from(h.replace(/^0x/, ''), 'hex'));
+  const provided = new Map<string, Uint8Array>();
+  for (const [level, idx, h] of bundle.nodes) provided.set(`${level}:${idx}`, fromHex(h));
+  let layer = new Map<number, Uint8Array>();
+  for (const { position, leaf } of bundle.leaves) {
+    const stable = JSON.stringify(leaf, Object.keys(leaf).sort());
+    layer.set(position, await sha256(new TextEncoder().encode(stable)));
+  }
+  const height = Math.ceil(Math.log2(bundle.tree_size));
+  for (let level = 0; level < height; level++) {
+    const next = new Map<number, Uint8Array>();
+    for (const idx of Array.from(layer.keys()).sort((a, b) => a - b)) {
+      const parent = idx >> 1;
+      if (next.has(parent)) continue;
+      const left = layer.get(parent * 2) ?? provided.get(`${level}:${parent * 2}`);
+      const right = (parent * 2 + 1) * 2 ** level >= bundle.tree_size
+        ? left
+        : layer.get(parent * 2 + 1) ?? provided.get(`${level}:${parent * 2 + 1}`);
+      if (!left || !right) return false;
+      next.set(parent, await sha256(new Uint8Array([...left, ...right])));
+    }
+    layer = next;
+  }
+  const root = layer.get(0);
+  return !!root && layer.size === 1 && '0x' + Buffer.from(root).toString('hex') === bundle.merkle_root;
+}
+
 // Signature verification (RSA PKCS1v15 SHA256)
 export async function verifySnapshotSignature(root: string, signatureB64: string | null | undefined, publicKeyPemB64: string | null | undefined): Promise<boolean> {
   if (!signatureB64 || !publicKeyPemB64) return false;